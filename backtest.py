@@ -1,68 +1,180 @@
 #!/usr/bin/env python3
 
-import argparse
-from usdata import USMarket
+import argparse, csv, sys
+import numpy
+from usdata import USMarket, tradingCalendar
+from ptools import BarSeries
+from ptools.barStore import date_to_ordinal
 from tabulate import tabulate
 
 def arg_parser():
     parser = argparse.ArgumentParser(description='test gains/loss for each given symbol')
-    parser.add_argument('symbols', type=str, nargs='+',
+    parser.add_argument('symbols', type=str, nargs='*',
                         help='symbols')
-    parser.add_argument('-b', dest='buy_Date', type=str, required=True,
-                        help='will use close price on this date as cost basis')
+    parser.add_argument('-b', dest='buy_Date', type=str, nargs='+', default=None,
+                        help='will use close price on this date as cost basis, several dates run a batch')
     parser.add_argument('-s', dest='sell_until', type=str, required=True,
                         help='assume sold at the best price until this day')
+    parser.add_argument('-g', dest='grid', type=str, nargs=3, metavar=('FIRST', 'LAST', 'STEP'), default=None,
+                        help='batch: buy every STEP sessions from FIRST to LAST')
+    parser.add_argument('-p', dest='pairs', type=str, default=None,
+                        help='batch: csv file of (symbol, buy date) pairs')
+    parser.add_argument('-d', dest='hold', type=int, default=None,
+                        help='batch: sell within this many sessions after buying, not later than the -s date')
+    parser.add_argument('-o', dest='output', choices=['table', 'csv'], default=None,
+                        help='batch: output format, rows are written as they are computed')
     args = parser.parse_args()
+    if args.buy_Date is None and args.grid is None and args.pairs is None:
+        parser.error('buy dates are needed: -b, -g or -p')
+    if args.pairs is None and len(args.symbols) == 0:
+        parser.error('symbols are needed with -b or -g')
     return args;
 
 def main():
     args = arg_parser()
     symbols = args.symbols
-    buyDate = args.buy_Date
     sellUntil = args.sell_until
-    backtester(symbols, buyDate, sellUntil)
+    batch = args.grid is not None or args.pairs is not None or args.hold is not None or args.output is not None
+    if not batch and args.buy_Date is not None and len(args.buy_Date) == 1:
+        backtester(symbols, args.buy_Date[0], sellUntil)
+        return
+    if args.pairs is not None:
+        pairs = read_pairs(args.pairs)
+    else:
+        buyDates = list(args.buy_Date or []) + (grid_dates(*args.grid) if args.grid is not None else [])
+        pairs = [(sym, buyDate) for sym in symbols for buyDate in buyDates]
+    if len(pairs) == 0:
+        sys.exit('no (symbol, buy date) pairs to test')
+    batch_backtester(pairs, sellUntil, args.hold, args.output or 'table')
 
-def backtester(symbols, buyDate, sellUntil) :
-    prices, missing = USMarket(symbols, sellUntil).getData('daily')
+# bars from buyDate (or the session before it) up to sellUntil
+def depth_between(buyDate, sellUntil) :
+    return tradingCalendar.sessions_between(buyDate, sellUntil) + 1
 
-    skipped = []
-    for m in missing:
-        symbols.remove(m)
-        skipped.append(m)
+def backtester(symbols, buyDate, sellUntil) :
+    prices, missing = USMarket(symbols, sellUntil, depth = depth_between(buyDate, sellUntil)).getData('daily')
+    report(*evaluate(prices, symbols, missing, buyDate))
 
+# prices: {sym: BarSeries or [rows]} as USMarket.getData() returns, bars after the last sell date removed.
+# returns (results sorted by gain, win/loss counts)
+def evaluate(prices, symbols, missing, buyDate) :
+    symbols = [sym for sym in symbols if sym not in missing]
+    counts = {'win': 0, 'loss': 0, 'worstCaseWin': 0, 'worstCaseLoss': 0}
     result = []
-    win = 0
-    loss = 0
-    worstCaseWin = 0
-    worstCaseLoss = 0
-    for sym in symbols:
-        sp = prices[sym]
+    for sym, _, gain, cost, sellPrice, worstCase in batch_evaluate(prices, [(sym, buyDate) for sym in symbols]):
+        if numpy.isnan(gain):
+            raise ValueError('no price of ' + sym + ' to sell at after ' + buyDate)
+        count(counts, gain, worstCase)
+        result.append((sym, gain, cost, sellPrice, worstCase))
 
-        # note that sp1[0] is the most recent price point
-        pos = 0
-        while(sp[pos]['Date'] > buyDate):
-            pos+=1
+    gainSorted = sorted(result, key=lambda tup: float(tup[1]), reverse=True)
+    return gainSorted, counts
 
-        cost = sp[pos]['Close']
-        sell_candidates = [sp[x]['Close'] for x in range(pos)]
+# sessions from first to last ('YYYY-MM-DD'), every step sessions
+def grid_dates(first, last, step) :
+    sessions = tradingCalendar.sessions
+    lo = numpy.searchsorted(sessions, date_to_ordinal(first), side='left')
+    hi = numpy.searchsorted(sessions, date_to_ordinal(last), side='right')
+    return [tradingCalendar.date_str(o) for o in sessions[lo:hi:int(step)]]
 
-        sellPrice = max(sell_candidates) #suppose we can sell at the highest price within this period
-        if sellPrice > cost :
-            win += 1
-        else :
-            loss += 1
+# (symbol, buy date) pairs of a csv file, a header line is skipped
+def read_pairs(fpath) :
+    pairs = []
+    with open(fpath) as f:
+        for line in csv.reader(f):
+            if len(line) < 2 or line[0].startswith('#') or line[1].strip().lower() == 'date':
+                continue
+            pairs.append((line[0].strip(), line[1].strip()))
+    return pairs
 
-        lowestPrice = min(sell_candidates)
-        if lowestPrice > cost:
-            worstCaseWin += 1
-        else :
-            worstCaseLoss += 1
+def count(counts, gain, worstCase) :
+    if gain > 0 :
+        counts['win'] += 1
+    else :
+        counts['loss'] += 1
+    if worstCase > 0 :
+        counts['worstCaseWin'] += 1
+    else :
+        counts['worstCaseLoss'] += 1
 
-        gain = (sellPrice - cost) / cost * 100 #will be used as percentage
-        worstCase = (lowestPrice - cost) / cost * 100
-        result.append((sym, gain, cost, sellPrice, worstCase))
+# prices: {sym: BarSeries or [rows]}, most recent first, bars after the last sell date removed.
+# pairs: (sym, buyDate). The close on buyDate (or the session before it) is the cost, the best and
+# the worst close of the following bars (at most 'hold' of them) are the best and worst case.
+# Yields (sym, buyDate, %gain, cost, sellPrice, %worstCase) one symbol at a time, every pair of a
+# symbol at once; gains are NaN when there is no price to buy or to sell at
+def batch_evaluate(prices, pairs, hold = None) :
+    bySymbol = {}
+    for sym, buyDate in pairs:
+        bySymbol.setdefault(sym, []).append(buyDate)
+    for sym, buyDates in bySymbol.items():
+        if sym not in prices:
+            continue
+        sp = prices[sym]
+        if not isinstance(sp, BarSeries):
+            sp = BarSeries.from_rows(sp)
+        closes = sp.column('Close')
+        # binary search over the dates: first bar on or before each buy date
+        pos = numpy.searchsorted(-sp.dates, -numpy.array([date_to_ordinal(d) for d in buyDates]), side='left')
+        first = numpy.zeros(len(pos), dtype=int) if hold is None else numpy.maximum(pos - hold, 0)
+        ok = (pos < len(closes)) & (first < pos)
+        cost = numpy.full(len(pos), numpy.nan)
+        best = numpy.full(len(pos), numpy.nan)
+        worst = numpy.full(len(pos), numpy.nan)
+        if ok.any():
+            cost[ok] = closes[pos[ok]]
+            # max/min over [first, pos) of every pair in one call: reduce over the (first, pos) boundaries
+            bounds = numpy.stack([first[ok], pos[ok]], axis=1).ravel()
+            best[ok] = numpy.maximum.reduceat(closes, bounds)[::2]
+            worst[ok] = numpy.minimum.reduceat(closes, bounds)[::2]
+        gain = (best - cost) / cost * 100 #will be used as percentage
+        worstCase = (worst - cost) / cost * 100
+        for k, buyDate in enumerate(buyDates):
+            yield (sym, buyDate, float(gain[k]), float(cost[k]), float(best[k]), float(worstCase[k]))
 
-    gainSorted = sorted(result, key=lambda tup: float(tup[1]), reverse=True)
+def batch_backtester(pairs, sellUntil, hold = None, output = 'table', out = sys.stdout) :
+    symbols = sorted(set(sym for sym, _ in pairs))
+    oldest = min(buyDate for _, buyDate in pairs)
+    prices, missing = USMarket(symbols, sellUntil, depth = depth_between(oldest, sellUntil)).getData('daily')
+    if len(missing) > 0:
+        print('symbols missing data: ' + str(missing), file=sys.stderr)
+    counts = stream(batch_evaluate(prices, pairs, hold), output, out)
+    summary(counts, out if output == 'table' else sys.stderr)
+
+# writes each result as it comes; returns the win/loss counts overall and per buy date
+def stream(results, output = 'table', out = sys.stdout) :
+    colNames = ["Symbol", "BuyDate", "%Gain", "Cost", "SellPrice", "%WorstCase"]
+    if output == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(colNames)
+    else:
+        out.write('%-8s%-12s' % tuple(colNames[:2]) + ''.join('%12s' % name for name in colNames[2:]) + '\n')
+    counts = {'all': {'win': 0, 'loss': 0, 'worstCaseWin': 0, 'worstCaseLoss': 0}}
+    for sym, buyDate, gain, cost, sellPrice, worstCase in results:
+        if output == 'csv':
+            writer.writerow([sym, buyDate] + ['%.2f' % x for x in [gain, cost, sellPrice, worstCase]])
+        else:
+            out.write('%-8s%-12s' % (sym, buyDate) + ''.join('%12.2f' % x for x in [gain, cost, sellPrice, worstCase]) + '\n')
+        if numpy.isnan(gain):
+            continue
+        count(counts['all'], gain, worstCase)
+        count(counts.setdefault(buyDate, {'win': 0, 'loss': 0, 'worstCaseWin': 0, 'worstCaseLoss': 0}), gain, worstCase)
+    return counts
+
+def win_rate(win, loss) :
+    return round(win / (win + loss), 2) if win + loss > 0 else 0.0
+
+def summary(counts, out = sys.stdout) :
+    rows = []
+    for buyDate in sorted(counts.keys()):
+        c = counts[buyDate]
+        rows.append((buyDate, c['win'], c['loss'], win_rate(c['win'], c['loss']),
+                     c['worstCaseWin'], c['worstCaseLoss'], win_rate(c['worstCaseWin'], c['worstCaseLoss'])))
+    out.write(tabulate(rows, ["BuyDate", "Win", "Loss", "WinRate", "WorstCaseWin", "WorstCaseLoss", "WorstCaseWinRate"],
+                       floatfmt=".2f") + '\n')
+
+def report(gainSorted, counts) :
+    win, loss = counts['win'], counts['loss']
+    worstCaseWin, worstCaseLoss = counts['worstCaseWin'], counts['worstCaseLoss']
     printResults(gainSorted, ["Symbol", "%Gain", "Cost", "SellPrice", "%WorstCase"])
     print('BestCase  => Win: ' + str(win) +'; Loss: '+ str(loss) + '; Win rate: %.2f' % round(win/(win+loss), 2))
     print('WorstCase => Win: ' + str(worstCaseWin) +'; Loss: '+ str(worstCaseLoss) + \
@@ -72,4 +184,4 @@ def printResults(result, colNames) :
     print(tabulate(result, colNames, floatfmt=".2f"))
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,40 @@
+"""
+Test data: history files for tests that run USMarket on a temporary folder instead of the network,
+and BarSeries for tests of the rules.
+"""
+
+import os
+import numpy
+import usdata
+from ptools import BarSeries
+from ptools.resample import resample_rows
+from ptools.tradingCalendar import TradingCalendar
+
+# sessions ('YYYY-MM-DD') within [first, last], oldest first
+def sessions_between(first, last):
+    cal = TradingCalendar(int(first[:4]), int(last[:4]))
+    return [cal.date_str(o) for o in cal.sessions if first <= cal.date_str(o) <= last]
+
+# one csv file of sym in usdata.foldername, with a random walk of closes over sessions (oldest first).
+# frequency 'weekly' writes the weeks of the same daily bars
+def write_history(sym, sessions, seed, frequency = 'daily'):
+    numpy.random.seed(seed)
+    closes = 50 + numpy.cumsum(numpy.random.randn(len(sessions)))
+    rows = {d: {'Date': d, 'Open': c, 'High': c + 1, 'Low': c - 1, 'Close': c, 'Volume': 1000000}
+            for d, c in zip(sessions, closes)}
+    if frequency == 'weekly':
+        rows = resample_rows(rows, 'weekly')
+    usdata.touchFolder(os.path.join(usdata.foldername, sym[:1]))
+    with open(os.path.join(usdata.foldername, sym[:1], sym + '-' + frequency + '-' + max(rows.keys()) + '.csv'), 'w') as f:
+        f.write('Date,Open,High,Low,Close,Volume,Adj Close\n')
+        for d in sorted(rows.keys(), reverse=True):
+            r = rows[d]
+            f.write('%s,%.2f,%.2f,%.2f,%.2f,%d,%.2f\n' % (d, r['Open'], r['High'], r['Low'], r['Close'], r['Volume'], r['Close']))
+
+# BarSeries over dates (ordinals, most recent first) with a random walk of closes
+def make_series(dates, seed):
+    numpy.random.seed(seed)
+    closes = 50 * numpy.exp(numpy.cumsum(numpy.random.randn(len(dates)) * 0.02))[::-1]
+    return BarSeries(dates, {'Open': closes * (1 + numpy.random.randn(len(dates)) * 0.005),
+                             'High': closes * 1.01, 'Low': closes * 0.99, 'Close': closes,
+                             'Volume': numpy.full(len(dates), 1e6)})
@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
-from usdata import USMarket
+import numpy
+from usdata import USMarket, tradingCalendar
+from ptools import BarSeries
+from ptools.barStore import date_to_ordinal
+from ptools.resample import resample
 from pstrategy import ChartPatterns, TripleScreen
 
 def arg_parser():
@@ -10,9 +14,19 @@ def arg_parser():
                         help='file that contains a list of ticker symbols')
     parser.add_argument('-d', dest='date', default=None,
                         help='ending date of history data for backtesting')
+    parser.add_argument('-u', dest='until', default=None,
+                        help='with -d, scan every trading day from -d until this date, loading data once')
     parser.add_argument('-s', dest='symbol',
                         help='check one specified symbol, avoid reading symbols from file')
+    parser.add_argument('-b', dest='binary', action='store_true', default=False,
+                        help='read history from the binary bar store (python3 -m ptools.csv_to_barstore)')
+    parser.add_argument('-j', dest='processes', type=int, default=None,
+                        help='number of worker processes for scanning, default runs in threads')
+    parser.add_argument('-W', dest='download_weekly', action='store_true', default=False,
+                        help='download weekly bars instead of building them from daily bars')
     args = parser.parse_args()
+    if args.until != None and args.date == None:
+        parser.error('-u needs the first day of the range in -d')
     return args;
 
 def read_watchlist(files) :
@@ -41,6 +55,49 @@ def test():
     cp = ChartPatterns(symset, dataset)
     cp.run()
 
+# daily bars visible on 'day' (ordinal): a view of the most recent 'depth' bars up to that day
+def daily_on(daily, day, depth):
+    i = int(numpy.searchsorted(-daily.dates, -day, side='left'))
+    return daily[i:i + depth]
+
+# weekly bars visible on 'day': the complete weeks before its week, and its week so far built
+# from the daily bars, like USMarket builds the most recent week for a past ending date
+def weekly_on(weekly, daily, day, depth):
+    monday = tradingCalendar.week_of(day)
+    before = weekly[int(numpy.searchsorted(-weekly.dates, -monday, side='right')):]
+    week = daily_on(daily, day, depth)
+    week = week[:int(numpy.searchsorted(-week.dates, -monday, side='right'))]
+    if len(week) == 0:
+        return before[:depth]
+    bars = resample(dict(week.columns, Date=week.dates), 'weekly')
+    return BarSeries(numpy.concatenate([bars['Date'], before.dates[:depth - 1]]),
+                     {f: numpy.concatenate([bars[f], before.column(f)[:depth - 1]]) for f in before.columns.keys()})
+
+# ChartPatterns weekly and daily for every trading day within [first, last], on one load of the data
+def scan_range(watchlist, first, last, storage, processes = None, derive_weekly = True):
+    days = tradingCalendar.sessions
+    days = days[(days >= date_to_ordinal(first)) & (days <= date_to_ordinal(last))]
+    depth = ChartPatterns.required_depth()
+    marketData = USMarket(watchlist, last, storage, derive_weekly, depth = depth + len(days))
+    datasets, all_missing = marketData.getAllData(('daily', 'weekly'))
+    daily, weekly = datasets['daily'], datasets['weekly']
+    if len(all_missing) > 0:
+        print('symbols missing data: ' + str(all_missing))
+    symlist = [sym for sym in watchlist if sym not in all_missing]
+
+    for day in days.tolist():
+        print(' =========== ' + tradingCalendar.date_str(day) + ' ===========')
+        dailyOn = {sym: daily_on(daily[sym], day, depth) for sym in symlist}
+        # symbols listed later than the day
+        symbols = [sym for sym in symlist if len(dailyOn[sym]) > 0]
+        weeklyOn = {sym: weekly_on(weekly[sym], daily[sym], day, depth) for sym in symbols}
+
+        print(' ----------- ChartPatterns Weekly -------------')
+        ChartPatterns(symbols, weeklyOn).run(processes)
+
+        print(' ----------- ChartPatterns Daily  -------------')
+        ChartPatterns(symbols, dailyOn).run(processes)
+
 def main() :
     args = arg_parser()
     if args.symbol != None:
@@ -48,28 +105,34 @@ def main() :
     else:
         watchlist = read_watchlist(args.filename)
 
+    storage = 'npy' if args.binary else 'csv'
+    if args.until != None:
+        scan_range(watchlist, args.date, args.until, storage, args.processes, not args.download_weekly)
+        return
+
+    # only the history the rules look at is loaded
+    depth = ChartPatterns.required_depth()
+    derive_weekly = not args.download_weekly
     if args.date != None:
-        marketData = USMarket(watchlist, args.date)
+        marketData = USMarket(watchlist, args.date, storage, derive_weekly, depth = depth)
     else:
-        marketData = USMarket(watchlist)
+        marketData = USMarket(watchlist, storage = storage, derive_weekly = derive_weekly, depth = depth)
 
 
-    # print_progress('requesting daily data')
-    daily, missing_daily = marketData.getData('daily')
-    # print_progress('requesting weekly data')
-    weekly, missing_weekly = marketData.getData('weekly')
-    all_missing = set(missing_daily) | set(missing_weekly)
+    # daily and weekly data of each symbol come from one pass over the watchlist
+    datasets, all_missing = marketData.getAllData(('daily', 'weekly'))
+    daily, weekly = datasets['daily'], datasets['weekly']
     if len(all_missing) > 0:
         print('symbols missing data: ' + str(all_missing))
     symlist = [sym for sym in watchlist if sym not in all_missing]
 
     print(' ----------- ChartPatterns Weekly -------------')
     cp_weekly = ChartPatterns(symlist, weekly)
-    cp_weekly.run()
+    cp_weekly.run(args.processes)
 
     print(' ----------- ChartPatterns Daily  -------------')
     cp_daily = ChartPatterns(symlist, daily)
-    cp_daily.run()
+    cp_daily.run(args.processes)
 
     # print(' ----------- TripleScreen Screen (2 screens)---')
     # ts = TripleScreen(symlist, weekly, daily)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+"""
+pstock daemon: loads the market data of a watchlist once, keeps it in memory and refreshes it
+on a schedule, so a repeated screen doesn't pay for re-reading thousands of files.
+Thin clients talk to it over a Unix socket, one line of JSON per request and per response.
+
+  python3 pstockd.py serve all-1b-100b etf.txt     # start the daemon
+  python3 pstockd.py scan                           # ChartPatterns weekly and daily, like pstock.py
+  python3 pstockd.py data AAPL -w weekly
+  python3 pstockd.py indicators AAPL                # MACD, RSI, ... of the newest bar, updated bar by bar
+  python3 pstockd.py backtest -b 2016-06-01 -s 2016-06-30 AAPL TSLA
+  python3 pstockd.py refresh | status | stop
+"""
+
+import argparse, json, os, socket, socketserver, threading, time
+import usdata
+from usdata import USMarket, read_watchlist
+from pstrategy import ChartPatterns
+from pstrategy.chartPatterns import print_results
+import backtest
+
+default_socket = os.path.join(usdata.foldername, 'pstockd.sock')
+
+class Daemon:
+    # market: USMarket of the watchlist; refresh_minutes: 0 never refreshes on its own
+    def __init__(self, market, refresh_minutes = 30, processes = None):
+        self.market = market
+        self.refresh_minutes = refresh_minutes
+        self.processes = processes
+        self.rlock = threading.RLock() # the data requests are answered from
+        self.market_lock = threading.RLock() # the market while it loads, refreshes or extends
+        self.stopped = threading.Event()
+        self.loaded_at = None
+        self.load()
+
+    # the market's data replaces what requests are answered from at once, under the lock
+    def load(self):
+        with self.market_lock:
+            datasets, missing = self.market.getAllData(('daily', 'weekly'))
+            symbols = [sym for sym in self.market.watchlist if sym not in missing]
+            indicators = self.market.getIndicators()
+        with self.rlock:
+            self.datasets, self.missing, self.symbols = datasets, missing, symbols
+            self.indicators = indicators
+            # per frequency, so indicators memoized by a scan are reused by the next one
+            self.patterns = {}
+            self.loaded_at = time.time()
+
+    # downloads run outside the lock: requests are answered from the data loaded before until
+    # the refreshed data is swapped in
+    def refresh(self):
+        with self.market_lock:
+            self.market.refresh()
+            self.load()
+
+    def run_scheduler(self):
+        while self.refresh_minutes > 0 and not self.stopped.wait(self.refresh_minutes * 60):
+            try:
+                self.refresh()
+            except Exception as e:
+                print('refresh failed: ' + repr(e))
+
+    def scan(self, frequency = 'daily'):
+        with self.rlock:
+            if frequency not in self.patterns:
+                self.patterns[frequency] = ChartPatterns(self.symbols, self.datasets[frequency])
+            cp = self.patterns[frequency]
+            return {'results': cp.scan(self.processes), 'missing_data': cp.missing_data,
+                    'skipped': cp.missing_analysis}
+
+    def data(self, symbols, frequency = 'daily'):
+        with self.rlock:
+            dataset = self.datasets[frequency]
+            return {sym: dataset[sym].to_rows() for sym in symbols if sym in dataset}
+
+    # latest streaming indicator values of the live data, see USMarket.getIndicators()
+    def latest_indicators(self, symbols):
+        with self.rlock:
+            return {sym: self.indicators[sym] for sym in symbols if sym in self.indicators}
+
+    def backtest(self, symbols, buyDate, sellUntil):
+        # buy dates older than the loaded history load more of it
+        depth = backtest.depth_between(buyDate, min(self.market.adjusted_endDate, usdata.get_latest_trading_date()))
+        if depth > self.market.depth['daily']:
+            with self.market_lock:
+                self.market.extend('daily', depth)
+                daily = self.market.sortedByDate('daily')
+            with self.rlock:
+                self.datasets = dict(self.datasets, daily={sym: series for sym, series in daily.items()
+                                                           if sym in self.datasets['daily']})
+                self.patterns.pop('daily', None)
+        with self.rlock:
+            prices = {sym: self.datasets['daily'][sym].until(sellUntil)
+                      for sym in symbols if sym in self.datasets['daily']}
+        missing = [sym for sym in symbols if sym not in prices]
+        results, counts = backtest.evaluate(prices, symbols, missing, buyDate)
+        return {'results': results, 'counts': counts, 'missing': missing}
+
+    def status(self):
+        with self.rlock:
+            return {'symbols': len(self.symbols), 'missing': self.missing, 'loaded_at': self.loaded_at}
+
+    def handle(self, request):
+        cmd = request.get('cmd')
+        if cmd == 'scan':
+            return self.scan(request.get('frequency', 'daily'))
+        if cmd == 'data':
+            return self.data(request['symbols'], request.get('frequency', 'daily'))
+        if cmd == 'indicators':
+            return self.latest_indicators(request['symbols'])
+        if cmd == 'backtest':
+            return self.backtest(request['symbols'], request['buy'], request['sell'])
+        if cmd == 'refresh':
+            self.refresh()
+            return self.status()
+        if cmd == 'status':
+            return self.status()
+        raise ValueError('unknown command: ' + str(cmd))
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode())
+                if request.get('cmd') == 'stop':
+                    response = {'ok': True}
+                    threading.Thread(target=self.server.shutdown).start()
+                else:
+                    response = {'ok': True, 'result': self.server.service.handle(request)}
+            except Exception as e:
+                response = {'ok': False, 'error': repr(e)}
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, daemon):
+        if os.path.exists(path):
+            os.remove(path) # left behind by a daemon that did not stop cleanly
+        socketserver.UnixStreamServer.__init__(self, path, RequestHandler)
+        self.service = daemon
+
+def serve(daemon, path = default_socket):
+    server = Server(path, daemon)
+    threading.Thread(target=daemon.run_scheduler, daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        daemon.stopped.set()
+        server.server_close()
+        os.remove(path)
+
+# one request to a running daemon; raises if the daemon reports an error
+def request(payload, path = default_socket):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall((json.dumps(payload) + '\n').encode())
+        response = json.loads(s.makefile('rb').readline().decode())
+    if not response['ok']:
+        raise Exception(response['error'])
+    return response.get('result')
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description='pstock daemon and its client')
+    parser.add_argument('command', choices=['serve', 'scan', 'data', 'indicators', 'backtest', 'refresh', 'status', 'stop'])
+    parser.add_argument('args', type=str, nargs='*',
+                        help='serve: files that contain ticker symbols; data/indicators/backtest: symbols')
+    parser.add_argument('--socket', dest='socket', default=default_socket,
+                        help='path of the Unix socket')
+    parser.add_argument('-w', dest='frequency', default='daily',
+                        help='daily (default) or weekly data')
+    parser.add_argument('-b', dest='buy_Date', help='backtest: close price on this date is the cost basis')
+    parser.add_argument('-s', dest='sell_until', help='backtest: sold at the best price until this day')
+    parser.add_argument('-r', dest='refresh', type=int, default=30,
+                        help='serve: minutes between refreshes, 0 turns them off')
+    parser.add_argument('-n', dest='binary', action='store_true', default=False,
+                        help='serve: read history from the binary bar store')
+    parser.add_argument('-j', dest='processes', type=int, default=None,
+                        help='serve: number of worker processes for scanning')
+    parser.add_argument('-W', dest='download_weekly', action='store_true', default=False,
+                        help='serve: download weekly bars instead of building them from daily bars')
+    return parser.parse_args()
+
+def main():
+    args = arg_parser()
+    if args.command == 'serve':
+        watchlist = read_watchlist(args.args if len(args.args) > 0 else ['watchlist.txt'])
+        storage = 'npy' if args.binary else 'csv'
+        usdata.touchFolder()
+        market = USMarket(watchlist, storage = storage, derive_weekly = not args.download_weekly,
+                          depth = ChartPatterns.required_depth())
+        serve(Daemon(market, args.refresh, args.processes), args.socket)
+    elif args.command == 'scan':
+        for frequency, title in [('weekly', 'Weekly'), ('daily', 'Daily ')]:
+            print(' ----------- ChartPatterns ' + title + ' -------------')
+            result = request({'cmd': 'scan', 'frequency': frequency}, args.socket)
+            print_results(result['results'], result['missing_data'], result['skipped'])
+    elif args.command == 'data':
+        for sym, rows in request({'cmd': 'data', 'symbols': args.args, 'frequency': args.frequency}, args.socket).items():
+            for row in rows:
+                print(sym + ' ' + ' '.join(str(row[k]) for k in ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']))
+    elif args.command == 'indicators':
+        for sym, values in request({'cmd': 'indicators', 'symbols': args.args}, args.socket).items():
+            print(sym + ' ' + json.dumps(values))
+    elif args.command == 'backtest':
+        result = request({'cmd': 'backtest', 'symbols': args.args, 'buy': args.buy_Date,
+                          'sell': args.sell_until}, args.socket)
+        if len(result['missing']) > 0:
+            print('symbols missing data: ' + str(result['missing']))
+        backtest.report(result['results'], result['counts'])
+    else:
+        print(request({'cmd': args.command}, args.socket))
+
+if __name__ == '__main__':
+    main()
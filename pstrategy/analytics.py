@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""
+Forward-return analytics of rule triggers: for every trigger (rule, symbol, date), the returns
+1/5/10/20 bars later, the maximum adverse excursion (the deepest low below the entry close before the
+longest horizon) and whether it paid off, aggregated per rule and per market-cap tier
+(the symbol lists like all-1b-100b and etf.txt).
+Bars later are bars of the symbol itself, as WalkForward counts them, so a symbol with missing
+sessions is not measured over the panel's date index. Every statistic is computed for all triggers
+at once by indexing the MarketPanel with (symbol, bar) arrays, with no loop over trades.
+
+  python3 -m pstrategy.analytics all-1b-100b etf.txt -f 2014-01-01 -t 2016-06-30 -j 8
+"""
+
+import argparse, os
+import numpy
+from tabulate import tabulate
+from ptools import MarketPanel
+from ptools.barStore import date_to_ordinal
+from .chartPatterns import ChartPatterns
+from .walkForward import WalkForward, load_history
+from usdata import read_watchlist
+
+default_tiers = ['all-1b-100b', 'etf.txt']
+
+# {tier: set of symbols} of the symbol lists, a tier is named after its file
+def read_tiers(files = default_tiers):
+    return {os.path.basename(f): set(read_watchlist([f])) for f in files if os.path.exists(f)}
+
+class Analytics:
+    # panel: MarketPanel that holds the bars after the triggers; tiers: {tier: symbols}, see read_tiers
+    def __init__(self, panel, tiers = None, horizons = (1, 5, 10, 20)):
+        self.panel = panel
+        self.tiers = {name: set(symbols) for name, symbols in (tiers or {}).items()}
+        self.horizons = list(horizons)
+
+    # triggers: rows that start with (rule, sym, date), like WalkForward.run() returns.
+    # Returns {'rule', 'symbol', 'date': arrays, 'entry': close on the date,
+    #          'returns': % per trigger and horizon, NaN where the bars are not there yet,
+    #          'mae': % of the lowest low below the entry within the longest horizon, 0 if no low
+    #                 went below it, NaN when no bar follows the trigger yet}
+    def outcomes(self, triggers):
+        panel = self.panel
+        rules = numpy.array([row[0] for row in triggers], dtype=object)
+        symbols = numpy.array([row[1] for row in triggers], dtype=object)
+        dates = numpy.array([row[2] for row in triggers], dtype=object)
+        r = numpy.array([panel.index[sym] for sym in symbols], dtype=int)
+        j = numpy.searchsorted(-panel.dates, -numpy.array([date_to_ordinal(d) for d in dates], dtype=int), side='left')
+        close, low = panel.field('Close'), panel.field('Low')
+        # the symbol's own bars: rank of each of its columns among them, and the column of each rank
+        valid = ~numpy.isnan(close)
+        rank = numpy.cumsum(valid, axis=1) - 1
+        rows, cols = numpy.nonzero(valid)
+        column = numpy.zeros(close.shape, dtype=int)
+        column[rows, rank[rows, cols]] = cols
+        j = numpy.minimum(j, close.shape[1] - 1)
+        own = valid[r, j] # a trigger on a date the symbol has no bar for has no outcome
+        q = numpy.where(own, rank[r, j], -1)
+        entry = numpy.where(own, close[r, j], numpy.nan)
+
+        # most recent first: h bars later is the symbol's bar of rank q - h
+        def later(h):
+            k = q[:, numpy.newaxis] - h
+            ok = (k >= 0) & own[:, numpy.newaxis]
+            return ok, column[r[:, numpy.newaxis], numpy.maximum(k, 0)]
+
+        ok, at = later(numpy.array(self.horizons)[numpy.newaxis, :])
+        returns = numpy.where(ok, (close[r[:, numpy.newaxis], at] / entry[:, numpy.newaxis] - 1) * 100, numpy.nan)
+
+        # lows of the bars 1..longest horizon after each trigger, NaN past the most recent bar
+        ok, at = later(numpy.arange(1, max(self.horizons) + 1)[numpy.newaxis, :])
+        lows = numpy.where(ok, low[r[:, numpy.newaxis], at], numpy.nan)
+        lowest = numpy.fmin.reduce(lows, axis=1) if lows.shape[1] > 0 else numpy.full(len(r), numpy.nan)
+        mae = numpy.minimum((lowest / entry - 1) * 100, 0)
+        return {'rule': rules, 'symbol': symbols, 'date': dates, 'entry': entry, 'returns': returns, 'mae': mae}
+
+    def columns(self):
+        return ['Rule', 'Tier', 'Triggers'] + ['%Avg' + str(h) for h in self.horizons] + \
+               ['%Hit' + str(h) for h in self.horizons] + ['%MAE', '%WorstMAE']
+
+    # one row per rule and tier ('all' first, then the tiers that have triggers of the rule):
+    # count, average return and share of positive returns per horizon, average and worst MAE
+    def table(self, triggers, rule_names = None):
+        out = self.outcomes(triggers)
+        if rule_names is None:
+            rule_names = list(dict.fromkeys(out['rule'].tolist()))
+        tierNames = sorted(self.tiers.keys())
+        # symbols x tiers membership, then triggers x tiers by indexing it
+        symbols, inverse = numpy.unique(out['symbol'].astype(str), return_inverse=True)
+        member = numpy.array([[sym in self.tiers[t] for t in tierNames] for sym in symbols.tolist()],
+                             dtype=bool).reshape(len(symbols), len(tierNames))[inverse]
+        groups = [('all', numpy.ones(len(out['rule']), dtype=bool))] + \
+                 [(t, member[:, k]) for k, t in enumerate(tierNames)]
+        ret = []
+        for name in rule_names:
+            ofRule = out['rule'] == name
+            for tier, inTier in groups:
+                mask = ofRule & inTier
+                if tier != 'all' and not mask.any():
+                    continue
+                ret.append((name, tier, int(mask.sum())) + self.stats(out['returns'][mask], out['mae'][mask]))
+        return ret
+
+    def stats(self, returns, mae):
+        counts = (~numpy.isnan(returns)).sum(axis=0)
+        sums = numpy.nansum(returns, axis=0)
+        hits = (returns > 0).sum(axis=0)
+        avg = [float(s / c) if c > 0 else None for s, c in zip(sums, counts)]
+        hit = [float(h * 100.0 / c) if c > 0 else None for h, c in zip(hits, counts)]
+        valid = mae[~numpy.isnan(mae)]
+        return tuple(avg + hit + [float(valid.mean()) if len(valid) > 0 else None,
+                                  float(valid.min()) if len(valid) > 0 else None])
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description='forward returns of the ChartPatterns triggers per rule and tier')
+    parser.add_argument('filename', type=str, nargs='*', default=['watchlist.txt'],
+                        help='file that contains a list of ticker symbols')
+    parser.add_argument('-f', dest='start', required=True, help='first date evaluated')
+    parser.add_argument('-t', dest='end', default=None, help='last date evaluated')
+    parser.add_argument('-r', dest='rules', nargs='+', default=None,
+                        help='rules to replay, by ChartPatterns method name')
+    parser.add_argument('-T', dest='tiers', nargs='+', default=default_tiers,
+                        help='files of the symbols of each tier, ' + ' and '.join(default_tiers) + ' by default')
+    parser.add_argument('-b', dest='binary', action='store_true', default=False,
+                        help='read history from the binary bar store')
+    parser.add_argument('-j', dest='processes', type=int, default=None,
+                        help='number of worker processes')
+    return parser.parse_args()
+
+def main():
+    args = arg_parser()
+    rule_names = args.rules if args.rules is not None else ChartPatterns.rule_names
+    symbols, dataset, depth = load_history(read_watchlist(args.filename), args.start, rule_names,
+                                           'daily', 'npy' if args.binary else 'csv')
+    wf = WalkForward(symbols, dataset, rule_names, depth)
+    rows = wf.run(args.start, args.end, args.processes)
+    analytics = Analytics(MarketPanel.from_datasets(dataset, symbols), read_tiers(args.tiers))
+    print(tabulate(analytics.table(rows, rule_names), analytics.columns(), floatfmt=".2f"))
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
-from ptools import Metrics, WorkPool
+from ptools import Executor, FeatureFrame, MarketPanel, SharedPanel, events
+from ptools.featureFrame import as_frame
+from ptools.sharedPanel import attach
 from usdata import USMarket
-import numpy
+import numpy, multiprocessing, threading
 
 def window(center, size) :
     lower = center - min(center, int(size / 2))
@@ -14,20 +16,35 @@ def arrayWindow(array, center, size) :
 def count_crosses(a, b):
     assert(len(a) == len(b))
     assert(len(a) > 0)
-    size = len(a)
-    counts = []
-    for i in range(size - 1):
-        if (a[i] - b[i]) * (a[i+1] - b[i+1]) < 0:
-            counts.append(i)
-    return counts
+    return events.crosses(a, b).tolist()
 
+# every signal takes a FeatureFrame (or data that ptools.featureFrame.as_frame accepts),
+# so indicators shared by several rules are computed once per symbol
 class PriceSignals:
-    def __init__(self):
-        self.m = Metrics()
+    # thresholds of the signals; PriceSignals(params) overrides some of them, e.g. for pstrategy.sweep
+    defaults = {
+                'type1_lower': 0.95,      # Type1: a lower low is below the last support/resistance times this
+                'type1_upper': 1.05,      # Type1: the decline before starts above them times this
+                'type2_decline': 0.8,     # Type2: the low of the decline is below its initial price times this
+                'type2_breakout': 1.05,   # Type2: the breakout high is above that low times this
+                'type2_pullback': 0.85,   # Type2: the pullback stays above the breakout high times this
+                'macd_cross_gap': 7,      # MACD reversal: gold crosses closer than this are noise
+                'macd_latest_cross': 20,  # MACD reversal: the last gold cross is at most this many bars ago
+                'macd_cross_spacing': 55, # MACD reversal: and at most this many bars after the one before
+                'volume_floor': 500000,   # ChartPatterns: skip symbols that traded less in the last 10 bars
+                }
+
+    def __init__(self, params = None):
+        self.params = dict(self.defaults)
+        for name, value in (params or {}).items():
+            if name not in self.defaults:
+                raise ValueError('unknown parameter: ' + name)
+            self.params[name] = value
 
     def Type1_buy_point_MACD_bullish_divergence(self, data):
-        closePrices = [float(x['Close']) for x in data]
-        macd_all = self.m.macd_all(closePrices)
+        frame = as_frame(data)
+        closePrices = frame.column('Close')
+        macd_all = frame.macd_all()
         if macd_all == None:
             return False
 
@@ -40,11 +57,10 @@ class PriceSignals:
             return False
 
         #现在判断是否有"下跌-调整-下跌":
-        openPrices = [x['Open'] for x in data]
-        sr = self.m.support_and_resistance(openPrices, closePrices, 20)
+        sr = frame.support_and_resistance(20)
         sr_price = sr['price']
-        lower_bound = min(sr_price[0], sr_price[1]) * 0.95
-        upper_bound = max(sr_price[0], sr_price[1]) * 1.05
+        lower_bound = min(sr_price[0], sr_price[1]) * self.params['type1_lower']
+        upper_bound = max(sr_price[0], sr_price[1]) * self.params['type1_upper']
 
         if closePrices[0] > lower_bound:
             return False
@@ -100,9 +116,11 @@ class PriceSignals:
         # 如果进行到这里,则可以看成是满足条件
     """
     def Type2_buy_point_pullback_after_breakthrough(self, closePrices):
-        ema_short = self.m.ema(closePrices, 5)
-        ema_mid   = self.m.ema(closePrices, 10)
-        ema_long  = self.m.ema(closePrices, 20)
+        frame = as_frame(closePrices)
+        closePrices = frame.column('Close')
+        ema_short = frame.ema(5)
+        ema_mid   = frame.ema(10)
+        ema_long  = frame.ema(20)
         if closePrices[0] > closePrices[1]:
             return False
         if ema_short[0] > min(ema_mid[0], ema_long[0]):
@@ -135,8 +153,9 @@ class PriceSignals:
         init_price = closePrices[pos[2]]
         low_section3 = min(closePrices[pos[1]:pos[2]])
         high_section2 = max(closePrices[pos[0]:pos[1]])
-        if low_section3 > init_price * 0.8 or high_section2 < low_section3 * 1.05 or \
-           closePrices[0] < high_section2 * 0.85:
+        if low_section3 > init_price * self.params['type2_decline'] or \
+           high_section2 < low_section3 * self.params['type2_breakout'] or \
+           closePrices[0] < high_section2 * self.params['type2_pullback']:
             return False
 
         if closePrices[0] < min(closePrices[1:pos[2]]):
@@ -146,7 +165,9 @@ class PriceSignals:
 
     #MACD底部背驰
     def MACD_Bottom_reversal2(self, closePrices):
-        macd_all = self.m.macd_all(closePrices)
+        frame = as_frame(closePrices)
+        closePrices = frame.column('Close')
+        macd_all = frame.macd_all()
         if macd_all == None:
             return False
 
@@ -159,27 +180,21 @@ class PriceSignals:
             return False
 
         #find gold crosses
-        gold_crosses = []
         required = 2
-        for idx in range(len(macd_histo) - 1):
-            # if there is a dead cross before the first gold cross, False
-            if len(gold_crosses) == 0 and \
-                    (macd_histo[idx] < 0 and macd_histo[idx+1] >= 0):
-                return False
-            if macd_histo[idx] > 0 and macd_histo[idx+1] <= 0:
-                curLen = len(gold_crosses)
-                if curLen > 0 and idx - gold_crosses[curLen-1] < 7:
-                    continue # gold crosses are too close, just noise, ignore
-                gold_crosses.append(idx)
-                if len(gold_crosses) == required:
-                    break
+        golds = events.gold_crosses(macd_histo)
+        deads = events.dead_crosses(macd_histo)
+        # if there is a dead cross before the first gold cross, False
+        if len(deads) > 0 and (len(golds) == 0 or deads[0] < golds[0]):
+            return False
+        # gold crosses that are too close are just noise, ignore
+        gold_crosses = events.thin(golds, self.params['macd_cross_gap'])[:required].tolist()
         if len(gold_crosses) < required:
             return False
 
         # Am I coming late?
         # reversal coming a long time after previous gold cross? yes -> must be weak
-        if gold_crosses[0] > 20 or\
-           gold_crosses[1] - gold_crosses[0] > 55:
+        if gold_crosses[0] > self.params['macd_latest_cross'] or\
+           gold_crosses[1] - gold_crosses[0] > self.params['macd_cross_spacing']:
             return False
 
         fcrossed = [macd_fast[x] for x in gold_crosses]
@@ -198,7 +213,16 @@ class PriceSignals:
         return True
 
     #Note that the 'Open' data of the current day is not reliable, so let's not depend on it
-    def Bottom_Up(self, openPrices, closePrices, lows, highs):
+    # takes either a frame or the four price lists
+    def Bottom_Up(self, openPrices, closePrices = None, lows = None, highs = None):
+        if closePrices is None:
+            frame = as_frame(openPrices)
+        else:
+            frame = FeatureFrame.from_columns(Open=openPrices, Close=closePrices, Low=lows, High=highs)
+        openPrices = frame.column('Open')
+        closePrices = frame.column('Close')
+        lows = frame.column('Low')
+        highs = frame.column('High')
         #previous bar must be a nagative bar
         if not (closePrices[1] < openPrices[1]):
             return False
@@ -208,14 +232,14 @@ class PriceSignals:
 
         #if any recent close price is higher than ema_5 or ema_10, pass
         #a low price is necessary for profitable reversal
-        ema_5  = Metrics().ema(closePrices, 5)
-        ema_10 = Metrics().ema(closePrices, 10)
+        ema_5  = frame.ema(5)
+        ema_10 = frame.ema(10)
         for idx in range(1, 3):
             if closePrices[idx] > min(ema_5[idx], ema_10[idx]):
                 return False
 
         # look back 300 bars for support and resistence, very old bars are not reliable
-        sr = self.m.support_and_resistance(openPrices[:300], closePrices[:300])
+        sr = frame.support_and_resistance(10, 300)
         myrange = {'min': lows[1], 'max':max(closePrices[0], highs[1])}
         foundSupport = False
         supportIdx = -1
@@ -245,19 +269,19 @@ class PriceSignals:
         return True
 
     def New_High(self, data):
-        if len(data) < 100:
+        frame = as_frame(data)
+        if len(frame) < 100:
             return False
         cutoff = 3
         maxhistory = 80
-        closePrices = [x['Close'] for x in data]
-        openPrices = [x['Open'] for x in data]
+        closePrices = frame.column('Close')
         recentMaxClose = max(closePrices[:cutoff])
 
-        previousHigh = max([x['High'] for x in data][cutoff:maxhistory])
+        previousHigh = max(frame.column('High')[cutoff:maxhistory])
         if previousHigh > recentMaxClose:
             return False
 
-        sr = self.m.support_and_resistance(openPrices, closePrices)
+        sr = frame.support_and_resistance()
         sr_count_limit = 4
         if len(sr['idx']) < sr_count_limit or sr['idx'][sr_count_limit-1] > maxhistory:
             return False
@@ -267,19 +291,19 @@ class PriceSignals:
         if sr_min < sr_max * 0.9:
             return False
 
-        ma5 = self.m.sma(closePrices, 5)[:100]
-        ma10 = self.m.sma(closePrices, 10)[:100]
-        ma20 = self.m.sma(closePrices, 20)[:100]
+        ma5 = frame.sma(5)[:100]
+        ma10 = frame.sma(10)[:100]
+        ma20 = frame.sma(20)[:100]
 
         if ma5[0] < ma10[0]:
             return False
 
-        ma_crosses5_10 = count_crosses(ma5, ma10)
+        ma_crosses5_10 = events.crosses(ma5, ma10)
         if len(ma_crosses5_10) < 3 or \
             ma_crosses5_10[0] > 7: #too late
             return False
 
-        ma_crosses10_20 = count_crosses(ma10, ma20)
+        ma_crosses10_20 = events.crosses(ma10, ma20)
         if len(ma_crosses10_20) == 0 or \
             ma_crosses10_20[0] > 30 : #too late
             return False
@@ -287,124 +311,180 @@ class PriceSignals:
 
         return True
 
+def enough_volume(frame, signals):
+    return min(frame.column('Volume')[:10]) >= signals.params['volume_floor'] #skip whose volume is less than 500K by default
+
+# test of each ChartPatterns rule on the frame of one symbol with the thresholds of 'signals'
+# (a PriceSignals), by rule name; also replayed date by date by pstrategy.walkForward
+rule_tests = {
+    'signal_Type1_buy_point': lambda frame, signals: signals.Type1_buy_point_MACD_bullish_divergence(frame),
+    'signal_Type2_buy_point': lambda frame, signals: signals.Type2_buy_point_pullback_after_breakthrough(frame),
+    'signal_MACD_bottom_reversal': lambda frame, signals: enough_volume(frame, signals) and signals.MACD_Bottom_reversal2(frame),
+    'singal_bottom_up': lambda frame, signals: signals.Bottom_Up(frame),
+    'signal_new_high': lambda frame, signals: enough_volume(frame, signals) and signals.New_High(frame),
+}
+
+# thresholds of PriceSignals.defaults read by each rule
+rule_params = {
+    'signal_Type1_buy_point': ['type1_lower', 'type1_upper'],
+    'signal_Type2_buy_point': ['type2_decline', 'type2_breakout', 'type2_pullback'],
+    'signal_MACD_bottom_reversal': ['macd_cross_gap', 'macd_latest_cross', 'macd_cross_spacing', 'volume_floor'],
+    'singal_bottom_up': [],
+    'signal_new_high': ['volume_floor'],
+}
+
 class ChartPatterns:
-    def __init__(self, watchlist, datasets):
+    # params: thresholds that differ from PriceSignals.defaults
+    def __init__(self, watchlist, datasets, params = None):
         self.market_stopped = False
         self.symbols = watchlist
         self.missing_data = []
         self.missing_analysis = []
         self.metrics = {sym : {} for sym in watchlist}
         self.datasets = datasets
-
-    # Type1_buy_point_MACD_bullish_divergence
-    def signal_Type1_buy_point(self, symbols):
-        name = '一类买点'
+        self.params = params
+        self.signals = PriceSignals(params)
+        self.frames = {}
+        self.rlock = threading.RLock()
+
+    # shared by all rules, so indicators are computed once per symbol
+    def frame(self, sym):
+        with self.rlock:
+            if sym not in self.frames:
+                if isinstance(self.datasets, MarketPanel):
+                    self.frames[sym] = self.datasets.frame(sym)
+                else:
+                    self.frames[sym] = FeatureFrame(self.datasets[sym])
+            return self.frames[sym]
+
+    # rules run in worker threads
+    def skip(self, sym):
+        with self.rlock:
+            if sym not in self.missing_analysis:
+                self.missing_analysis.append(sym)
+
+    # runs the test of a rule on every symbol, symbols that can't be analyzed are skipped
+    def apply(self, rule_name, name, symbols):
         result = []
         for sym in symbols:
             try:
-                if PriceSignals().Type1_buy_point_MACD_bullish_divergence(self.datasets[sym]):
+                if rule_tests[rule_name](self.frame(sym), self.signals):
                     result.append(sym)
             except:
-                if sym not in self.missing_analysis:
-                    self.missing_analysis.append(sym)
+                self.skip(sym)
         return {'name':name, 'result':result}
 
+    # Type1_buy_point_MACD_bullish_divergence
+    def signal_Type1_buy_point(self, symbols):
+        return self.apply('signal_Type1_buy_point', '一类买点', symbols)
+
     # Type2_buy_point_pullback_after_breakthrough
     def signal_Type2_buy_point(self, symbols):
-        name = '二类买点'
-        result = []
-        for sym in symbols:
-            closePrices = [float(x['Close']) for x in self.datasets[sym]]
-            try:
-                if PriceSignals().Type2_buy_point_pullback_after_breakthrough(closePrices):
-                    result.append(sym)
-            except:
-                if sym not in self.missing_analysis:
-                    self.missing_analysis.append(sym)
-        return {'name':name, 'result':result}
-
+        return self.apply('signal_Type2_buy_point', '二类买点', symbols)
 
     def signal_MACD_bottom_reversal(self, symbols):
-        name = 'MACD底部背驰'
-        result = []
-        for sym in symbols:
-            volumes = [float(x['Volume']) for x in self.datasets[sym]]
-            if min(volumes[:10]) < 500000: #skip whose volume is less than 500K
-                continue
-            closePrices = [float(x['Close']) for x in self.datasets[sym]]
-            try:
-                if PriceSignals().MACD_Bottom_reversal2(closePrices):
-                    result.append(sym)
-            except:
-                if sym not in self.missing_analysis:
-                    self.missing_analysis.append(sym)
-        return {'name':name, 'result':result}
+        return self.apply('signal_MACD_bottom_reversal', 'MACD底部背驰', symbols)
 
     def singal_bottom_up(self, symbols):
         #插入线，待入线，切入线, 包线
-        name = '反弹'
-        result = []
-        for sym in symbols:
-            try:
-                openPrices = [x['Open'] for x in self.datasets[sym]]
-                closePrices = [x['Close'] for x in self.datasets[sym]]
-                lowPrices = [x['Low'] for x in self.datasets[sym]]
-                highPrices = [x['High'] for x in self.datasets[sym]]
-                if PriceSignals().Bottom_Up(openPrices, closePrices, lowPrices, highPrices):
-                    result.append(sym)
-            except:
-                if sym not in self.missing_analysis:
-                    self.missing_analysis.append(sym)
-        return {'name':name, 'result':result}
+        return self.apply('singal_bottom_up', '反弹', symbols)
 
     def signal_new_high(self, symbols):
-        name = '新高'
-        result = []
-        for sym in symbols:
-            try:
-                volumes = [float(x['Volume']) for x in self.datasets[sym]]
-                if min(volumes[:10]) < 500000: #skip whose volume is less than 500K
-                    continue
-                if PriceSignals().New_High(self.datasets[sym]):
-                    result.append(sym)
-            except:
-                if sym not in self.missing_analysis:
-                    self.missing_analysis.append(sym)
-        return {'name':name, 'result':result}
-
-    def run_rule(self, rule, symbols):
-        ret = rule(symbols)
-        if len(ret['result']) == 0:
-            return
-        self.wpool.lock()
-        self.all_rule_results.append(ret)
-        self.wpool.unlock()
-
-    def run(self):
-        self.all_rule_results = []
-
-        rules = [
-                 self.signal_Type1_buy_point,
-                 self.signal_MACD_bottom_reversal,
-                 self.signal_new_high,
-                 ]
-        # self.signal_Type2_buy_point,
-        # self.singal_bottom_up
-
-        wpool = WorkPool(10)
-        self.wpool = wpool
-        for rule in rules:
-            wpool.start_work_arg2(self.run_rule, rule, self.symbols)
-        wpool.wait_for_all()
-
-        for result in self.all_rule_results:
+        return self.apply('signal_new_high', '新高', symbols)
+
+    # rules used by run(), by method name so that worker processes can look them up
+    rule_names = [
+                  'signal_Type1_buy_point',
+                  'signal_MACD_bottom_reversal',
+                  'signal_new_high',
+                  ]
+    # 'signal_Type2_buy_point',
+    # 'singal_bottom_up'
+
+    # bars of history each rule reads, with room for the warm-up of its moving averages:
+    # Type1 walks back over support/resistance points to the decline before the last one,
+    # MACD reversal looks for two gold crosses up to 20 + 55 bars back, New_High needs 100 bars
+    # of 20-bar averages, Bottom_Up looks 300 bars back for support
+    lookback = {
+                'signal_Type1_buy_point': 300,
+                'signal_Type2_buy_point': 200,
+                'signal_MACD_bottom_reversal': 200,
+                'singal_bottom_up': 350,
+                'signal_new_high': 200,
+                }
+
+    # history the rules need, the depth to load with USMarket(depth=...)
+    @classmethod
+    def required_depth(cls, rule_names = None):
+        return max(cls.lookback[name] for name in (rule_names if rule_names is not None else cls.rule_names))
+
+    def run_threads(self):
+        with Executor(10) as executor:
+            futures = [executor.submit(getattr(self, name), self.symbols) for name in self.rule_names]
+            return [f.result() for f in futures]
+
+    # symbols are sharded across worker processes, every worker runs all rules on its shards.
+    # market data is published once in shared memory (ptools.SharedPanel), workers read it in place
+    def run_processes(self, processes):
+        if len(self.symbols) == 0:
+            return self.run_threads()
+        panel = self.datasets
+        if not isinstance(panel, MarketPanel):
+            panel = MarketPanel.from_datasets(self.datasets, [sym for sym in self.symbols if sym in self.datasets])
+        nshards = min(len(self.symbols), processes * 4)
+        shards = [self.symbols[i::nshards] for i in range(nshards)]
+        with SharedPanel(panel) as shared, \
+             multiprocessing.Pool(processes, initializer=init_scan_worker,
+                                  initargs=(self.symbols, shared.handle, self.params)) as pool:
+            shard_results = pool.map(scan_shard, [(self.rule_names, shard) for shard in shards])
+
+        # merge deterministically: rule order first, then the order of the watchlist
+        order = {sym: i for i, sym in enumerate(self.symbols)}
+        results = []
+        for r, name in enumerate(self.rule_names):
+            found = [sym for rule_results, _ in shard_results for sym in rule_results[r]['result']]
+            results.append({'name': shard_results[0][0][r]['name'],
+                            'result': sorted(found, key=lambda sym: order[sym])})
+        for _, missing in shard_results:
+            for sym in missing:
+                self.skip(sym)
+        self.missing_analysis.sort(key=lambda sym: order[sym])
+        return results
+
+    # processes: number of worker processes; None or 1 runs the rules in threads.
+    # returns [{'name', 'result'}] in rule order
+    def scan(self, processes = None):
+        if processes is not None and processes > 1:
+            return self.run_processes(processes)
+        return self.run_threads()
+
+    def run(self, processes = None):
+        print_results(self.scan(processes), self.missing_data, self.missing_analysis)
+
+def print_results(rule_results, missing_data, missing_analysis):
+    for result in rule_results:
+        if len(result['result']) > 0:
             print(result['name'] + ': '+ ' '.join(result['result']))
 
-        if len(self.missing_data) > 0:
-            print('missing data: ' + ' '.join(self.missing_data))
+    if len(missing_data) > 0:
+        print('missing data: ' + ' '.join(missing_data))
+
+    if len(missing_analysis) > 0:
+        print('skipped symbols: ' + ' '.join(missing_analysis))
+
+# state of a worker process of ChartPatterns.run_processes
+scan_worker_patterns = None
+
+def init_scan_worker(watchlist, handle, params = None):
+    global scan_worker_patterns
+    scan_worker_patterns = ChartPatterns(watchlist, attach(handle), params)
 
-        if len(self.missing_analysis) > 0:
-            print('skipped symbols: ' + ' '.join(self.missing_analysis))
+def scan_shard(args):
+    rule_names, symbols = args
+    cp = scan_worker_patterns
+    cp.missing_analysis = []
+    results = [getattr(cp, name)(symbols) for name in rule_names]
+    return results, cp.missing_analysis
 
 
 def main() :
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Parameter sweep of the PriceSignals thresholds: every configuration of a grid is replayed over the
+same history by the walk-forward backtest (pstrategy.walkForward), and the configurations are
+ranked by the returns after their triggers.
+All configurations are evaluated on the same frame of a date, so indicators are computed once for
+the whole grid, and a rule runs once per distinct value of the thresholds it reads.
+Worker processes read one copy of the data from shared memory.
+
+  python3 -m pstrategy.sweep all-1b-100b -f 2015-01-01 -t 2016-06-30 -j 8 \\
+          -p type1_lower=0.93,0.95,0.97 -p type1_upper=1.03,1.05,1.07
+"""
+
+import argparse, itertools
+from tabulate import tabulate
+from .chartPatterns import ChartPatterns, PriceSignals, rule_params
+from .walkForward import WalkForward, load_history
+from usdata import read_watchlist
+
+class Sweep(WalkForward):
+    key_columns = ['Config', 'Rule']
+
+    # grid: {parameter of PriceSignals.defaults: [values]}, every combination is a configuration.
+    # rule_names: by default the rules that read a parameter of the grid
+    def __init__(self, symbols, datasets, grid, rule_names = None, depth = None, horizons = (1, 5, 10, 20)):
+        self.grid = {name: list(values) for name, values in grid.items()}
+        for name in self.grid.keys():
+            if name not in PriceSignals.defaults:
+                raise ValueError('unknown parameter: ' + name)
+        if rule_names is None:
+            rule_names = [name for name in ChartPatterns.rule_names
+                          if len(set(rule_params[name]) & set(self.grid.keys())) > 0] or ChartPatterns.rule_names
+        WalkForward.__init__(self, symbols, datasets, rule_names, depth, horizons)
+        self.configs = [dict(zip(self.grid.keys(), values)) for values in itertools.product(*self.grid.values())]
+
+    def options(self):
+        return {'grid': self.grid, 'rule_names': self.rule_names, 'depth': self.depth, 'horizons': self.horizons}
+
+    def tests(self):
+        ret = []
+        for k, params in enumerate(self.configs):
+            signals = PriceSignals(params)
+            ret += [((k, name), name, signals) for name in self.rule_names]
+        return ret
+
+    # (config, parameters, rule, triggers, %avg, %up) of every configuration and rule, ranked by the
+    # average return 'horizon' bars after the triggers (the longest horizon by default), best first.
+    # Configurations with fewer than min_triggers triggers come last
+    def rank(self, rows, horizon = None, min_triggers = 1):
+        k = self.horizons.index(horizon if horizon is not None else self.horizons[-1])
+        ret = []
+        for line in self.summary(rows):
+            config, name, count = line[:3]
+            avg, up = line[3 + 2 * k], line[4 + 2 * k]
+            ret.append((config, self.configs[config], name, count, avg, up))
+        return sorted(ret, key=lambda r: (r[3] < min_triggers or r[4] is None, -(r[4] or 0), r[0]))
+
+# 'name=v1,v2,...' -> (name, [values]), numbers are read as int or float
+def parse_param(text):
+    name, values = text.split('=', 1)
+    return name.strip(), [float(v) if any(c in v for c in '.e') else int(v) for v in values.split(',')]
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description='rank PriceSignals thresholds by the returns after their triggers')
+    parser.add_argument('filename', type=str, nargs='*', default=['watchlist.txt'],
+                        help='file that contains a list of ticker symbols')
+    parser.add_argument('-p', dest='params', action='append', required=True,
+                        help='parameter and its values, like type1_lower=0.93,0.95,0.97; repeat for more. '
+                             'Parameters: ' + ' '.join(PriceSignals.defaults.keys()))
+    parser.add_argument('-f', dest='start', required=True, help='first date evaluated')
+    parser.add_argument('-t', dest='end', default=None, help='last date evaluated')
+    parser.add_argument('-r', dest='rules', nargs='+', default=None,
+                        help='rules to replay, by ChartPatterns method name')
+    parser.add_argument('-n', dest='horizon', type=int, default=None,
+                        help='rank by the return after this many bars (1, 5, 10 or 20), 20 by default')
+    parser.add_argument('-m', dest='min_triggers', type=int, default=10,
+                        help='configurations with fewer triggers are ranked last')
+    parser.add_argument('-b', dest='binary', action='store_true', default=False,
+                        help='read history from the binary bar store')
+    parser.add_argument('-j', dest='processes', type=int, default=None,
+                        help='number of worker processes')
+    return parser.parse_args()
+
+def main():
+    args = arg_parser()
+    grid = dict(parse_param(p) for p in args.params)
+    sweep = Sweep([], {}, grid, args.rules)
+    symbols, dataset, depth = load_history(read_watchlist(args.filename), args.start, sweep.rule_names,
+                                           'daily', 'npy' if args.binary else 'csv')
+    sweep = Sweep(symbols, dataset, grid, sweep.rule_names, depth)
+    rows = sweep.run(args.start, args.end, args.processes)
+    ranked = [(config, ' '.join(k + '=' + str(v) for k, v in params.items()), name, count, avg, up)
+              for config, params, name, count, avg, up in sweep.rank(rows, args.horizon, args.min_triggers)]
+    horizon = str(args.horizon if args.horizon is not None else sweep.horizons[-1])
+    print(tabulate(ranked, ['Config', 'Parameters', 'Rule', 'Triggers', '%Avg' + horizon, '%Up' + horizon],
+                   floatfmt=".2f"))
+
+if __name__ == '__main__':
+    main()
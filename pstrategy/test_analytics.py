@@ -0,0 +1,50 @@
+from unittest import TestCase
+import math
+import numpy
+from ptools import BarSeries, MarketPanel
+from ptools.tradingCalendar import TradingCalendar
+from pstrategy.chartPatterns import rule_tests
+from pstrategy.walkForward import WalkForward
+from pstrategy.analytics import Analytics
+from fixtures import make_series
+
+class TestAnalytics(TestCase):
+    def setUp(self):
+        cal = TradingCalendar(2014, 2016)
+        dates = cal.sessions[cal.sessions <= cal.latest_session('2016-08-03')][-500:][::-1]
+        self.datasets = {sym: make_series(dates, i) for i, sym in enumerate(['AAA', 'BBB', 'CCC'])}
+        # CCC has no bar on every 7th session: the panel has NaN columns for it
+        ccc = self.datasets['CCC']
+        keep = numpy.arange(len(ccc)) % 7 != 3
+        self.datasets['CCC'] = BarSeries(ccc.dates[keep], {f: v[keep] for f, v in ccc.columns.items()})
+
+    def test_analytics(self):
+        wf = WalkForward(['AAA', 'BBB', 'CCC'], self.datasets, list(rule_tests.keys()))
+        rows = wf.run('2016-01-04', '2016-08-03')
+        assert any(row[1] == 'CCC' for row in rows)
+        panel = MarketPanel.from_datasets(self.datasets)
+        analytics = Analytics(panel, {'big': {'AAA', 'BBB'}, 'etf': {'CCC', 'BBB'}})
+        out = analytics.outcomes(rows)
+        # same forward returns as the replay, which counts bars of the symbol itself
+        assert numpy.allclose(out['returns'], numpy.array([row[4:] for row in rows], dtype=float), equal_nan=True)
+        for k in range(len(rows)):
+            series = self.datasets[rows[k][1]]
+            i = len(series) - len(series.until(rows[k][2]))
+            lows = series.column('Low')[max(0, i - 20):i]
+            # nothing after the most recent bar: no excursion yet
+            expected = min(0, (lows.min() / series[i]['Close'] - 1) * 100) if len(lows) > 0 else numpy.nan
+            assert numpy.allclose(out['mae'][k], expected, equal_nan=True)
+        assert numpy.isnan(out['mae'][[k for k, row in enumerate(rows) if row[2] == '2016-08-03']]).all()
+        table = analytics.table(rows)
+        assert analytics.columns()[3] == '%Avg1' and len(table[0]) == len(analytics.columns())
+        for rule in set(row[0] for row in rows):
+            counts = {line[1]: line[2] for line in table if line[0] == rule}
+            mine = [row for row in rows if row[0] == rule]
+            assert counts['all'] == len(mine)
+            assert counts.get('big', 0) == len([row for row in mine if row[1] in ('AAA', 'BBB')])
+            line = [line for line in table if line[0] == rule and line[1] == 'all'][0]
+            values = numpy.array([row[5] for row in mine], dtype=float)
+            values = values[~numpy.isnan(values)]
+            if len(values) > 0:
+                assert math.isclose(line[4], values.mean()) and math.isclose(line[8], (values > 0).mean() * 100)
+        assert analytics.table([]) == []
@@ -1,12 +1,26 @@
-from ptools import Metrics
+from ptools import FeatureFrame, MarketPanel
 from usdata import USMarket
 
 class TripleScreen:
+    # bars of history the screens read: 26-bar averages and MACD, with warm-up
+    lookback = 150
+
     def __init__(self, watchlist, datasetLong, datasetMid = None, datasetShort = None):
         self.watchlist = watchlist
         self.datasetLong = datasetLong
         self.datasetMid = datasetMid
         self.datasetShort = datasetShort
+        self.frames = {}
+
+    # one frame per symbol and dataset, indicators are computed once
+    def frame(self, sym, data):
+        key = (id(data), sym)
+        if key not in self.frames:
+            if isinstance(data, MarketPanel):
+                self.frames[key] = data.frame(sym)
+            else:
+                self.frames[key] = FeatureFrame(data[sym])
+        return self.frames[key]
 
     def long_opportunities(self):
         picked1 = []
@@ -26,13 +40,14 @@ class TripleScreen:
         return picked2
 
     def pulsesystem_should_long(self, sym, data):
-        closePrices = [float(x['Close']) for x in data[sym]]
-        macd_all = Metrics().macd_all(closePrices)
+        frame = self.frame(sym, data)
+        closePrices = frame.column('Close')
+        macd_all = frame.macd_all()
         if macd_all == None: # not enough data
             return False
         macd_h = macd_all['histo']
-        ema_fast = Metrics().ema(closePrices, 10)
-        sma_slow = Metrics().sma(closePrices, 26)
+        ema_fast = frame.ema(10)
+        sma_slow = frame.sma(26)
         # macd and ema rising, and price is higher than half-year average
         try:
             if closePrices[0] < sma_slow[0]:
@@ -49,9 +64,10 @@ class TripleScreen:
         return False
 
     def macd_buy_point(self, sym, data):
-        closePrices = [float(x['Close']) for x in data[sym]]
-        macd_h = Metrics().macd_all(closePrices)['histo']
-        ema = Metrics().ema(closePrices, 30)
+        frame = self.frame(sym, data)
+        closePrices = frame.column('Close')
+        macd_h = frame.macd_all()['histo']
+        ema = frame.ema(30)
         # (1) macd-h going up; (2) still negative; (3) price declining but still above ema
         if macd_h[0] >= macd_h[1] and closePrices[0] > max(closePrices[1], ema[0]):
            #price is above ema30
@@ -60,16 +76,13 @@ class TripleScreen:
 
 
     def forceindex_should_long(self, sym, data):
-        closePrices = [float(x['Close']) for x in data[sym]]
-        volumes = [float(x['Volume']) for x in data[sym]]
-        forceIndex = Metrics().forceIndex(closePrices, volumes)
+        forceIndex = self.frame(sym, data).forceIndex()
         if forceIndex[0] < 0:
             return True
         return False
 
     def rsi_should_long(self, sym, data):
-        closePrices = [float(x['Close']) for x in data[sym]]
-        rsiArray = Metrics().rsi(closePrices)
+        rsiArray = self.frame(sym, data).rsi()
         for i in range(10):
             if rsiArray[i] > rsiArray[i+1] and rsiArray[i+1] < 40:
                 return True
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+"""
+Walk-forward backtest of the ChartPatterns rules: the history of the watchlist is loaded once,
+then every rule is evaluated at every historical date on the bars visible on that date.
+The bars of a date are a view of the symbol's series, series[i:i+depth], the same window a scan
+with USMarket(watchlist, date, depth=depth) would see, so nothing is copied or reloaded per date.
+Every trigger is recorded with the returns of the following bars.
+
+  python3 -m pstrategy.walkForward all-1b-100b -f 2014-01-01 -t 2016-06-30 -j 8
+"""
+
+import argparse, multiprocessing
+import numpy
+from tabulate import tabulate
+from ptools import FeatureFrame, MarketPanel, SharedPanel
+from ptools.barStore import date_to_ordinal
+from ptools.sharedPanel import attach
+from .chartPatterns import ChartPatterns, PriceSignals, rule_tests, rule_params
+import usdata
+from usdata import USMarket, read_watchlist
+
+class WalkForward:
+    key_columns = ['Rule']
+
+    # datasets: {sym: BarSeries} as USMarket.getData() returns, or a MarketPanel
+    # rule_names: ChartPatterns rules to replay; depth: bars visible on each date, the rules' lookback by default
+    # horizons: forward returns recorded for each trigger, in bars; params: thresholds of PriceSignals
+    def __init__(self, symbols, datasets, rule_names = None, depth = None, horizons = (1, 5, 10, 20), params = None):
+        self.symbols = symbols
+        self.datasets = datasets
+        self.rule_names = list(rule_names) if rule_names is not None else list(ChartPatterns.rule_names)
+        self.depth = depth if depth is not None else ChartPatterns.required_depth(self.rule_names)
+        self.horizons = list(horizons)
+        self.params = params
+        self.skipped = {} # sym -> number of (date, rule) evaluations that raised
+
+    # arguments that rebuild this object over other data, in a worker process
+    def options(self):
+        return {'rule_names': self.rule_names, 'depth': self.depth, 'horizons': self.horizons, 'params': self.params}
+
+    # (key, rule name, PriceSignals) of every rule replayed; the key starts the rows of its triggers
+    def tests(self):
+        signals = PriceSignals(self.params)
+        return [((name,), name, signals) for name in self.rule_names]
+
+    def series(self, sym):
+        if isinstance(self.datasets, MarketPanel):
+            return self.datasets.series(sym)
+        return self.datasets[sym]
+
+    # column names of the rows returned by run()
+    def columns(self):
+        return self.key_columns + ['Symbol', 'Date', 'Close'] + ['%Return' + str(h) for h in self.horizons]
+
+    # triggers of one symbol on the dates within [start, end] ('YYYY-MM-DD', None is unbounded)
+    def walk(self, sym, start = None, end = None):
+        series = self.series(sym)
+        dates = series.dates
+        # most recent first: positions of the newest and the oldest date in range
+        first = 0 if end is None else int(numpy.searchsorted(-dates, -date_to_ordinal(end), side='left'))
+        last = len(dates) if start is None else int(numpy.searchsorted(-dates, -date_to_ordinal(start), side='right'))
+        tests = self.tests()
+        found = {key: [] for key, _, _ in tests}
+        for i in range(first, last):
+            # indicators of a date are shared by all rules
+            frame = FeatureFrame(series[i:i + self.depth])
+            # tests of a rule whose thresholds are the same share one evaluation
+            done = {}
+            for key, name, signals in tests:
+                token = (name,) + tuple(signals.params[p] for p in rule_params[name])
+                if token not in done:
+                    try:
+                        done[token] = bool(rule_tests[name](frame, signals))
+                    except:
+                        done[token] = False
+                        self.skipped[sym] = self.skipped.get(sym, 0) + 1
+                if done[token]:
+                    found[key].append(i)
+        return self.triggers(sym, series, [(key, found[key]) for key, _, _ in tests])
+
+    # forward returns of all triggers of a symbol at once: close of bar i-h over close of bar i
+    def triggers(self, sym, series, found):
+        closes = series.column('Close')
+        ret = []
+        for key, indices in found:
+            idx = numpy.array(indices, dtype=int)
+            if len(idx) == 0:
+                continue
+            forward = []
+            for h in self.horizons:
+                later = idx - h
+                values = numpy.full(len(idx), numpy.nan)
+                ok = later >= 0 # not enough bars after the trigger yet
+                values[ok] = (closes[later[ok]] / closes[idx[ok]] - 1) * 100
+                forward.append(values.tolist())
+            for k, i in enumerate(idx.tolist()):
+                ret.append(key + (sym, series[i]['Date'], float(closes[i])) + tuple(f[k] for f in forward))
+        return ret
+
+    # [(rule, sym, date, close, %return for each horizon)], by rule, symbol and date;
+    # each row starts with the key of its test, see tests()
+    # processes: number of worker processes sharing the data through shared memory, None runs here
+    def run(self, start = None, end = None, processes = None):
+        symbols = [sym for sym in self.symbols if isinstance(self.datasets, MarketPanel) or sym in self.datasets]
+        if processes is not None and processes > 1 and len(symbols) > 0:
+            results = self.run_processes(symbols, start, end, processes)
+        else:
+            results = [self.walk(sym, start, end) for sym in symbols]
+        n = len(self.key_columns)
+        order = {key: i for i, (key, _, _) in enumerate(self.tests())}
+        rows = [row for rows in results for row in rows]
+        return sorted(rows, key=lambda row: (order[row[:n]], row[n], row[n + 1]))
+
+    def run_processes(self, symbols, start, end, processes):
+        panel = self.datasets
+        if not isinstance(panel, MarketPanel):
+            panel = MarketPanel.from_datasets(self.datasets, symbols)
+        nshards = min(len(symbols), processes * 4)
+        shards = [symbols[i::nshards] for i in range(nshards)]
+        with SharedPanel(panel) as shared, \
+             multiprocessing.Pool(processes, initializer=init_walk_worker,
+                                  initargs=(shared.handle, type(self), self.options())) as pool:
+            shard_results = pool.map(walk_shard, [(shard, start, end) for shard in shards])
+        for _, skipped in shard_results:
+            for sym, count in skipped.items():
+                self.skipped[sym] = self.skipped.get(sym, 0) + count
+        return [rows for rows, _ in shard_results]
+
+    # per test: its key, the number of triggers, then the average and the share of positive returns per horizon
+    def summary(self, rows):
+        n = len(self.key_columns)
+        byKey = {key: [] for key, _, _ in self.tests()}
+        for row in rows:
+            byKey[row[:n]].append(row)
+        ret = []
+        for key, mine in byKey.items():
+            line = list(key) + [len(mine)]
+            for k in range(len(self.horizons)):
+                values = numpy.array([row[n + 3 + k] for row in mine], dtype=float)
+                values = values[~numpy.isnan(values)]
+                line += [values.mean() if len(values) > 0 else None,
+                         (values > 0).mean() * 100 if len(values) > 0 else None]
+            ret.append(tuple(line))
+        return ret
+
+    def summary_columns(self):
+        ret = self.key_columns + ['Triggers']
+        for h in self.horizons:
+            ret += ['%Avg' + str(h), '%Up' + str(h)]
+        return ret
+
+# state of a worker process of WalkForward.run_processes
+walk_worker = None
+
+# cls and options rebuild the WalkForward (or subclass) of the parent over the shared panel
+def init_walk_worker(handle, cls, options):
+    global walk_worker
+    panel = attach(handle)
+    walk_worker = cls(panel.symbols, panel, **options)
+
+def walk_shard(args):
+    symbols, start, end = args
+    walk_worker.skipped = {}
+    return [row for sym in symbols for row in walk_worker.walk(sym, start, end)], walk_worker.skipped
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description='replay the ChartPatterns rules over every historical date')
+    parser.add_argument('filename', type=str, nargs='*', default=['watchlist.txt'],
+                        help='file that contains a list of ticker symbols')
+    parser.add_argument('-f', dest='start', required=True, help='first date evaluated')
+    parser.add_argument('-t', dest='end', default=None, help='last date evaluated')
+    parser.add_argument('-w', dest='frequency', default='daily', help='daily (default) or weekly data')
+    parser.add_argument('-r', dest='rules', nargs='+', default=None,
+                        help='rules to replay, by ChartPatterns method name')
+    parser.add_argument('-b', dest='binary', action='store_true', default=False,
+                        help='read history from the binary bar store')
+    parser.add_argument('-j', dest='processes', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('-a', dest='all', action='store_true', default=False,
+                        help='list every trigger, not only the summary')
+    return parser.parse_args()
+
+# the watchlist's history for a replay from 'start' to today: everything up to today is loaded, so
+# triggers near the end date have forward returns, and the oldest evaluated date still has the
+# full lookback of the rules behind it. Returns (symbols with data, {sym: BarSeries}, lookback)
+def load_history(watchlist, start, rule_names, frequency = 'daily', storage = 'csv'):
+    today = usdata.get_latest_trading_date()
+    if frequency == 'daily':
+        span = usdata.tradingCalendar.sessions_between(start, today)
+    else:
+        span = (date_to_ordinal(today) - date_to_ordinal(start)) // 7 + 1
+    depth = ChartPatterns.required_depth(rule_names)
+    market = USMarket(watchlist, storage = storage, depth = depth + span)
+    dataset, missing = market.getData(frequency)
+    if len(missing) > 0:
+        print('symbols missing data: ' + str(missing))
+    return [sym for sym in watchlist if sym not in missing], dataset, depth
+
+def main():
+    args = arg_parser()
+    rule_names = args.rules if args.rules is not None else ChartPatterns.rule_names
+    symbols, dataset, depth = load_history(read_watchlist(args.filename), args.start, rule_names,
+                                           args.frequency, 'npy' if args.binary else 'csv')
+    wf = WalkForward(symbols, dataset, rule_names, depth)
+    rows = wf.run(args.start, args.end, args.processes)
+    if args.all:
+        print(tabulate(rows, wf.columns(), floatfmt=".2f"))
+    print(tabulate(wf.summary(rows), wf.summary_columns(), floatfmt=".2f"))
+
+if __name__ == '__main__':
+    main()
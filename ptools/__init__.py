@@ -1,2 +1,12 @@
+from .executor import Executor
 from .workPool import WorkPool
-from .metrics import Metrics
\ No newline at end of file
+from .metrics import Metrics
+from .arrayMetrics import ArrayMetrics, PanelMetrics
+from .barSeries import BarSeries
+from .featureFrame import FeatureFrame
+from .marketPanel import MarketPanel
+from .sharedPanel import SharedPanel
+from .barStore import BarStore
+from .manifest import Manifest
+from .tradingCalendar import TradingCalendar
+from . import events, resample
\ No newline at end of file
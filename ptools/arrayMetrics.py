@@ -0,0 +1,211 @@
+"""
+NumPy implementation of the metrics in ptools.metrics.
+Takes and returns ndarrays; element [0] is the most recent value, same as Metrics.
+"""
+
+import numpy
+
+# exponentially weighted recursion e[t] = e[t-1] + alpha * (x[t] - e[t-1]), starting from e[-1] = seed.
+# x is in chronological order along the last axis.
+# Inside a block the recursion has the closed form e[j] = b^(j+1) * (seed + alpha * sum_k(x[k] / b^(k+1)))
+# with b = 1 - alpha; blocks are kept short enough that b^-(k+1) stays far from overflow.
+def ewm(x, alpha, seed):
+    x = numpy.asarray(x, dtype=float)
+    out = numpy.empty_like(x)
+    size = x.shape[-1]
+    if size == 0:
+        return out
+    beta = 1.0 - alpha
+    if beta <= 0:
+        out[...] = x
+        return out
+    block = max(1, int(-30 / numpy.log10(beta)))
+    prev = numpy.asarray(seed, dtype=float)
+    for start in range(0, size, block):
+        chunk = x[..., start:start + block]
+        powers = beta ** numpy.arange(1, chunk.shape[-1] + 1)
+        acc = numpy.cumsum(chunk / powers, axis=-1) * alpha
+        out[..., start:start + block] = powers * (acc + prev[..., numpy.newaxis])
+        prev = out[..., start + chunk.shape[-1] - 1]
+    return out
+
+# max(a[i:i+size]) for every window position, O(n) regardless of the window size:
+# windows span at most two blocks of 'size', so every window maximum is the max of
+# a suffix maximum within one block and a prefix maximum within the next one
+def sliding_max(a, size):
+    a = numpy.asarray(a, dtype=float)
+    dsize = len(a)
+    if dsize < size:
+        return numpy.zeros(0)
+    if size == 1:
+        return a.copy()
+    blocks = -(-dsize // size)
+    padded = numpy.concatenate([a, numpy.full(blocks * size - dsize, -numpy.inf)]).reshape(blocks, size)
+    prefix = numpy.maximum.accumulate(padded, axis=1).ravel()
+    suffix = numpy.maximum.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    return numpy.maximum(suffix[:dsize - size + 1], prefix[size - 1:dsize])
+
+def sliding_min(a, size):
+    return -sliding_max(-numpy.asarray(a, dtype=float), size)
+
+class ArrayMetrics:
+    # exponential moving average, seeded with the simple average of the oldest 'days' points
+    def ema(self, datapoints, days):
+        x = numpy.asarray(datapoints, dtype=float)
+        if days == 1:
+            return x
+        dsize = len(x)
+        if dsize < days:
+            return None
+        chron = x[::-1]
+        seed = chron[:days].sum() / days
+        emas = numpy.empty(dsize - days + 1)
+        emas[0] = seed
+        emas[1:] = ewm(chron[days:], 2.0 / (days + 1), seed)
+        return emas[::-1]
+
+    # simple moving average
+    def sma(self, datapoints, days):
+        x = numpy.asarray(datapoints, dtype=float)
+        if days == 1:
+            return x
+        dsize = len(x)
+        if dsize < days:
+            return None
+        sums = numpy.concatenate([[0.0], numpy.cumsum(x)])
+        return (sums[days:] - sums[:dsize - days + 1]) / days
+
+    def macd_all(self, datapoints, d1 = 12, d2 = 26, d3 = 9):
+        ema_d1 = self.ema(datapoints, d1)
+        ema_d2 = self.ema(datapoints, d2)
+        if ema_d1 is None or ema_d2 is None:
+            return None
+        size = min(len(ema_d1), len(ema_d2))
+        macdline = ema_d1[:size] - ema_d2[:size]
+        signalLine = self.ema(macdline, d3)
+        if signalLine is None:
+            return None
+        histogram = macdline[:len(signalLine)] - signalLine
+        return {'fast': macdline, 'slow': signalLine, 'histo': histogram}
+
+    def forceIndex(self, closePrices, volumes, d = 13):
+        closePrices = numpy.asarray(closePrices, dtype=float)
+        volumes = numpy.asarray(volumes, dtype=float)
+        assert(len(closePrices) == len(volumes))
+        index1 = (closePrices[:-1] - closePrices[1:]) * volumes[:-1]
+        return self.ema(index1, d)
+
+    def rsi(self, datapoints, d = 14):
+        x = numpy.asarray(datapoints, dtype=float)
+        dsize = len(x)
+        if dsize < d + 1:
+            return None
+        changes = x[:-1] - x[1:]
+        gains = numpy.maximum(changes, 0)[::-1]
+        losses = numpy.maximum(-changes, 0)[::-1]
+        avggains = numpy.empty(dsize - d)
+        avglosses = numpy.empty(dsize - d)
+        avggains[0] = gains[:d].sum() / d
+        avglosses[0] = losses[:d].sum() / d
+        avggains[1:] = ewm(gains[d:], 1.0 / d, avggains[0])
+        avglosses[1:] = ewm(losses[d:], 1.0 / d, avglosses[0])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rs = avggains / avglosses
+        return (100 - 100 / (1 + rs))[::-1]
+
+    # a bar is a support (resistance) if its body is the lowest (highest) of the window around it
+    def support_and_resistance(self, openPrices, closePrices, window = 10):
+        openPrices = numpy.asarray(openPrices, dtype=float)
+        closePrices = numpy.asarray(closePrices, dtype=float)
+        assert(len(openPrices) == len(closePrices))
+        count = len(openPrices) - window
+        if count <= 0:
+            return {'idx': numpy.zeros(0, dtype=int), 'price': numpy.zeros(0)}
+        highs = numpy.maximum(openPrices, closePrices)
+        lows = numpy.minimum(openPrices, closePrices)
+        dmax = sliding_max(highs, window)[:count]
+        dmin = sliding_min(lows, window)[:count]
+        idx = numpy.arange(count) + int(window / 2)
+        isMax = highs[idx] == dmax
+        isMin = ~isMax & (lows[idx] == dmin)
+        found = isMax | isMin
+        return {'idx': idx[found], 'price': numpy.where(isMax, highs[idx], lows[idx])[found]}
+
+# each row's own bars (its non-NaN values), oldest first from column 0 and NaN after the newest,
+# and the column of every value of x (most recent first) among them, -1 where x is NaN
+def own_bars(x):
+    chron = numpy.asarray(x, dtype=float)[:, ::-1]
+    valid = ~numpy.isnan(chron)
+    rank = numpy.cumsum(valid, axis=1) - 1
+    bars = numpy.full(chron.shape, numpy.nan)
+    r, c = numpy.nonzero(valid)
+    bars[r, rank[r, c]] = chron[r, c]
+    return bars, numpy.where(valid, rank, -1)[:, ::-1]
+
+# values computed over own_bars() put back in the columns of x, NaN where x has no bar
+def scatter(values, pos):
+    rows = numpy.arange(values.shape[0])[:, numpy.newaxis]
+    return numpy.where(pos >= 0, values[rows, numpy.maximum(pos, 0)], numpy.nan)
+
+# change of every bar from the row's previous bar, skipping the dates the row has no bar for
+def own_changes(x):
+    bars, pos = own_bars(x)
+    changes = numpy.full(bars.shape, numpy.nan)
+    changes[:, 1:] = bars[:, 1:] - bars[:, :-1]
+    return scatter(changes, pos)
+
+# exponential smoothing of every row of x (most recent first), seeded with the simple average
+# of the oldest 'days' values of the row. Output has the same shape as x, NaN where undefined.
+# The recursion runs over each row's own bars: rows may start later, and a missing bar inside
+# a row is NaN in the output while the values after it carry on from the bar before it.
+def smooth_rows(x, days, alpha):
+    bars, pos = own_bars(x)
+    rows, size = bars.shape
+    if size < days:
+        return numpy.full(bars.shape, numpy.nan)
+    # NaN for a row with fewer than 'days' bars
+    seed = bars[:, :days].sum(axis=1) / days
+    t = numpy.arange(size)
+    # keeping the input at 'seed' up to the seed's bar keeps the recursion at 'seed' until then
+    held = numpy.where(t < days, seed[:, numpy.newaxis], bars)
+    out = ewm(held, alpha, seed)
+    out[:, :days - 1] = numpy.nan
+    return scatter(out, pos)
+
+# the same calculations as ArrayMetrics for a 2-D panel (symbols x dates, most recent date first).
+# Every result keeps the shape of the input, column j belongs to date j, NaN where undefined.
+class PanelMetrics:
+    def ema(self, x, days):
+        x = numpy.asarray(x, dtype=float)
+        if days == 1:
+            return x
+        return smooth_rows(x, days, 2.0 / (days + 1))
+
+    def sma(self, x, days):
+        bars, pos = own_bars(x)
+        out = numpy.full(bars.shape, numpy.nan)
+        size = bars.shape[1]
+        if size < days:
+            return out
+        # windows over each row's own bars, oldest first; a window past the newest bar is NaN
+        sums = numpy.concatenate([numpy.zeros((bars.shape[0], 1)), numpy.cumsum(bars, axis=1)], axis=1)
+        out[:, days - 1:] = (sums[:, days:] - sums[:, :size - days + 1]) / days
+        return scatter(out, pos)
+
+    def macd_all(self, x, d1 = 12, d2 = 26, d3 = 9):
+        macdline = self.ema(x, d1) - self.ema(x, d2)
+        signalLine = self.ema(macdline, d3)
+        return {'fast': macdline, 'slow': signalLine, 'histo': macdline - signalLine}
+
+    def forceIndex(self, closePrices, volumes, d = 13):
+        closePrices = numpy.asarray(closePrices, dtype=float)
+        volumes = numpy.asarray(volumes, dtype=float)
+        return self.ema(own_changes(closePrices) * volumes, d)
+
+    def rsi(self, x, d = 14):
+        changes = own_changes(x)
+        avggains = smooth_rows(numpy.maximum(changes, 0), d, 1.0 / d)
+        avglosses = smooth_rows(numpy.maximum(-changes, 0), d, 1.0 / d)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rs = avggains / avglosses
+        return 100 - 100 / (1 + rs)
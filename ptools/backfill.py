@@ -0,0 +1,138 @@
+"""
+Backfill planning for the history files of a whole watchlist.
+BackfillPlanner reads what the files cover from the manifest and returns the exact date ranges
+that are missing, one request per symbol and range; gaps separated by only a few covered sessions
+are merged into one request. Downloads that failed for good (delisted tickers, empty responses)
+are kept in Failures with a growing backoff, and left out of the plan until it expires:
+a failure of the newest bars holds back the symbol, a failure of an older gap only that gap.
+"""
+
+import json, os, threading
+from datetime import date
+from .tradingCalendar import to_ordinal
+
+class Failures:
+    filename = 'failures.json'
+    max_backoff = 64 # days
+
+    def __init__(self, folder = 'datafiles-us'):
+        self.folder = folder
+        self.rlock = threading.RLock()
+        self.entries = None
+        self.dirty = False
+
+    def path(self):
+        return os.path.join(self.folder, self.filename)
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        if os.path.exists(self.path()):
+            with open(self.path()) as f:
+                self.entries = json.load(f)
+
+    # start: None for the newest bars of a symbol, or the first date ('YYYY-MM-DD') of a gap
+    # before them, which the provider may never fill while newer bars keep coming
+    def key(self, sym, frequency, start = None):
+        return sym + '-' + frequency + ('' if start is None else '-' + start)
+
+    # a download fails again: wait 1, 2, 4 ... max_backoff days before the next attempt
+    def record(self, sym, frequency, reason, today = None, start = None):
+        today = to_ordinal(today if today is not None else date.today())
+        with self.rlock:
+            self._load()
+            entry = self.entries.setdefault(self.key(sym, frequency, start), {'count': 0})
+            entry['count'] += 1
+            entry['reason'] = reason
+            entry['retry_after'] = today + min(2 ** (entry['count'] - 1), self.max_backoff)
+            self.dirty = True
+
+    def clear(self, sym, frequency, start = None):
+        with self.rlock:
+            self._load()
+            if self.entries.pop(self.key(sym, frequency, start), None) is not None:
+                self.dirty = True
+
+    def blocked(self, sym, frequency, today = None, start = None):
+        today = to_ordinal(today if today is not None else date.today())
+        with self.rlock:
+            self._load()
+            entry = self.entries.get(self.key(sym, frequency, start))
+            return entry is not None and today < entry['retry_after']
+
+    def save(self):
+        with self.rlock:
+            if not self.dirty:
+                return
+            tmppath = self.path() + '.tmp'
+            with open(tmppath, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmppath, self.path())
+            self.dirty = False
+
+class BackfillPlanner:
+    # max_history_year: depth downloaded for a symbol without any file
+    # merge_sessions: gaps of a symbol with fewer covered sessions between them are one request
+    def __init__(self, manifest, calendar, failures, max_history_year = 5, merge_sessions = 20):
+        self.manifest = manifest
+        self.calendar = calendar
+        self.failures = failures
+        self.max_history_year = max_history_year
+        self.merge_sessions = merge_sessions
+
+    # covered [first, last] ordinal ranges of a symbol, sorted and with overlaps merged
+    def covered(self, sym, frequency):
+        ranges = sorted([to_ordinal(r[0]), to_ordinal(r[1])]
+                        for r in self.manifest.ranges(sym, frequency))
+        ret = []
+        for r in ranges:
+            if len(ret) > 0 and r[0] <= ret[-1][1] + 1:
+                ret[-1][1] = max(ret[-1][1], r[1])
+            else:
+                ret.append(r)
+        return ret
+
+    # whether [a, b] (ordinals) holds any session; a weekly gap starts on a Monday
+    def has_bars(self, a, b):
+        return a <= b and self.calendar.sessions_between(a, b) > 0
+
+    # missing [start, end] ordinal ranges of one symbol up to 'ending'
+    def gaps(self, sym, frequency, ending):
+        ending = to_ordinal(ending)
+        covered = [r for r in self.covered(sym, frequency) if r[0] <= ending]
+        if len(covered) == 0:
+            start = date.fromordinal(ending)
+            start = date(start.year - self.max_history_year, start.month, min(start.day, 28)).toordinal()
+            return [[start, ending]]
+        step = 7 if frequency == 'weekly' else 1 # weekly bars are dated on the Monday
+        ret = []
+        for prev, cur in zip(covered[:-1], covered[1:]):
+            if self.has_bars(prev[1] + step, cur[0] - 1):
+                ret.append([prev[1] + step, cur[0] - 1])
+        if self.has_bars(covered[-1][1] + step, ending):
+            ret.append([covered[-1][1] + step, ending])
+        return ret
+
+    # consecutive gaps with little covered history between them become one request
+    def merge(self, gaps):
+        ret = []
+        for g in gaps:
+            if len(ret) > 0 and self.calendar.sessions_between(ret[-1][1] + 1, g[0] - 1) < self.merge_sessions:
+                ret[-1][1] = max(ret[-1][1], g[1])
+            else:
+                ret.append(list(g))
+        return ret
+
+    # [(sym, start, end)] with dates as 'YYYY-MM-DD', the minimal set of downloads for the watchlist.
+    # Gaps that failed are left out before merging, so they never hold back the gaps after them
+    def plan(self, watchlist, frequency, ending, today = None):
+        ret = []
+        for sym in watchlist:
+            if self.failures.blocked(sym, frequency, today):
+                continue
+            gaps = [g for g in self.gaps(sym, frequency, ending)
+                    if not self.failures.blocked(sym, frequency, today, self.calendar.date_str(g[0]))]
+            for start, end in self.merge(gaps):
+                ret.append((sym, self.calendar.date_str(start), self.calendar.date_str(end)))
+        return ret
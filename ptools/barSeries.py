@@ -0,0 +1,112 @@
+"""
+Columnar bars of one symbol: an int32 array of date ordinals and one float64 array per field,
+element [0] is the most recent bar, same as the lists USMarket.getData() used to return.
+Slicing returns a BarSeries of views, no copy; series[i] returns a Bar, a read-only mapping
+that behaves like the old row dict (bar['Close'], bar['Date'] as 'YYYY-MM-DD', bar.get('Current')),
+so code written for lists of row dicts keeps working while rules read whole columns.
+"""
+
+import numpy
+from collections.abc import Mapping
+from .barStore import date_to_ordinal, ordinal_to_date
+
+fields = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+class Bar(Mapping):
+    __slots__ = ('series', 'i')
+
+    def __init__(self, series, i):
+        self.series = series
+        self.i = i
+
+    def __getitem__(self, key):
+        if key == 'Date':
+            return ordinal_to_date(self.series.dates[self.i])
+        if key == 'Current':
+            if self.i == 0 and self.series.current:
+                return True
+            raise KeyError(key)
+        return float(self.series.columns[key][self.i])
+
+    def keys(self):
+        ret = ['Date'] + list(self.series.columns.keys())
+        if self.i == 0 and self.series.current:
+            ret.append('Current')
+        return ret
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class BarSeries:
+    # current: bar [0] is the bar of the ongoing session (see USMarket.fetch_current_data)
+    def __init__(self, dates, columns, current = False):
+        self.dates = numpy.asarray(dates, dtype=numpy.int32)
+        self.columns = {k: numpy.asarray(v, dtype=numpy.float64) for k, v in columns.items()}
+        self.current = current
+
+    # rows: row dicts, most recent first
+    @classmethod
+    def from_rows(cls, rows):
+        rows = list(rows)
+        dates = [date_to_ordinal(x['Date']) for x in rows]
+        columns = {f: [float(x[f]) for x in rows] for f in fields}
+        return cls(dates, columns, len(rows) > 0 and bool(rows[0].get('Current')))
+
+    # rows: {'YYYY-MM-DD': row dict} as the csv history files are read
+    @classmethod
+    def from_dict(cls, rows):
+        return cls.from_rows(rows[dt] for dt in sorted(rows.keys(), reverse=True))
+
+    # bars: structured array of ptools.barStore (oldest first), e.g. BarStore.load();
+    # the columns are reversed views of it, nothing is copied
+    @classmethod
+    def from_bars(cls, bars):
+        return cls(bars['Date'][::-1], {f: bars[f][::-1] for f in fields})
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = key.indices(len(self.dates))[0]
+            return BarSeries(self.dates[key], {k: v[key] for k, v in self.columns.items()},
+                             self.current and start == 0 and key.step in (None, 1))
+        if key < 0:
+            key += len(self.dates)
+        if key < 0 or key >= len(self.dates):
+            raise IndexError(key)
+        return Bar(self, key)
+
+    def __iter__(self):
+        return (Bar(self, i) for i in range(len(self.dates)))
+
+    def column(self, name):
+        return self.columns[name]
+
+    # bars on or before dateStr
+    def until(self, dateStr):
+        return self[int(numpy.searchsorted(-self.dates, -date_to_ordinal(dateStr), side='left')):]
+
+    # bars on or after dateStr
+    def since(self, dateStr):
+        return self[:int(numpy.searchsorted(-self.dates, -date_to_ordinal(dateStr), side='right'))]
+
+    # a new BarSeries with the bars of both, a bar of 'other' replaces the bar of the same date.
+    # Both hold each date once; the bar of the ongoing session stays current if it is the most recent
+    def merge(self, other):
+        dates = numpy.concatenate([other.dates, self.dates])
+        _, idx = numpy.unique(-dates, return_index=True)
+        if len(idx) == 0:
+            return BarSeries(dates, {k: v[:0] for k, v in self.columns.items()})
+        current = other.current if idx[0] < len(other.dates) else self.current
+        return BarSeries(dates[idx], {k: numpy.concatenate([other.columns[k], v])[idx] for k, v in self.columns.items()},
+                         current)
+
+    def to_rows(self):
+        return [dict(bar) for bar in self]
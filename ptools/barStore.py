@@ -0,0 +1,97 @@
+"""
+Binary bar store for OHLCV history.
+Every symbol has one fixed-width .npy file per frequency, e.g. GOOGL-daily.npy,
+grouped in sub-folders by first letter the same way the csv files are.
+Rows are sorted by date, oldest first, and files are memory-mapped on load,
+so reading history involves no text parsing.
+Dates are stored as proleptic Gregorian ordinals (datetime.date.toordinal)
+"""
+
+import os
+import numpy
+from datetime import date
+
+bar_dtype = numpy.dtype([('Date', '<i4'),
+                         ('Open', '<f8'),
+                         ('High', '<f8'),
+                         ('Low', '<f8'),
+                         ('Close', '<f8'),
+                         ('Volume', '<f8'),
+                         ('Adj Close', '<f8')])
+
+price_fields = ['Open', 'High', 'Low', 'Close', 'Volume', 'Adj Close']
+
+def date_to_ordinal(dateStr):
+    return date(int(dateStr[0:4]), int(dateStr[5:7]), int(dateStr[8:10])).toordinal()
+
+def ordinal_to_date(ordinal):
+    return date.fromordinal(int(ordinal)).isoformat()
+
+def rows_to_bars(rows):
+    # rows: iterable of dicts as produced by csv.DictReader (values may be strings)
+    rows = list(rows)
+    bars = numpy.zeros(len(rows), dtype=bar_dtype)
+    for i, row in enumerate(rows):
+        bars['Date'][i] = date_to_ordinal(row['Date'])
+        for f in price_fields:
+            v = row.get(f)
+            bars[f][i] = float(v) if v not in (None, '') else numpy.nan
+    bars.sort(order='Date')
+    return bars
+
+class BarStore:
+    def __init__(self, folder = 'datafiles-us'):
+        self.folder = folder
+
+    def path(self, sym, frequency):
+        return os.path.join(self.folder, sym[:1], sym + '-' + frequency + '.npy')
+
+    def exists(self, sym, frequency):
+        return os.path.exists(self.path(sym, frequency))
+
+    # returns a read-only structured array (memory-mapped), oldest first
+    # only rows on or before endingDate are returned, at most 'limit' of the most recent ones
+    def load(self, sym, frequency, endingDate = None, limit = None):
+        fpath = self.path(sym, frequency)
+        if not os.path.exists(fpath):
+            return numpy.zeros(0, dtype=bar_dtype)
+        bars = numpy.load(fpath, mmap_mode='r')
+        end = len(bars)
+        if endingDate is not None and endingDate != '9999-99-99':
+            end = int(numpy.searchsorted(bars['Date'], date_to_ordinal(endingDate), side='right'))
+        start = 0 if limit is None else max(0, end - limit)
+        return bars[start:end]
+
+    # same shape of result as usdata.load_csv_from_files: {date string: row dict}
+    def load_dict(self, sym, frequency, endingDate = None, limit = None):
+        bars = numpy.array(self.load(sym, frequency, endingDate, limit))
+        ret = {}
+        values = {f: bars[f].tolist() for f in price_fields}
+        for i, ordinal in enumerate(bars['Date'].tolist()):
+            dt = ordinal_to_date(ordinal)
+            row = {'Date': dt}
+            for f in price_fields:
+                row[f] = values[f][i]
+            ret[dt] = row
+        return ret
+
+    # write the whole history of a symbol, replacing the old file atomically
+    def write(self, sym, frequency, bars):
+        fpath = self.path(sym, frequency)
+        subFolderName = os.path.dirname(fpath)
+        if not os.path.exists(subFolderName):
+            os.makedirs(subFolderName)
+        bars = numpy.sort(numpy.asarray(bars, dtype=bar_dtype), order='Date')
+        tmppath = fpath + '.tmp'
+        with open(tmppath, 'wb') as f:
+            numpy.save(f, bars)
+        os.replace(tmppath, fpath)
+
+    # merge downloaded rows into the stored history; newer rows win on duplicated dates
+    def merge(self, sym, frequency, rows):
+        new_bars = rows_to_bars(rows)
+        if len(new_bars) == 0:
+            return
+        old_bars = numpy.array(self.load(sym, frequency))
+        old_bars = old_bars[~numpy.isin(old_bars['Date'], new_bars['Date'])]
+        self.write(sym, frequency, numpy.concatenate([old_bars, new_bars]))
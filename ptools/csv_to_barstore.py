@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+#migrate downloaded csv files into the binary bar store (see ptools/barStore.py)
+#run from the top folder: python3 -m ptools.csv_to_barstore datafiles-us
+
+import argparse, os, csv
+from tqdm import tqdm
+from ptools.barStore import BarStore, rows_to_bars
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description='convert csv history files into the binary bar store')
+    parser.add_argument('folder', type=str, nargs='*', default=['datafiles-us'],
+                        help='data folder, e.g. datafiles-us')
+    args = parser.parse_args()
+    return args
+
+# returns {(sym, frequency): [csv file paths]}
+def collect_csv_files(folder):
+    groups = {}
+    for subfolder in sorted(os.listdir(folder)):
+        path = os.path.join(folder, subfolder)
+        if not os.path.isdir(path):
+            continue
+        for fname in os.listdir(path):
+            if not fname.endswith('.csv'):
+                continue
+            # file name is like GOOGL-daily-2016-06-10.csv
+            parts = fname[:-len('.csv')].rsplit('-', 4)
+            if len(parts) != 5:
+                continue
+            key = (parts[0], parts[1])
+            groups.setdefault(key, []).append(os.path.join(path, fname))
+    return groups
+
+def convert_one_symbol(store, sym, frequency, fpaths):
+    data = {}
+    for fpath in fpaths:
+        with open(fpath) as csvfile:
+            for datapoint in csv.DictReader(csvfile):
+                data[datapoint['Date']] = datapoint
+    if len(data) == 0:
+        return
+    store.write(sym, frequency, rows_to_bars(data.values()))
+
+def convert_one_folder(folder):
+    folder = folder.rstrip(os.path.sep)
+    store = BarStore(folder)
+    groups = collect_csv_files(folder)
+    for (sym, frequency) in tqdm(sorted(groups.keys()), desc='Symbol files', unit=' Symbol'):
+        convert_one_symbol(store, sym, frequency, groups[(sym, frequency)])
+
+def main():
+    args = arg_parser()
+    for folder in args.folder:
+        convert_one_folder(folder)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Vectorized event detection on indicator series.
+Same orientation as ptools.metrics: element [0] is the most recent value,
+so an event 'at i' happened between bar i+1 and bar i.
+All functions return ndarrays of indices in increasing order (most recent first).
+"""
+
+import numpy
+from .arrayMetrics import sliding_max, sliding_min
+
+# a and b cross between i+1 and i
+def crosses(a, b):
+    a = numpy.asarray(a, dtype=float)
+    b = numpy.asarray(b, dtype=float)
+    assert(len(a) == len(b))
+    diff = a - b
+    return numpy.flatnonzero(diff[:-1] * diff[1:] < 0)
+
+# MACD histogram turns positive (fast line crosses above the signal line)
+def gold_crosses(histo):
+    histo = numpy.asarray(histo, dtype=float)
+    return numpy.flatnonzero((histo[:-1] > 0) & (histo[1:] <= 0))
+
+# MACD histogram turns negative (fast line crosses below the signal line)
+def dead_crosses(histo):
+    histo = numpy.asarray(histo, dtype=float)
+    return numpy.flatnonzero((histo[:-1] < 0) & (histo[1:] >= 0))
+
+# drop events that come less than 'gap' bars after the previously kept one (noise)
+def thin(indices, gap):
+    kept = []
+    for idx in indices:
+        if len(kept) > 0 and idx - kept[-1] < gap:
+            continue
+        kept.append(idx)
+    return numpy.array(kept, dtype=int)
+
+# i is a local maximum if a[i] is the highest value within 'window' bars centered on it
+def local_maxima(a, window = 10):
+    a = numpy.asarray(a, dtype=float)
+    half = int(window / 2)
+    padded = numpy.concatenate([numpy.full(half, -numpy.inf), a, numpy.full(half, -numpy.inf)])
+    return numpy.flatnonzero(sliding_max(padded, 2 * half + 1) == a)
+
+def local_minima(a, window = 10):
+    a = numpy.asarray(a, dtype=float)
+    half = int(window / 2)
+    padded = numpy.concatenate([numpy.full(half, numpy.inf), a, numpy.full(half, numpy.inf)])
+    return numpy.flatnonzero(sliding_min(padded, 2 * half + 1) == a)
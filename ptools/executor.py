@@ -0,0 +1,84 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+class Executor:
+    """
+    Fixed set of worker threads with a bounded queue of pending tasks.
+    submit() blocks while 'workers + queue_size' tasks are outstanding, and returns a Future.
+    Every finished task is recorded as {'func', 'args', 'elapsed', 'exception'} in self.records.
+    """
+    def __init__(self, workers, queue_size = None):
+        if queue_size is None:
+            queue_size = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.futures = []
+        self.records = []
+        self.rlock = threading.RLock()
+
+    def run_task(self, func, args, kwargs):
+        start = time.time()
+        exception = None
+        try:
+            return func(*args, **kwargs)
+        except BaseException as e:
+            exception = e
+            raise
+        finally:
+            self.lock()
+            self.records.append({'func': getattr(func, '__name__', str(func)), 'args': args,
+                                 'elapsed': time.time() - start, 'exception': exception})
+            self.unlock()
+            self.slots.release()
+
+    def submit(self, func, *args, **kwargs):
+        self.slots.acquire()
+        try:
+            future = self.pool.submit(self.run_task, func, args, kwargs)
+        except:
+            self.slots.release()
+            raise
+        self.lock()
+        self.futures.append(future)
+        self.unlock()
+        return future
+
+    # futures submitted so far, yielded as they finish
+    def as_completed(self, futures = None):
+        if futures is None:
+            futures = list(self.futures)
+        return as_completed(futures)
+
+    # results in the order of items; exceptions are raised when reached
+    def map(self, func, items):
+        futures = [self.submit(func, item) for item in items]
+        return [f.result() for f in futures]
+
+    # wait for every submitted task, exceptions stay in the futures and self.records
+    def wait_for_all(self):
+        self.lock()
+        futures = list(self.futures)
+        self.unlock()
+        wait(futures)
+
+    def errors(self):
+        return [r for r in self.records if r['exception'] is not None]
+
+    def slowest(self, count = 10):
+        return sorted(self.records, key=lambda r: r['elapsed'], reverse=True)[:count]
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
+
+    def lock(self):
+        self.rlock.acquire()
+
+    def unlock(self):
+        self.rlock.release()
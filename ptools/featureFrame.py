@@ -0,0 +1,82 @@
+"""
+Per-symbol feature frame: price columns and indicators of one symbol,
+computed lazily and memoized by (indicator, params), so every indicator
+is computed at most once per symbol no matter how many rules read it.
+Element [0] is the most recent bar, same as ptools.metrics.
+"""
+
+import threading
+import numpy
+from .arrayMetrics import ArrayMetrics
+from .barSeries import BarSeries
+
+class FeatureFrame:
+    def __init__(self, data = None, columns = None):
+        if isinstance(data, BarSeries):
+            data, columns = None, data.columns # the columns are used as they are, no copy
+        self.data = data # list of row dicts
+        self.columns = dict(columns) if columns is not None else {}
+        self.cache = {}
+        self.am = ArrayMetrics()
+        # rules running in several threads share a frame: one lock per key, so an indicator is
+        # computed once while unrelated ones are computed at the same time
+        self.lock = threading.Lock()
+        self.keyLocks = {}
+
+    @classmethod
+    def from_columns(cls, **columns):
+        return cls(None, {k: numpy.asarray(v, dtype=float) for k, v in columns.items()})
+
+    def __len__(self):
+        if self.data is not None:
+            return len(self.data)
+        return len(next(iter(self.columns.values()))) if len(self.columns) > 0 else 0
+
+    def column(self, name):
+        if name not in self.columns:
+            if self.data is None:
+                raise KeyError(name)
+            self.columns[name] = numpy.array([float(x[name]) for x in self.data])
+        return self.columns[name]
+
+    def memo(self, key, compute):
+        if key in self.cache:
+            return self.cache[key]
+        with self.lock:
+            keyLock = self.keyLocks.setdefault(key, threading.Lock())
+        with keyLock:
+            if key not in self.cache:
+                self.cache[key] = compute()
+        return self.cache[key]
+
+    def ema(self, days, field = 'Close'):
+        return self.memo(('ema', days, field), lambda: self.am.ema(self.column(field), days))
+
+    def sma(self, days, field = 'Close'):
+        return self.memo(('sma', days, field), lambda: self.am.sma(self.column(field), days))
+
+    def macd_all(self, d1 = 12, d2 = 26, d3 = 9):
+        return self.memo(('macd_all', d1, d2, d3), lambda: self.am.macd_all(self.column('Close'), d1, d2, d3))
+
+    def rsi(self, d = 14):
+        return self.memo(('rsi', d), lambda: self.am.rsi(self.column('Close'), d))
+
+    def forceIndex(self, d = 13):
+        return self.memo(('forceIndex', d),
+                         lambda: self.am.forceIndex(self.column('Close'), self.column('Volume'), d))
+
+    # limit: only look at the most recent 'limit' bars
+    def support_and_resistance(self, window = 10, limit = None):
+        return self.memo(('support_and_resistance', window, limit),
+                         lambda: self.am.support_and_resistance(self.column('Open')[:limit],
+                                                                self.column('Close')[:limit], window))
+
+# accepts a FeatureFrame, a BarSeries, a list of row dicts or a list of close prices
+def as_frame(data):
+    if isinstance(data, FeatureFrame):
+        return data
+    if isinstance(data, BarSeries):
+        return FeatureFrame(data)
+    if len(data) > 0 and isinstance(data[0], dict):
+        return FeatureFrame(data)
+    return FeatureFrame.from_columns(Close=data)
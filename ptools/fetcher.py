@@ -0,0 +1,219 @@
+"""
+Asyncio download engine for history files.
+Plain HTTP/1.1 over asyncio streams, connections are kept alive and reused per host,
+at most 'per_host' requests are in flight to one host, every attempt has a timeout
+and failed attempts are retried with exponential backoff.
+A response body is streamed into '<path>.part' and renamed to 'path' once complete,
+so a failed or partial download never leaves a file behind.
+The event loop runs in a background thread: worker threads call fetch(), which blocks
+until the download finishes, fetch_all() for a batch, or read() to get a small body in memory.
+"""
+
+import asyncio, io, os, threading
+from urllib.parse import urlsplit
+
+class FetchError(Exception):
+    def __init__(self, url, reason, status = None):
+        Exception.__init__(self, url + ': ' + reason)
+        self.url = url
+        self.reason = reason
+        self.status = status
+
+    # 4xx responses (unknown ticker, bad range) won't succeed on retry
+    def permanent(self):
+        return self.status is not None and 400 <= self.status < 500 and self.status != 429
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+class Fetcher:
+    def __init__(self, per_host = 8, timeout = 30, retries = 3, backoff = 0.5, chunk_size = 65536):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.idle = {}   # (host, port) -> idle connections
+        self.limits = {} # (host, port) -> semaphore
+        self.stats = {'requests': 0, 'connections': 0, 'retries': 0, 'failures': 0}
+        self.loop = None
+        self.thread = None
+        self.rlock = threading.RLock()
+
+    # background event loop, started on first use
+    def start(self):
+        with self.rlock:
+            if self.loop is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.thread.start()
+
+    def close(self):
+        with self.rlock:
+            if self.loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self.close_idle(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+            self.thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # downloads url into path, blocks the calling thread; raises FetchError
+    def fetch(self, url, path):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.download(url, path), self.loop).result()
+
+    # body of url as bytes, for small responses such as quotes; raises FetchError
+    def read(self, url):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.download(url, None), self.loop).result()
+
+    # [(url, path)] -> [None or FetchError], in the order given
+    def fetch_all(self, requests):
+        self.start()
+        async def run():
+            return await asyncio.gather(*[self.download(url, path) for url, path in requests],
+                                        return_exceptions=True)
+        results = asyncio.run_coroutine_threadsafe(run(), self.loop).result()
+        return [r if isinstance(r, Exception) else None for r in results]
+
+    async def close_idle(self):
+        for connections in self.idle.values():
+            for conn in connections:
+                conn.close()
+        self.idle = {}
+
+    def limit(self, key):
+        if key not in self.limits:
+            self.limits[key] = asyncio.Semaphore(self.per_host)
+        return self.limits[key]
+
+    async def connect(self, key):
+        connections = self.idle.setdefault(key, [])
+        while len(connections) > 0:
+            conn = connections.pop()
+            if not conn.reader.at_eof() and not conn.writer.is_closing():
+                return conn
+            conn.close()
+        reader, writer = await asyncio.open_connection(key[0], key[1])
+        self.stats['connections'] += 1
+        return Connection(reader, writer)
+
+    # path None returns the body instead of writing it
+    async def download(self, url, path):
+        parts = urlsplit(url)
+        if parts.scheme != 'http':
+            raise FetchError(url, 'only http is supported')
+        key = (parts.hostname, parts.port or 80)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        async with self.limit(key):
+            attempt = 0
+            while True:
+                try:
+                    return await asyncio.wait_for(self.attempt(key, parts.netloc, target, url, path), self.timeout)
+                except (OSError, EOFError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, FetchError) as e:
+                    error = e if isinstance(e, FetchError) else FetchError(url, repr(e))
+                    if error.permanent() or attempt >= self.retries:
+                        self.stats['failures'] += 1
+                        raise error
+                    attempt += 1
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+
+    async def attempt(self, key, host, target, url, path):
+        conn = await self.connect(key)
+        reusable = False
+        headers = {}
+        try:
+            self.stats['requests'] += 1
+            conn.writer.write(('GET ' + target + ' HTTP/1.1\r\nHost: ' + host +
+                               '\r\nConnection: keep-alive\r\nAccept-Encoding: identity\r\n\r\n').encode('latin-1'))
+            await conn.writer.drain()
+            status, headers = await self.read_head(conn.reader)
+            if status != 200:
+                reusable = await self.skip_body(conn.reader, headers)
+                raise FetchError(url, 'HTTP ' + str(status), status)
+            if path is None:
+                body = io.BytesIO()
+                reusable = await self.read_body(conn.reader, headers, body)
+                return body.getvalue()
+            tmppath = path + '.part'
+            try:
+                with open(tmppath, 'wb') as f:
+                    reusable = await self.read_body(conn.reader, headers, f)
+                os.replace(tmppath, path)
+            finally:
+                if os.path.exists(tmppath):
+                    os.remove(tmppath)
+        finally:
+            if reusable and headers.get('connection', '').lower() != 'close':
+                self.idle.setdefault(key, []).append(conn)
+            else:
+                conn.close()
+
+    async def read_head(self, reader):
+        line = await reader.readline()
+        if not line:
+            raise EOFError('connection closed')
+        status = int(line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    # body is written to f, or dropped when f is None; returns whether the connection can be reused
+    async def read_body(self, reader, headers, f):
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return True
+                chunk = await reader.readexactly(size)
+                if f is not None:
+                    f.write(chunk)
+                await reader.readexactly(2)
+        if 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining > 0:
+                chunk = await reader.read(min(remaining, self.chunk_size))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                if f is not None:
+                    f.write(chunk)
+                remaining -= len(chunk)
+            return True
+        # no length: body ends when the server closes the connection
+        while True:
+            chunk = await reader.read(self.chunk_size)
+            if not chunk:
+                return False
+            if f is not None:
+                f.write(chunk)
+
+    async def skip_body(self, reader, headers):
+        try:
+            return await self.read_body(reader, headers, None)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            return False
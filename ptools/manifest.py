@@ -0,0 +1,154 @@
+"""
+Index of the csv history files in a data folder (datafiles-us/manifest.json),
+so that loaders find the files of a symbol with one lookup instead of listing
+and pattern-matching the whole sub-folder.
+Entries are keyed like 'GOOGL-daily' and map every file name to the date range it covers.
+A sub-folder whose modification time differs from the recorded one is re-scanned,
+so files added by other tools are picked up.
+"""
+
+import os, json, threading
+
+def parse_filename(fname):
+    # file name is like GOOGL-daily-2016-06-10.csv; returns (sym, frequency, date) or None
+    if not fname.endswith('.csv'):
+        return None
+    parts = fname[:-len('.csv')].rsplit('-', 4)
+    if len(parts) != 5:
+        return None
+    return parts[0], parts[1], '-'.join(parts[2:])
+
+# the csv files are sorted with the most recent date first, so the oldest date is on the last line
+def read_date_range(fpath):
+    with open(fpath, 'rb') as f:
+        lines = f.read(4096).splitlines()
+        if len(lines) < 2:
+            return None
+        last = lines[1].split(b',')[0].decode()
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 4096))
+        tail = f.read().splitlines()
+        first = tail[-1].split(b',')[0].decode()
+    return [first, last]
+
+class Manifest:
+    filename = 'manifest.json'
+
+    def __init__(self, folder = 'datafiles-us'):
+        self.folder = folder
+        self.rlock = threading.RLock()
+        self.entries = None
+        self.shards = {}
+        self.touched = set()
+        self.dirty = False
+
+    def path(self):
+        return os.path.join(self.folder, self.filename)
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        self.shards = {}
+        if os.path.exists(self.path()):
+            with open(self.path()) as f:
+                content = json.load(f)
+            self.entries = content.get('entries', {})
+            self.shards = content.get('shards', {})
+        if not os.path.exists(self.folder):
+            return
+        for shard in os.listdir(self.folder):
+            shardpath = os.path.join(self.folder, shard)
+            if not os.path.isdir(shardpath):
+                continue
+            if self.shards.get(shard) != os.stat(shardpath).st_mtime:
+                self.scan_shard(shard)
+
+    # re-index one sub-folder, e.g. datafiles-us/A
+    def scan_shard(self, shard):
+        with self.rlock:
+            shardpath = os.path.join(self.folder, shard)
+            for key in [k for k in self.entries.keys() if k[:1] == shard]:
+                del self.entries[key]
+            for fname in os.listdir(shardpath):
+                parsed = parse_filename(fname)
+                if parsed is None:
+                    continue
+                sym, frequency, _ = parsed
+                try:
+                    daterange = read_date_range(os.path.join(shardpath, fname))
+                except OSError:
+                    continue
+                if daterange is None:
+                    continue
+                self.entries.setdefault(sym + '-' + frequency, {})[fname] = daterange
+            self.shards[shard] = os.stat(shardpath).st_mtime
+            self.dirty = True
+
+    def rebuild(self):
+        with self.rlock:
+            self.entries = {}
+            self.shards = {}
+            if not os.path.exists(self.folder):
+                return
+            for shard in os.listdir(self.folder):
+                if os.path.isdir(os.path.join(self.folder, shard)):
+                    self.scan_shard(shard)
+
+    # file names of a symbol, most recent first
+    def files(self, sym, frequency):
+        with self.rlock:
+            self._load()
+            entry = self.entries.get(sym + '-' + frequency, {})
+            return sorted(entry.keys(), key=lambda f: entry[f][1], reverse=True)
+
+    def paths(self, sym, frequency):
+        subFolderName = os.path.join(self.folder, sym[:1])
+        return [os.path.join(subFolderName, f) for f in self.files(sym, frequency)]
+
+    # (first date, last date) covered by the files of a symbol, or None
+    def coverage(self, sym, frequency):
+        with self.rlock:
+            self._load()
+            entry = self.entries.get(sym + '-' + frequency, {})
+            if len(entry) == 0:
+                return None
+            return min(r[0] for r in entry.values()), max(r[1] for r in entry.values())
+
+    # [first date, last date] of every file of a symbol
+    def ranges(self, sym, frequency):
+        with self.rlock:
+            self._load()
+            return [list(r) for r in self.entries.get(sym + '-' + frequency, {}).values()]
+
+    def record(self, sym, frequency, fname, first, last):
+        with self.rlock:
+            self._load()
+            self.entries.setdefault(sym + '-' + frequency, {})[fname] = [first, last]
+            self.touched.add(sym[:1])
+            self.dirty = True
+
+    def remove(self, sym, frequency, fname):
+        with self.rlock:
+            self._load()
+            self.entries.get(sym + '-' + frequency, {}).pop(fname, None)
+            self.touched.add(sym[:1])
+            self.dirty = True
+
+    # write the manifest to disk, replacing the old one atomically
+    def save(self):
+        with self.rlock:
+            if not self.dirty or self.entries is None:
+                return
+            # our own downloads changed these sub-folders, they are already indexed
+            for shard in self.touched:
+                shardpath = os.path.join(self.folder, shard)
+                if os.path.isdir(shardpath):
+                    self.shards[shard] = os.stat(shardpath).st_mtime
+            self.touched = set()
+            tmppath = self.path() + '.tmp'
+            with open(tmppath, 'w') as f:
+                json.dump({'entries': self.entries, 'shards': self.shards}, f)
+            os.replace(tmppath, self.path())
+            self.dirty = False
@@ -0,0 +1,88 @@
+"""
+Cross-sectional market panel: symbols x dates, one 2-D float array per field.
+Dates are the union of the trading dates of all symbols, most recent first
+(column 0 is the most recent date, like element [0] everywhere else).
+Missing bars are NaN.
+"""
+
+import numpy
+from .arrayMetrics import PanelMetrics
+from .featureFrame import FeatureFrame
+from .barStore import date_to_ordinal, ordinal_to_date
+from .barSeries import BarSeries
+
+class MarketPanel:
+    fields = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def __init__(self, symbols, dates, data):
+        self.symbols = list(symbols)
+        self.dates = numpy.asarray(dates, dtype=numpy.int32) # ordinals, most recent first
+        self.data = data # {field: ndarray(len(symbols), len(dates))}
+        self.index = {sym: i for i, sym in enumerate(self.symbols)}
+        self.pm = PanelMetrics()
+
+    # datasets: {sym: BarSeries} as returned by USMarket.getData(), or {sym: [row dict, ...]}
+    @classmethod
+    def from_datasets(cls, datasets, symbols = None):
+        if symbols is None:
+            symbols = sorted(datasets.keys())
+        datasets = {sym: datasets[sym] if isinstance(datasets[sym], BarSeries) else BarSeries.from_rows(datasets[sym])
+                    for sym in symbols}
+        rowDates = {sym: datasets[sym].dates.tolist() for sym in symbols}
+        alldates = set()
+        for dates in rowDates.values():
+            alldates.update(dates)
+        dates = numpy.array(sorted(alldates, reverse=True), dtype=numpy.int32)
+        position = {d: j for j, d in enumerate(dates.tolist())}
+        data = {f: numpy.full((len(symbols), len(dates)), numpy.nan) for f in cls.fields}
+        for i, sym in enumerate(symbols):
+            cols = [position[d] for d in rowDates[sym]]
+            for f in cls.fields:
+                data[f][i, cols] = datasets[sym].column(f)
+        return cls(symbols, dates, data)
+
+    def field(self, name):
+        return self.data[name]
+
+    # one symbol's values of a field, NaN where the symbol had no bar
+    def row(self, sym, name = 'Close'):
+        return self.data[name][self.index[sym]]
+
+    # BarSeries of one symbol's bars, most recent first: views into the panel when the symbol
+    # has a bar on every date since its first one, a compacted copy when bars are missing in between
+    def series(self, sym):
+        i = self.index[sym]
+        valid = ~numpy.isnan(self.data['Close'][i])
+        n = len(valid) if valid.all() else int(numpy.argmin(valid))
+        if valid[n:].any():
+            return BarSeries(self.dates[valid], {f: self.data[f][i][valid] for f in self.data.keys()})
+        return BarSeries(self.dates[:n], {f: self.data[f][i][:n] for f in self.data.keys()})
+
+    def frame(self, sym):
+        return FeatureFrame(self.series(sym))
+
+    def date_str(self, j):
+        return ordinal_to_date(self.dates[j])
+
+    # column of a date ('YYYY-MM-DD'), or of the most recent date before it
+    def column_of(self, dateStr):
+        o = date_to_ordinal(dateStr)
+        j = int(numpy.searchsorted(-self.dates, -o, side='left'))
+        if j == len(self.dates):
+            raise KeyError(dateStr)
+        return j
+
+    def ema(self, days, field = 'Close'):
+        return self.pm.ema(self.data[field], days)
+
+    def sma(self, days, field = 'Close'):
+        return self.pm.sma(self.data[field], days)
+
+    def macd_all(self, d1 = 12, d2 = 26, d3 = 9):
+        return self.pm.macd_all(self.data['Close'], d1, d2, d3)
+
+    def rsi(self, d = 14):
+        return self.pm.rsi(self.data['Close'], d)
+
+    def forceIndex(self, d = 13):
+        return self.pm.forceIndex(self.data['Close'], self.data['Volume'], d)
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
-import argparse, os, fnmatch, csv, shutil
+#run from the top folder: python3 -m ptools.merge_csv_files datafiles-us
+
+import argparse, os, csv, shutil
 from tqdm import tqdm
+from ptools.manifest import Manifest
 
 def arg_parser():
     parser = argparse.ArgumentParser(description='extract symbols listed in a csv file')
@@ -14,18 +17,17 @@ def touchFolder(foldername):
     if not os.path.exists(foldername):
         os.makedirs(foldername)
 
-def merge_one_symbol(source_folder, destfolder, sym, frequency):
+def merge_one_symbol(source_folder, destfolder, sym, frequency, manifest = None, destManifest = None):
     data = {}
     prefix = sym + '-' + frequency + '-'
-    source_sub_folder = os.path.join(source_folder, sym[:1])
-    for fname in os.listdir(source_sub_folder):
-        if fnmatch.fnmatch(fname, prefix + '*'):
-            localfpath = os.path.join(source_sub_folder, fname)
-            with open(localfpath) as csvfile:
-                reader = csv.DictReader(csvfile)
-                for datapoint in reader:
-                    data[datapoint['Date']] = datapoint
-                csvfile.close()
+    if manifest is None:
+        manifest = Manifest(source_folder)
+    for localfpath in manifest.paths(sym, frequency):
+        with open(localfpath) as csvfile:
+            reader = csv.DictReader(csvfile)
+            for datapoint in reader:
+                data[datapoint['Date']] = datapoint
+            csvfile.close()
     if len(data) == 0:
         return
 
@@ -44,26 +46,25 @@ def merge_one_symbol(source_folder, destfolder, sym, frequency):
         for k in keys:
             writer.writerow(data[k])
     csvout.close()
+    if destManifest is not None:
+        destManifest.record(sym, frequency, fname, min(data.keys()), maxdate)
 
 def merge_one_folder(folder):
     folder = folder.rstrip(os.path.sep)
-    symlist = []
-    for subfolder in os.listdir(folder):
-        path = os.path.join(folder, subfolder)
-        files = os.listdir(path)
-        dailyfiles = [f for f in files if 'daily' in f]
-        for fname in dailyfiles:
-            sym = fname.split('-')[0]
-            if sym not in symlist:
-                symlist.append(sym)
+    manifest = Manifest(folder)
+    manifest.rebuild()
+    symlist = sorted(set(key.rsplit('-', 1)[0] for key in manifest.entries.keys()
+                         if key.endswith('-daily')))
     print(str(symlist))
     if len(symlist) == 0:
         return
     tmpfoldername = folder + '_tmp'
     touchFolder(tmpfoldername)
+    destManifest = Manifest(tmpfoldername)
     for sym in tqdm(symlist, desc='Symbol files', unit=' Symbol'):
-        merge_one_symbol(folder, tmpfoldername, sym, 'daily')
-        merge_one_symbol(folder, tmpfoldername, sym, 'weekly')
+        merge_one_symbol(folder, tmpfoldername, sym, 'daily', manifest, destManifest)
+        merge_one_symbol(folder, tmpfoldername, sym, 'weekly', manifest, destManifest)
+    destManifest.save()
 
     shutil.rmtree(folder, ignore_errors=True)
     os.rename(tmpfoldername, folder)
@@ -3,117 +3,250 @@ Package for metrics calculations
 closePrices[0] is the most recent price
 """
 
+import abc, collections, copy, json, os
+from .arrayMetrics import ArrayMetrics
+
+def tolist(values):
+    return None if values is None else values.tolist()
+
+# list-based API kept for compatibility, calculations are done by ArrayMetrics
 class Metrics:
+    def __init__(self):
+        self.am = ArrayMetrics()
+
     # exponential moving average
     def ema(self, datapoints, days) :
         if days == 1:
             return datapoints
-        dsize = len(datapoints)
-        if dsize < days:
-            return None
-        ratio = float(2 / (days + 1))
-        init_smas = self.sma(datapoints[(dsize - days) : ], days)
-        if init_smas == None or len(init_smas) == 0:
-            return None
-        assert(len(init_smas) == 1)
-        prev_ema = float(init_smas[0])
-        emas = [prev_ema]
-        for i in reversed(range(dsize - days)):
-            cur_ema = (float(datapoints[i]) - float(prev_ema)) * ratio + prev_ema
-            emas.insert(0, cur_ema)
-            prev_ema = float(cur_ema)
-        return emas
+        return tolist(self.am.ema(datapoints, days))
 
     # simple moving average
     def sma(self, datapoints, days):
         if days == 1:
             return datapoints
-        dsize = len(datapoints)
-        if dsize < days:
-            return None
-        smas = []
-        for i in range(dsize - (days - 1)):
-            tmp = float(sum(datapoints[i:i+days]) / float(days))
-            smas.append(tmp)
-        return smas
+        return tolist(self.am.sma(datapoints, days))
 
     # Calculate a 12-day EMA of closing prices.
     # Calculate a 26-day EMA of closing prices.
     # Subtract the 26-day EMA from the 12-day EMA, and plot their difference as a solid line. This is the fast MACD line.
     # Calculate a 9-day EMA of the fast line, and plot the result as a dashed line. This is the slow Signal line.
     def macd_all(self, datapoints, d1 = 12, d2 = 26, d3 = 9):
-        ema_d1 = self.ema(datapoints, d1)
-        ema_d2 = self.ema(datapoints, d2)
-        if ema_d1 == None or ema_d2 == None:
+        ret = self.am.macd_all(datapoints, d1, d2, d3)
+        if ret is None:
             return None
         #macd line is also called the fast line
         #signal line is also called the slow line
-        macdline = [(x - y) for x, y in zip(ema_d1, ema_d2)]
-        signalLine = self.ema(macdline, d3)
-        if signalLine == None:
-            return None
-        histogram = [(x - y) for x, y in zip(macdline, signalLine)]
-        return {'fast': macdline, 'slow': signalLine, 'histo': histogram}
+        return {k: v.tolist() for k, v in ret.items()}
 
     def forceIndex(self, closePrices, volumes, d = 13):
-        assert(len(closePrices) == len(volumes))
-        index1 = []
-        for i in range(len(closePrices) - 1):
-            index1.append((closePrices[i] - closePrices[i+1]) * volumes[i])
-        fi = self.ema(index1, d)
-        return fi
+        return tolist(self.am.forceIndex(closePrices, volumes, d))
 
     def rsi(self, datapoints, d = 14):
-        dsize = len(datapoints)
-        if (dsize < d + 1):
+        return tolist(self.am.rsi(datapoints, d))
+
+    def support_and_resistance(self, openPrices, closePrices, window = 10):
+        ret = self.am.support_and_resistance(openPrices, closePrices, window)
+        return {'idx': ret['idx'].tolist(), 'price': ret['price'].tolist()}
+
+# Streaming indicators: they keep their recursive state and take one bar at a time,
+# oldest first, so a new bar costs O(1) instead of recomputing the whole history.
+# After the same bars, value() equals element [0] of the Metrics result.
+class StreamingIndicator(abc.ABC):
+    @abc.abstractmethod
+    def update(self, bar):
+        pass
+
+    @abc.abstractmethod
+    def value(self):
+        pass
+
+    # value after 'bar' without changing the state, e.g. for the bar of the ongoing session
+    def peek(self, bar):
+        ind = copy.deepcopy(self)
+        ind.update(bar)
+        return ind.value()
+
+    def state(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_state(cls, state):
+        ind = cls.__new__(cls)
+        ind.__dict__.update(state)
+        return ind
+
+class StreamingEMA(StreamingIndicator):
+    def __init__(self, days, field = 'Close'):
+        self.days = days
+        self.field = field
+        self.ema = None
+        self.warmup = [] # first 'days' values, their average seeds the ema
+
+    def push(self, x):
+        if self.ema is not None:
+            self.ema = (x - self.ema) * 2.0 / (self.days + 1) + self.ema
+            return
+        self.warmup.append(x)
+        if len(self.warmup) == self.days:
+            self.ema = sum(self.warmup) / self.days
+            self.warmup = []
+
+    def update(self, bar):
+        self.push(float(bar[self.field]))
+
+    def value(self):
+        return self.ema
+
+class StreamingSMA(StreamingIndicator):
+    def __init__(self, days, field = 'Close'):
+        self.days = days
+        self.field = field
+        self.window = collections.deque()
+        self.sum = 0.0 # of the values in the window
+
+    def update(self, bar):
+        x = float(bar[self.field])
+        self.window.append(x)
+        self.sum += x
+        if len(self.window) > self.days:
+            self.sum -= self.window.popleft()
+
+    def value(self):
+        if len(self.window) < self.days:
             return None
-        rsize = dsize - 1
-        gains = []
-        losses = []
-        for i in range(rsize):
-            if datapoints[i] > datapoints[i+1]:
-                gains.append(datapoints[i] - datapoints[i+1])
-                losses.append(0)
-            elif datapoints[i] < datapoints[i+1]:
-                losses.append(datapoints[i+1] - datapoints[i])
-                gains.append(0)
+        return self.sum / self.days
+
+    def state(self):
+        return {'days': self.days, 'field': self.field, 'window': list(self.window), 'sum': self.sum}
+
+    @classmethod
+    def from_state(cls, state):
+        ind = cls(state['days'], state['field'])
+        ind.window = collections.deque(state['window'])
+        ind.sum = state['sum']
+        return ind
+
+class StreamingMACD(StreamingIndicator):
+    def __init__(self, d1 = 12, d2 = 26, d3 = 9):
+        self.fast = StreamingEMA(d1)
+        self.slow = StreamingEMA(d2)
+        self.signal = StreamingEMA(d3)
+
+    def update(self, bar):
+        self.fast.update(bar)
+        self.slow.update(bar)
+        if self.fast.value() is not None and self.slow.value() is not None:
+            self.signal.push(self.fast.value() - self.slow.value())
+
+    def value(self):
+        if self.signal.value() is None:
+            return None
+        macdline = self.fast.value() - self.slow.value()
+        return {'fast': macdline, 'slow': self.signal.value(), 'histo': macdline - self.signal.value()}
+
+    def state(self):
+        return {k: v.state() for k, v in self.__dict__.items()}
+
+    @classmethod
+    def from_state(cls, state):
+        ind = cls.__new__(cls)
+        for k, v in state.items():
+            setattr(ind, k, StreamingEMA.from_state(v))
+        return ind
+
+class StreamingRSI(StreamingIndicator):
+    def __init__(self, d = 14):
+        self.d = d
+        self.prev = None
+        self.count = 0
+        self.avggain = 0.0
+        self.avgloss = 0.0
+
+    def update(self, bar):
+        x = float(bar['Close'])
+        if self.prev is not None:
+            gain = max(x - self.prev, 0)
+            loss = max(self.prev - x, 0)
+            if self.count < self.d:
+                self.avggain += gain / self.d
+                self.avgloss += loss / self.d
             else:
-                gains.append(0)
-                losses.append(0)
-        avggains = [sum(gains[rsize - d : rsize]) / d]
-        avglosses = [sum(losses[rsize - d : rsize]) / d]
-        for i in reversed(range(rsize - d)):
-            avggains.insert(0, (avggains[0] * 13 + gains[i]) / 14)
-            avglosses.insert(0, (avglosses[0] * 13 + losses[i]) /14)
-
-        RSarray = []
-        RSI =[]
-        for i in range(dsize - d):
-            rs = avggains[i] / avglosses[i]
-            RSarray.append(rs)
-            RSI.append(100 - 100 / (1 + rs))
-        return RSI
+                self.avggain = (self.avggain * (self.d - 1) + gain) / self.d
+                self.avgloss = (self.avgloss * (self.d - 1) + loss) / self.d
+            self.count += 1
+        self.prev = x
 
-    def support_and_resistance(self, openPrices, closePrices, window = 10):
-        ret = {'idx':[], 'price':[]}
-        assert(len(openPrices) == len(closePrices))
-        datalen = len(openPrices)
-        if datalen < window:
-            return ret
-        for i in range(datalen - window):
-            openMax = max(openPrices[i:i+window])
-            openMin = min(openPrices[i:i+window])
-            closeMax = max(closePrices[i:i+window])
-            closeMin = min(closePrices[i:i+window])
-            dmax = max(openMax, openMin, closeMax, closeMin)
-            dmin = min(openMax, openMin, closeMax, closeMin)
-            idx = i + int(window / 2)
-            medianmax = max(openPrices[idx], closePrices[idx])
-            medianmin = min(openPrices[idx], closePrices[idx])
-            if medianmax == dmax:
-                ret['idx'].append(idx)
-                ret['price'].append(medianmax)
-            elif medianmin == dmin:
-                ret['idx'].append(idx)
-                ret['price'].append(medianmin)
+    def value(self):
+        if self.count < self.d:
+            return None
+        if self.avgloss == 0:
+            return 100.0 if self.avggain > 0 else None
+        return 100 - 100 / (1 + self.avggain / self.avgloss)
+
+class StreamingForceIndex(StreamingIndicator):
+    def __init__(self, d = 13):
+        self.prev = None
+        self.ema = StreamingEMA(d)
+
+    def update(self, bar):
+        x = float(bar['Close'])
+        if self.prev is not None:
+            self.ema.push((x - self.prev) * float(bar['Volume']))
+        self.prev = x
+
+    def value(self):
+        return self.ema.value()
+
+    def state(self):
+        return {'prev': self.prev, 'ema': self.ema.state()}
+
+    @classmethod
+    def from_state(cls, state):
+        ind = cls.__new__(cls)
+        ind.prev = state['prev']
+        ind.ema = StreamingEMA.from_state(state['ema'])
+        return ind
+
+streaming_types = {c.__name__: c for c in [StreamingEMA, StreamingSMA, StreamingMACD,
+                                           StreamingRSI, StreamingForceIndex]}
+
+# a named set of streaming indicators for one symbol, persisted as json
+class StreamingIndicators:
+    def __init__(self, indicators = None):
+        if indicators is None:
+            indicators = {'macd': StreamingMACD(), 'rsi': StreamingRSI(), 'forceIndex': StreamingForceIndex(),
+                          'ema10': StreamingEMA(10), 'sma26': StreamingSMA(26)}
+        self.indicators = indicators
+        self.last_date = None
+
+    # bars must come oldest first; bars not newer than the last one seen are ignored
+    def update(self, bar):
+        if self.last_date is not None and bar['Date'] <= self.last_date:
+            return
+        for ind in self.indicators.values():
+            ind.update(bar)
+        self.last_date = bar['Date']
+
+    def values(self):
+        return {name: ind.value() for name, ind in self.indicators.items()}
+
+    def peek(self, bar):
+        return {name: ind.peek(bar) for name, ind in self.indicators.items()}
+
+    def save(self, path):
+        state = {'last_date': self.last_date,
+                 'indicators': {name: {'type': type(ind).__name__, 'state': ind.state()}
+                                for name, ind in self.indicators.items()}}
+        tmppath = path + '.tmp'
+        with open(tmppath, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmppath, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f)
+        ret = cls({name: streaming_types[s['type']].from_state(s['state'])
+                   for name, s in state['indicators'].items()})
+        ret.last_date = state['last_date']
         return ret
@@ -0,0 +1,102 @@
+"""
+Market-data providers behind USMarket.
+A provider has two methods:
+  download_history(sym, start, end, frequency, path): csv of the bars within [start, end] written to path,
+                                                      raises FetchError when it can't
+  get_quotes(symbols): {sym: quote} of the ongoing session, see ptools.quotes
+YahooProvider talks to the network. RecordingProvider wraps another provider and keeps a copy
+of every response in a folder, ReplayProvider serves that folder back with injected latency,
+so the download pipeline can be measured and tested on a machine without network.
+"""
+
+import json, os, random, shutil, threading, time
+from datetime import datetime
+from .fetcher import Fetcher, FetchError
+from .quotes import YahooGoogleQuoteSource
+
+def construct_yahoo_link(base_url, sym, start, end, frequency):
+    start = datetime.strptime(start, '%Y-%m-%d')
+    end = datetime.strptime(end, '%Y-%m-%d')
+    # on yahoo, month starts at 00, instead of 01
+    return base_url + '?s=' + sym + \
+        '&a=%02d&b=%d&c=%d' % (start.month - 1, start.day, start.year) + \
+        '&d=%02d&e=%d&f=%d' % (end.month - 1, end.day, end.year) + \
+        '&g=' + {'daily': 'd', 'weekly': 'w', 'monthly': 'm'}[frequency] + '&ignore=.csv'
+
+class YahooProvider:
+    history_url = 'http://real-chart.finance.yahoo.com/table.csv'
+
+    # base_url: history endpoint, can point to a local server
+    def __init__(self, fetcher = None, base_url = None):
+        self.fetcher = fetcher if fetcher is not None else Fetcher()
+        self.base_url = base_url if base_url is not None else self.history_url
+        self.quote_source = YahooGoogleQuoteSource(self.fetcher)
+
+    def download_history(self, sym, start, end, frequency, path):
+        self.fetcher.fetch(construct_yahoo_link(self.base_url, sym, start, end, frequency), path)
+
+    def get_quotes(self, symbols):
+        return self.quote_source.get_quotes(symbols)
+
+def history_key(sym, start, end, frequency):
+    return '-'.join([sym, frequency, start, end]) + '.csv'
+
+class RecordingProvider:
+    def __init__(self, provider, folder):
+        self.provider = provider
+        self.folder = folder
+        self.rlock = threading.RLock()
+        os.makedirs(os.path.join(folder, 'history'), exist_ok=True)
+
+    def download_history(self, sym, start, end, frequency, path):
+        self.provider.download_history(sym, start, end, frequency, path)
+        shutil.copyfile(path, os.path.join(self.folder, 'history', history_key(sym, start, end, frequency)))
+
+    # quotes of every call go into one file, the latest quote of a symbol wins
+    def get_quotes(self, symbols):
+        quotes = self.provider.get_quotes(symbols)
+        with self.rlock:
+            recorded = load_quotes(self.folder)
+            recorded.update(quotes)
+            tmppath = os.path.join(self.folder, 'quotes.json.tmp')
+            with open(tmppath, 'w') as f:
+                json.dump(recorded, f)
+            os.replace(tmppath, os.path.join(self.folder, 'quotes.json'))
+        return quotes
+
+def load_quotes(folder):
+    path = os.path.join(folder, 'quotes.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+class ReplayProvider:
+    # every request takes 'latency' seconds, and with probability 'tail_rate' takes 'tail_latency'
+    # instead; the sequence is reproducible for a given seed
+    def __init__(self, folder, latency = 0, tail_latency = 0, tail_rate = 0, seed = 0):
+        self.folder = folder
+        self.latency = latency
+        self.tail_latency = tail_latency
+        self.tail_rate = tail_rate
+        self.random = random.Random(seed)
+        self.quotes = load_quotes(folder)
+        self.rlock = threading.RLock()
+
+    def delay(self):
+        with self.rlock:
+            tail = self.random.random() < self.tail_rate
+        time.sleep(self.tail_latency if tail else self.latency)
+
+    def download_history(self, sym, start, end, frequency, path):
+        self.delay()
+        recorded = os.path.join(self.folder, 'history', history_key(sym, start, end, frequency))
+        if not os.path.exists(recorded):
+            # not a fact about the symbol: a live run must still try it, so the error isn't permanent
+            raise FetchError(recorded, 'not recorded')
+        shutil.copyfile(recorded, path + '.part')
+        os.replace(path + '.part', path)
+
+    def get_quotes(self, symbols):
+        self.delay()
+        return {sym: dict(self.quotes[sym]) for sym in symbols if sym in self.quotes}
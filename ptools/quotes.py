@@ -0,0 +1,117 @@
+"""
+Live quotes for the bar of the ongoing session, fetched for many symbols per request.
+A quote is {'Open', 'High', 'Low', 'Close', 'Volume'} of floats.
+QuoteCache asks its source for 'batch_size' symbols at a time and keeps every quote
+for 'ttl' seconds, so back-to-back scans reuse them instead of asking again; symbols without
+a quote are remembered for as long, so per-symbol lookups don't ask for them one at a time.
+Sources: YahooGoogleQuoteSource (the network) and LocalQuoteSource (tests and benchmarks).
+"""
+
+import csv, io, threading, time
+from .fetcher import Fetcher
+
+class LocalQuoteSource:
+    # quotes: {sym: quote}; latency: seconds each request takes
+    def __init__(self, quotes = None, latency = 0):
+        self.quotes = dict(quotes) if quotes is not None else {}
+        self.latency = latency
+        self.requests = 0
+
+    def get_quotes(self, symbols):
+        self.requests += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        return {sym: dict(self.quotes[sym]) for sym in symbols if sym in self.quotes}
+
+class YahooGoogleQuoteSource:
+    # open/high/low/volume come from one yahoo quotes.csv request,
+    # 'Close' from one google request, google has no 15-minute delay
+    yahoo_url = 'http://download.finance.yahoo.com/d/quotes.csv'
+
+    def __init__(self, fetcher = None):
+        self.fetcher = fetcher if fetcher is not None else Fetcher()
+
+    def get_quotes(self, symbols):
+        from googlefinance import getQuotes as gQuotes
+        ret = {}
+        # s: symbol, o: open, h: day's high, g: day's low, l1: last trade price, v: volume
+        body = self.fetcher.read(self.yahoo_url + '?s=' + ','.join(symbols) + '&f=sohgl1v')
+        for row in csv.reader(io.StringIO(body.decode('latin-1'))):
+            try:
+                ret[row[0]] = {'Open': float(row[1]), 'High': float(row[2]), 'Low': float(row[3]),
+                               'Close': float(row[4]), 'Volume': float(row[5])}
+            except (ValueError, IndexError):
+                continue # 'N/A' fields of unknown symbols
+        try:
+            quotes = gQuotes(list(ret.keys()))
+        except:
+            quotes = [] # keep yahoo's last trade prices
+        for q in quotes:
+            # a quote google names differently, or can't price, keeps yahoo's price of that symbol only
+            try:
+                if q['StockSymbol'] in ret:
+                    ret[q['StockSymbol']]['Close'] = float(q['LastTradePrice'].replace(',', ''))
+            except (KeyError, ValueError, TypeError, AttributeError):
+                continue
+        return ret
+
+class QuoteCache:
+    def __init__(self, source = None, batch_size = 100, ttl = 60):
+        self.source = source if source is not None else YahooGoogleQuoteSource()
+        self.batch_size = batch_size
+        self.ttl = ttl
+        self.cache = {} # sym -> (time fetched, quote or None when the source had none)
+        self.pending = {} # sym -> threading.Event of the request that is fetching it
+        self.rlock = threading.RLock()
+
+    # {sym: quote} for the symbols that have a quote, fresh ones come from the cache.
+    # A symbol without a quote, or whose batch failed, is not asked again for 'ttl' seconds.
+    # Requests run outside the lock; a symbol another thread is fetching waits for that request
+    def get(self, symbols):
+        now = time.time()
+        ret = {}
+        stale = []
+        waits = []
+        with self.rlock:
+            for sym in symbols:
+                entry = self.cache.get(sym)
+                if entry is not None and now - entry[0] < self.ttl:
+                    if entry[1] is not None:
+                        ret[sym] = entry[1]
+                elif sym in self.pending:
+                    waits.append((sym, self.pending[sym]))
+                elif sym not in stale:
+                    stale.append(sym)
+            done = threading.Event()
+            for sym in stale:
+                self.pending[sym] = done
+        try:
+            for i in range(0, len(stale), self.batch_size):
+                batch = stale[i:i + self.batch_size]
+                try:
+                    quotes = self.source.get_quotes(batch)
+                except:
+                    quotes = {} # live with the fact that these quotes are missing
+                with self.rlock:
+                    for sym in batch:
+                        quote = quotes.get(sym)
+                        self.cache[sym] = (now, quote)
+                        if quote is not None:
+                            ret[sym] = quote
+        finally:
+            with self.rlock:
+                for sym in stale:
+                    if self.pending.get(sym) is done:
+                        del self.pending[sym]
+            done.set()
+        for sym, event in waits:
+            event.wait()
+            with self.rlock:
+                entry = self.cache.get(sym)
+            if entry is not None and entry[1] is not None:
+                ret[sym] = entry[1]
+        return ret
+
+    def clear(self):
+        with self.rlock:
+            self.cache = {}
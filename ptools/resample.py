@@ -0,0 +1,73 @@
+"""
+Weekly and monthly bars derived from daily bars in one grouped pass.
+A weekly bar is dated on the Monday of its week, a monthly bar on the first day of its month,
+the way yahoo dates them. Volume is the average daily volume of the period, like yahoo weekly data.
+The most recent period may be partial (the ongoing week or month).
+"""
+
+import numpy
+from datetime import date
+from .barStore import date_to_ordinal, ordinal_to_date
+from .barSeries import BarSeries
+
+fields = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+epoch = date(1970, 1, 1).toordinal()
+
+# week bucket: ordinal of the Monday of the week
+def week_ids(ordinals):
+    ordinals = numpy.asarray(ordinals, dtype=numpy.int64)
+    return ordinals - (ordinals - 1) % 7 # ordinal 1 is a Monday
+
+# month bucket: year * 12 + month - 1
+def month_ids(ordinals):
+    days = numpy.asarray(ordinals, dtype=numpy.int64) - epoch
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype('int64') + 1970 * 12
+
+def period_start(ids, frequency):
+    if frequency == 'weekly':
+        return ids
+    first = (ids - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]').astype('int64')
+    return first + epoch
+
+# bars: {'Date': ordinals, 'Open': ..., ...} arrays in any order; returns the same layout,
+# one entry per period, most recent period first
+def resample(bars, frequency = 'weekly'):
+    dates = numpy.asarray(bars['Date'], dtype=numpy.int64)
+    order = numpy.argsort(dates, kind='stable')
+    dates = dates[order]
+    if len(dates) == 0:
+        return {f: numpy.zeros(0) for f in ['Date'] + fields}
+    ids = week_ids(dates) if frequency == 'weekly' else month_ids(dates)
+    starts = numpy.flatnonzero(numpy.concatenate([[True], ids[1:] != ids[:-1]]))
+    ends = numpy.concatenate([starts[1:], [len(dates)]]) - 1
+    values = {f: numpy.asarray(bars[f], dtype=float)[order] for f in fields}
+    ret = {'Date': period_start(ids[starts], frequency),
+           'Open': values['Open'][starts],
+           'High': numpy.maximum.reduceat(values['High'], starts),
+           'Low': numpy.minimum.reduceat(values['Low'], starts),
+           'Close': values['Close'][ends],
+           'Volume': numpy.add.reduceat(values['Volume'], starts) / (ends - starts + 1)}
+    return {k: v[::-1] for k, v in ret.items()}
+
+# same for a BarSeries, returns the periods as a BarSeries
+def resample_series(series, frequency = 'weekly'):
+    periods = resample(dict(series.columns, Date=series.dates), frequency)
+    return BarSeries(periods['Date'], {f: periods[f] for f in fields})
+
+# same for {date string: row dict} as the history files are read
+def resample_rows(rows, frequency = 'weekly'):
+    keys = sorted(rows.keys())
+    bars = {'Date': numpy.array([date_to_ordinal(k) for k in keys], dtype=numpy.int64)}
+    for f in fields:
+        bars[f] = numpy.array([float(rows[k][f]) for k in keys])
+    periods = resample(bars, frequency)
+    ret = {}
+    columns = {f: periods[f].tolist() for f in fields}
+    for i, ordinal in enumerate(periods['Date'].tolist()):
+        dt = ordinal_to_date(ordinal)
+        row = {'Date': dt}
+        for f in fields:
+            row[f] = columns[f][i]
+        ret[dt] = row
+    return ret
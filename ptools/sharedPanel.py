@@ -0,0 +1,61 @@
+"""
+MarketPanel published in shared memory, so worker processes read one copy of the market data
+instead of each receiving a pickled copy.
+The publisher owns the block: SharedPanel(panel) copies the panel into it once.
+Workers get the small picklable 'handle' (block name, symbols, shape) and attach(handle)
+returns a MarketPanel whose arrays are read-only views into the block.
+Block layout: dates (int32, padded to 8 bytes), then one float64 (symbols x dates) array per field.
+"""
+
+import numpy
+from multiprocessing import shared_memory
+from .marketPanel import MarketPanel
+
+def layout(nsymbols, ndates, fields):
+    offsets = {}
+    offset = (ndates * 4 + 7) // 8 * 8
+    for f in fields:
+        offsets[f] = offset
+        offset += nsymbols * ndates * 8
+    return offsets, max(offset, 1)
+
+class SharedPanel:
+    def __init__(self, panel, name = None):
+        fields = list(panel.data.keys())
+        nsymbols, ndates = len(panel.symbols), len(panel.dates)
+        offsets, size = layout(nsymbols, ndates, fields)
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        numpy.ndarray(ndates, dtype=numpy.int32, buffer=self.shm.buf)[:] = panel.dates
+        for f in fields:
+            numpy.ndarray((nsymbols, ndates), dtype=numpy.float64, buffer=self.shm.buf,
+                          offset=offsets[f])[:] = panel.data[f]
+        self.handle = {'name': self.shm.name, 'symbols': list(panel.symbols),
+                       'ndates': ndates, 'fields': fields}
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+# read-only MarketPanel over a published block; keep the panel alive while its arrays are used
+def attach(handle):
+    shm = shared_memory.SharedMemory(name=handle['name'])
+    nsymbols, ndates = len(handle['symbols']), handle['ndates']
+    offsets, _ = layout(nsymbols, ndates, handle['fields'])
+    dates = numpy.ndarray(ndates, dtype=numpy.int32, buffer=shm.buf)
+    dates.flags.writeable = False
+    data = {}
+    for f in handle['fields']:
+        data[f] = numpy.ndarray((nsymbols, ndates), dtype=numpy.float64, buffer=shm.buf, offset=offsets[f])
+        data[f].flags.writeable = False
+    panel = MarketPanel(handle['symbols'], dates, data)
+    panel.shm = shm # the views are valid as long as the mapping is
+    return panel
@@ -0,0 +1,67 @@
+from unittest import TestCase
+import tempfile
+
+from ptools.manifest import Manifest
+from ptools.tradingCalendar import TradingCalendar
+from ptools.backfill import BackfillPlanner, Failures
+from ptools.test_manifest import write_csv
+
+class TestBackfill(TestCase):
+    def planner(self, folder, merge_sessions = 20):
+        return BackfillPlanner(Manifest(folder), TradingCalendar(2010, 2017), Failures(folder),
+                               merge_sessions=merge_sessions)
+
+    def test_gaps(self):
+        folder = tempfile.mkdtemp()
+        # 2016-07-29 and 2016-08-01 are consecutive sessions: no gap between these files
+        write_csv(folder, 'AAA-daily-2016-07-29.csv', ['2016-07-29', '2016-07-01'])
+        write_csv(folder, 'AAA-daily-2016-08-03.csv', ['2016-08-03', '2016-08-01'])
+        # a gap from 2016-06-01 to 2016-06-30, and the tail after 2016-08-03
+        write_csv(folder, 'BBB-daily-2016-05-31.csv', ['2016-05-31', '2016-01-04'])
+        write_csv(folder, 'BBB-daily-2016-08-03.csv', ['2016-08-03', '2016-07-01'])
+        write_csv(folder, 'BBB-weekly-2016-07-25.csv', ['2016-07-25', '2016-01-04'])
+        p = self.planner(folder)
+        assert p.plan(['AAA'], 'daily', '2016-08-03') == []
+        assert p.plan(['AAA', 'BBB'], 'daily', '2016-08-05') == \
+            [('AAA', '2016-08-04', '2016-08-05'), ('BBB', '2016-06-01', '2016-06-30'), ('BBB', '2016-08-04', '2016-08-05')]
+        assert p.plan(['BBB'], 'weekly', '2016-07-29') == []
+        assert p.plan(['BBB'], 'weekly', '2016-08-05') == [('BBB', '2016-08-01', '2016-08-05')]
+        # nothing on disk: the whole default depth
+        assert p.plan(['CCC'], 'daily', '2016-08-03') == [('CCC', '2011-08-03', '2016-08-03')]
+        # gaps with less than 30 covered sessions between them are one request
+        merged = self.planner(folder, merge_sessions=30)
+        assert merged.plan(['BBB'], 'daily', '2016-08-05') == [('BBB', '2016-06-01', '2016-08-05')]
+
+    def test_failures(self):
+        folder = tempfile.mkdtemp()
+        failures = Failures(folder)
+        failures.record('XYZ', 'daily', 'HTTP 404', '2016-08-01')
+        assert failures.blocked('XYZ', 'daily', '2016-08-01')
+        assert not failures.blocked('XYZ', 'daily', '2016-08-02')
+        failures.record('XYZ', 'daily', 'HTTP 404', '2016-08-02')
+        failures.record('XYZ', 'daily', 'HTTP 404', '2016-08-02')
+        assert failures.blocked('XYZ', 'daily', '2016-08-05') # 4 days of backoff
+        assert not failures.blocked('XYZ', 'daily', '2016-08-06')
+        failures.save()
+
+        reloaded = Failures(folder)
+        assert reloaded.blocked('XYZ', 'daily', '2016-08-05')
+        p = BackfillPlanner(Manifest(folder), TradingCalendar(2010, 2017), reloaded)
+        assert p.plan(['XYZ'], 'daily', '2016-08-05', '2016-08-05') == []
+        reloaded.clear('XYZ', 'daily')
+        assert len(p.plan(['XYZ'], 'daily', '2016-08-05', '2016-08-05')) == 1
+
+    def test_gap_failures(self):
+        folder = tempfile.mkdtemp()
+        write_csv(folder, 'BBB-daily-2016-05-31.csv', ['2016-05-31', '2016-01-04'])
+        write_csv(folder, 'BBB-daily-2016-08-03.csv', ['2016-08-03', '2016-07-01'])
+        failures = Failures(folder)
+        # the provider can't fill the old gap: only that gap waits, the newest bars are still planned
+        failures.record('BBB', 'daily', 'empty response', '2016-08-05', start='2016-06-01')
+        assert not failures.blocked('BBB', 'daily', '2016-08-05')
+        p = BackfillPlanner(Manifest(folder), TradingCalendar(2010, 2017), failures, merge_sessions=30)
+        assert p.plan(['BBB'], 'daily', '2016-08-05', '2016-08-05') == [('BBB', '2016-08-04', '2016-08-05')]
+        # a download of the newest bars doesn't clear the failure of the gap
+        failures.clear('BBB', 'daily')
+        assert failures.blocked('BBB', 'daily', '2016-08-05', '2016-06-01')
+        assert p.plan(['BBB'], 'daily', '2016-08-05', '2016-08-06') == [('BBB', '2016-06-01', '2016-08-05')]
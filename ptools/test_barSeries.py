@@ -0,0 +1,61 @@
+from unittest import TestCase
+import numpy
+
+from ptools import BarSeries, FeatureFrame
+from ptools.featureFrame import as_frame
+from ptools.barStore import rows_to_bars
+from ptools.test_marketPanel import make_rows
+
+class TestBarSeries(TestCase):
+    def test_rows(self):
+        rows = make_rows([3.0, 2.0, 1.0])
+        rows[0]['Current'] = True
+        series = BarSeries.from_rows(rows)
+        assert(len(series) == 3)
+        assert(series[0]['Date'] == rows[0]['Date'] and series[0]['Close'] == 3.0)
+        assert(series[0].get('Current') and series[1].get('Current') is None)
+        assert(series[-1]['Volume'] == 1002)
+        assert([x['Close'] for x in series] == [3.0, 2.0, 1.0])
+        assert(series.to_rows() == rows)
+        try:
+            series[3]
+            assert(False)
+        except IndexError:
+            pass
+
+    def test_views(self):
+        series = BarSeries.from_rows(make_rows([4.0, 3.0, 2.0, 1.0]))
+        older = series[1:]
+        assert(numpy.shares_memory(older.column('Close'), series.column('Close')))
+        assert(older[0]['Close'] == 3.0 and len(older) == 3)
+        assert(series.until(older[1]['Date'])[0]['Close'] == 2.0)
+        assert(len(series.until('1990-01-01')) == 0)
+        frame = as_frame(series)
+        assert(isinstance(frame, FeatureFrame) and len(frame) == 4)
+        assert(frame.column('Close') is series.column('Close'))
+        assert(numpy.allclose(frame.ema(2), FeatureFrame(series.to_rows()).ema(2)))
+
+    def test_merge(self):
+        rows = make_rows([4.0, 3.0, 2.0, 1.0])
+        series = BarSeries.from_dict({row['Date']: row for row in rows[1:]})
+        assert(series.to_rows() == rows[1:])
+        assert(series.since(rows[2]['Date']).to_rows() == rows[1:3])
+        # a newer bar of the ongoing session, and a bar that replaces one of the same date
+        newer = dict(rows[0], Current=True)
+        replaced = dict(rows[2], Close=9.0)
+        merged = series.merge(BarSeries.from_rows([newer, replaced]))
+        assert(merged.current and merged[0].get('Current'))
+        assert([x['Close'] for x in merged] == [4.0, 3.0, 9.0, 1.0])
+        # downloaded bars replace the bar of the ongoing session
+        closed = merged.merge(BarSeries.from_rows([dict(rows[0], Close=5.0)]))
+        assert(not closed.current and closed[0]['Close'] == 5.0 and len(closed) == 4)
+        assert(len(BarSeries.from_rows([]).merge(BarSeries.from_rows([]))) == 0)
+
+    def test_from_bars(self):
+        rows = make_rows([4.0, 3.0, 2.0, 1.0])
+        bars = rows_to_bars(rows)
+        series = BarSeries.from_bars(bars)
+        # most recent first, views of the structured array
+        assert(series.to_rows() == rows)
+        assert(numpy.shares_memory(series.column('Close'), bars))
+        assert(BarSeries.from_bars(bars[:3])[0]['Close'] == 3.0)
@@ -0,0 +1,20 @@
+from unittest import TestCase
+import tempfile
+
+from ptools.barStore import BarStore
+
+class TestBarStore(TestCase):
+    def test_merge_and_load(self):
+        store = BarStore(tempfile.mkdtemp())
+        rows = [{'Date': '2016-08-0' + str(d), 'Open': '1.0', 'High': '2.0', 'Low': '0.5',
+                 'Close': str(d), 'Volume': '100', 'Adj Close': str(d)} for d in range(1, 6)]
+        store.merge('UCO', 'daily', rows[:3])
+        store.merge('UCO', 'daily', rows[2:])
+        bars = store.load('UCO', 'daily')
+        assert(len(bars) == 5)
+        assert(list(bars['Close']) == [1.0, 2.0, 3.0, 4.0, 5.0])
+
+        data = store.load_dict('UCO', 'daily', '2016-08-04', 2)
+        assert(sorted(data.keys()) == ['2016-08-03', '2016-08-04'])
+        assert(data['2016-08-04']['Close'] == 4.0)
+        assert(data['2016-08-04']['Date'] == '2016-08-04')
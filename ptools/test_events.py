@@ -0,0 +1,48 @@
+from unittest import TestCase
+import random
+
+from ptools import events
+from ptools.arrayMetrics import ArrayMetrics, sliding_max
+
+class TestEvents(TestCase):
+    def test_crosses(self):
+        a = [3, 2, 1, 2, 3, 3]
+        b = [2, 2, 2, 2, 2, 2]
+        assert(events.crosses(a, b).tolist() == [])
+        assert(events.crosses([3, 1, 3, 1], b[:4]).tolist() == [0, 1, 2])
+
+    def test_macd_crosses(self):
+        histo = [0.5, 0.2, -0.1, -0.3, 0.1, 0.2, -0.2]
+        assert(events.gold_crosses(histo).tolist() == [1, 5])
+        assert(events.dead_crosses(histo).tolist() == [3])
+        assert(events.thin([1, 5, 9, 20], 7).tolist() == [1, 9, 20])
+
+    def test_sliding_extrema(self):
+        random.seed(7)
+        data = [random.random() for i in range(200)]
+        for size in [1, 3, 10, 17]:
+            expected = [max(data[i:i+size]) for i in range(len(data) - size + 1)]
+            assert(sliding_max(data, size).tolist() == expected)
+        maxima = [i for i in range(len(data)) if data[i] == max(data[max(0, i-5):i+6])]
+        assert(events.local_maxima(data, 10).tolist() == maxima)
+
+    def test_support_and_resistance(self):
+        random.seed(3)
+        openPrices = [random.randint(90, 110) for i in range(300)]
+        closePrices = [random.randint(90, 110) for i in range(300)]
+        window = 20
+        # straightforward definition: median bar body is the window's extreme
+        expected = {'idx':[], 'price':[]}
+        for i in range(len(openPrices) - window):
+            dmax = max(openPrices[i:i+window] + closePrices[i:i+window])
+            dmin = min(openPrices[i:i+window] + closePrices[i:i+window])
+            idx = i + int(window / 2)
+            if max(openPrices[idx], closePrices[idx]) == dmax:
+                expected['idx'].append(idx)
+                expected['price'].append(dmax)
+            elif min(openPrices[idx], closePrices[idx]) == dmin:
+                expected['idx'].append(idx)
+                expected['price'].append(dmin)
+        sr = ArrayMetrics().support_and_resistance(openPrices, closePrices, window)
+        assert(sr['idx'].tolist() == expected['idx'])
+        assert(sr['price'].tolist() == expected['price'])
@@ -0,0 +1,45 @@
+from unittest import TestCase
+import time, threading
+
+from ptools import Executor
+
+class TestExecutor(TestCase):
+    def test_results_and_errors(self):
+        def work(x):
+            if x == 3:
+                raise ValueError(x)
+            time.sleep(0.01 * (5 - x))
+            return x * x
+
+        with Executor(4, 2) as executor:
+            futures = [executor.submit(work, x) for x in range(5)]
+            executor.wait_for_all()
+        assert([f.result() for f in futures if f.exception() is None] == [0, 1, 4, 16])
+        assert(len(executor.records) == 5)
+        assert([r['args'] for r in executor.errors()] == [(3, )])
+
+    def test_completion_order(self):
+        # a slow first task must not hold back the ones submitted after it
+        with Executor(2) as executor:
+            slow = executor.submit(time.sleep, 0.2)
+            fast = executor.submit(time.sleep, 0)
+            first = next(iter(executor.as_completed()))
+            assert(first is fast)
+            executor.wait_for_all()
+            assert(slow.done())
+
+    def test_bounded(self):
+        running = []
+        peak = []
+        rlock = threading.RLock()
+        def work(x):
+            with rlock:
+                running.append(x)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with rlock:
+                running.remove(x)
+
+        with Executor(3) as executor:
+            executor.map(work, range(12))
+        assert(max(peak) <= 3)
@@ -0,0 +1,31 @@
+from unittest import TestCase
+import threading, time
+
+from ptools import FeatureFrame, Metrics
+
+class TestFeatureFrame(TestCase):
+    def test_memoized_indicators(self):
+        data = [{'Open': 10.0 + i % 7, 'Close': 10.5 + i % 5, 'Volume': '1000'} for i in range(60)]
+        frame = FeatureFrame(data)
+        closePrices = [x['Close'] for x in data]
+        assert(frame.ema(10).tolist() == Metrics().ema(closePrices, 10))
+        assert(frame.ema(10) is frame.ema(10))
+        assert(frame.macd_all() is frame.macd_all())
+        assert(frame.macd_all(5, 10, 3) is not frame.macd_all())
+        assert(frame.column('Volume')[0] == 1000.0)
+        assert(len(frame.support_and_resistance(10, 30)['idx']) > 0)
+
+    def test_memo_across_threads(self):
+        frame = FeatureFrame.from_columns(Close=[10.0 + i % 5 for i in range(60)])
+        calls = []
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return len(calls)
+        # rules in several threads reading one indicator compute it once
+        threads = [threading.Thread(target=frame.memo, args=('slow', compute)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert(len(calls) == 1 and frame.memo('slow', compute) == 1)
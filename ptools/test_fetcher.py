@@ -0,0 +1,109 @@
+from unittest import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ptools.fetcher import Fetcher, FetchError
+import os, tempfile, threading, time
+
+csv_fixture = b'Date,Open,High,Low,Close,Volume,Adj Close\n2016-08-03,1.0,2.0,0.5,1.5,1000,1.5\n'
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    failures = {}
+
+    def do_GET(self):
+        if self.path.startswith('/missing'):
+            self.reply(404, b'not found')
+        elif self.path.startswith('/flaky') and Handler.failures.get(self.path, 0) < 2:
+            Handler.failures[self.path] = Handler.failures.get(self.path, 0) + 1
+            self.reply(500, b'try again')
+        elif self.path.startswith('/slow'):
+            time.sleep(0.5)
+            self.reply(200, csv_fixture)
+        elif self.path.startswith('/chunked'):
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for part in (csv_fixture[:10], csv_fixture[10:]):
+                self.wfile.write(b'%x\r\n' % len(part) + part + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.reply(200, csv_fixture)
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class Server(ThreadingHTTPServer):
+    # clients that time out close the connection early, that is expected
+    def handle_error(self, request, client_address):
+        pass
+
+class TestFetcher(TestCase):
+    def setUp(self):
+        self.server = Server(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.folder = tempfile.TemporaryDirectory()
+        Handler.failures = {}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.folder.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.folder.name, name)
+
+    def test_keep_alive(self):
+        with Fetcher(per_host=1) as f:
+            for i in range(5):
+                f.fetch(self.base + '/table.csv?s=S%d' % i, self.path('S%d.csv' % i))
+            assert f.read(self.base + '/quotes.csv?s=S1,S2') == csv_fixture
+            assert f.stats['requests'] == 6
+            assert f.stats['connections'] == 1
+        with open(self.path('S4.csv'), 'rb') as csvfile:
+            assert csvfile.read() == csv_fixture
+
+    def test_fetch_all(self):
+        with Fetcher(per_host=4) as f:
+            requests = [(self.base + '/table.csv?s=S%d' % i, self.path('S%d.csv' % i)) for i in range(20)]
+            requests.append((self.base + '/missing', self.path('missing.csv')))
+            results = f.fetch_all(requests)
+            assert results[:20] == [None] * 20
+            assert isinstance(results[20], FetchError) and results[20].permanent()
+            assert f.stats['connections'] <= 4
+
+    def test_errors(self):
+        with Fetcher(retries=3, backoff=0.01, timeout=0.2) as f:
+            # 404 is not retried, nothing is written
+            try:
+                f.fetch(self.base + '/missing', self.path('m.csv'))
+                assert False
+            except FetchError as e:
+                assert e.status == 404
+            assert f.stats['retries'] == 0
+            assert sorted(os.listdir(self.folder.name)) == []
+            # two 500s, then the file
+            f.fetch(self.base + '/flaky', self.path('f.csv'))
+            assert f.stats['retries'] == 2
+            assert os.path.exists(self.path('f.csv'))
+            # every attempt times out
+            try:
+                f.fetch(self.base + '/slow', self.path('s.csv'))
+                assert False
+            except FetchError:
+                pass
+            assert not os.path.exists(self.path('s.csv'))
+            assert not os.path.exists(self.path('s.csv.part'))
+
+    def test_chunked(self):
+        with Fetcher() as f:
+            f.fetch(self.base + '/chunked', self.path('c.csv'))
+            f.fetch(self.base + '/table.csv', self.path('t.csv'))
+            assert f.stats['connections'] == 1
+        with open(self.path('c.csv'), 'rb') as csvfile:
+            assert csvfile.read() == csv_fixture
@@ -0,0 +1,32 @@
+from unittest import TestCase
+import tempfile, os
+
+from ptools.manifest import Manifest
+
+def write_csv(folder, fname, dates):
+    subfolder = os.path.join(folder, fname[:1])
+    if not os.path.exists(subfolder):
+        os.makedirs(subfolder)
+    with open(os.path.join(subfolder, fname), 'w') as f:
+        f.write('Date,Open,High,Low,Close,Volume,Adj Close\n')
+        for d in dates:
+            f.write(d + ',1,2,0.5,1.5,100,1.5\n')
+
+class TestManifest(TestCase):
+    def test_lookup_and_record(self):
+        folder = tempfile.mkdtemp()
+        write_csv(folder, 'UCO-daily-2016-08-03.csv', ['2016-08-03', '2016-08-02'])
+        write_csv(folder, 'UCO-daily-2016-08-01.csv', ['2016-08-01', '2016-07-29'])
+        write_csv(folder, 'UCOX-daily-2016-08-03.csv', ['2016-08-03'])
+        m = Manifest(folder)
+        assert(m.files('UCO', 'daily') == ['UCO-daily-2016-08-03.csv', 'UCO-daily-2016-08-01.csv'])
+        assert(m.coverage('UCO', 'daily') == ('2016-07-29', '2016-08-03'))
+        assert(m.coverage('UCO', 'weekly') is None)
+
+        write_csv(folder, 'UCO-daily-2016-08-05.csv', ['2016-08-05', '2016-08-04'])
+        m.record('UCO', 'daily', 'UCO-daily-2016-08-05.csv', '2016-08-04', '2016-08-05')
+        m.save()
+
+        reloaded = Manifest(folder)
+        assert(reloaded.coverage('UCO', 'daily') == ('2016-07-29', '2016-08-05'))
+        assert(reloaded.files('UCOX', 'daily') == ['UCOX-daily-2016-08-03.csv'])
@@ -0,0 +1,57 @@
+from unittest import TestCase
+import math
+import numpy
+
+from ptools import MarketPanel, ArrayMetrics
+from ptools.barStore import ordinal_to_date
+
+def make_rows(closes, last = 736330):
+    # closes[0] is the most recent
+    return [{'Date': ordinal_to_date(last - i), 'Open': c, 'High': c + 1, 'Low': c - 1,
+             'Close': c, 'Volume': 1000 + i} for i, c in enumerate(closes)]
+
+class TestMarketPanel(TestCase):
+    def test_batched_indicators_match_per_symbol(self):
+        long = [50 + 5 * math.sin(i / 3.0) for i in range(80)]
+        short = [20 + math.cos(i / 2.0) for i in range(50)]
+        panel = MarketPanel.from_datasets({'AAA': make_rows(long), 'BBB': make_rows(short)})
+        assert(panel.field('Close').shape == (2, 80))
+        assert(numpy.isnan(panel.row('BBB')[50:]).all())
+
+        am = ArrayMetrics()
+        for sym, closes in [('AAA', long), ('BBB', short)]:
+            i = panel.index[sym]
+            expected = am.ema(closes, 10)
+            assert(numpy.allclose(panel.ema(10)[i][:len(expected)], expected, rtol=1e-12))
+            assert(numpy.isnan(panel.ema(10)[i][len(expected):]).all())
+            expected = am.macd_all(closes)['histo']
+            assert(numpy.allclose(panel.macd_all()['histo'][i][:len(expected)], expected, rtol=1e-9))
+            expected = am.rsi(closes)
+            assert(numpy.allclose(panel.rsi()[i][:len(expected)], expected, rtol=1e-9))
+            expected = am.sma(closes, 20)
+            assert(numpy.allclose(panel.sma(20)[i][:len(expected)], expected, rtol=1e-12))
+            volumes = [1000 + j for j in range(len(closes))]
+            expected = am.forceIndex(closes, volumes)
+            assert(numpy.allclose(panel.forceIndex()[i][:len(expected)], expected, rtol=1e-9))
+
+    def test_missing_bar_inside_a_row(self):
+        closes = [50 + 5 * math.sin(i / 3.0) for i in range(80)]
+        rows = make_rows(closes)
+        # BBB has no bar 40 bars back, AAA has every bar
+        panel = MarketPanel.from_datasets({'AAA': rows, 'BBB': rows[:40] + rows[41:]})
+        assert(numpy.isnan(panel.row('BBB')[40]))
+
+        # BBB's indicators are those of its own bars, NaN only on the date it has no bar
+        am = ArrayMetrics()
+        own = closes[:40] + closes[41:]
+        volumes = [1000 + j for j in range(80)]
+        ownVolumes = volumes[:40] + volumes[41:]
+        i = panel.index['BBB']
+        for values, expected in [(panel.ema(12)[i], am.ema(own, 12)),
+                                 (panel.sma(20)[i], am.sma(own, 20)),
+                                 (panel.macd_all()['histo'][i], am.macd_all(own)['histo']),
+                                 (panel.rsi()[i], am.rsi(own)),
+                                 (panel.forceIndex()[i], am.forceIndex(own, ownVolumes))]:
+            assert(numpy.isnan(values[40]))
+            values = numpy.concatenate([values[:40], values[41:]])
+            assert(numpy.allclose(values[:len(expected)], expected, rtol=1e-9))
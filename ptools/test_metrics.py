@@ -1,6 +1,8 @@
 from unittest import TestCase
 
-from ptools.metrics import Metrics
+from ptools.metrics import Metrics, StreamingIndicators
+from ptools.arrayMetrics import ArrayMetrics
+import numpy, tempfile, os
 from usdata import USMarket
 
 class TestMetrics(TestCase):
@@ -29,6 +31,46 @@ class TestMetrics(TestCase):
         assert(result[1] > 66.240 and result[1] < 66.250)
         assert(result[2] > 70.460 and result[2] < 70.470)
 
+    def test_array_ema_long_series(self):
+        # long enough to span several closed-form blocks
+        datapoints = [50 + 10 * numpy.sin(i / 7.0) for i in range(1000)]
+        result = ArrayMetrics().ema(datapoints, 3)
+        assert(isinstance(result, numpy.ndarray))
+        assert(len(result) == len(datapoints) - 2)
+        prev = sum(datapoints[-3:]) / 3
+        expected = [prev]
+        for x in reversed(datapoints[:-3]):
+            prev = (x - prev) * 0.5 + prev
+            expected.insert(0, prev)
+        assert(numpy.allclose(result, expected, rtol=1e-12, atol=0))
+
+    def test_streaming_indicators(self):
+        closes = [30 + 3 * numpy.sin(i / 5.0) + i * 0.01 for i in range(120)]
+        bars = [{'Date': str(1000 + i), 'Close': c, 'Volume': 1000 + i} for i, c in enumerate(closes)]
+        streaming = StreamingIndicators()
+        for bar in bars[:100]:
+            streaming.update(bar)
+        path = os.path.join(tempfile.mkdtemp(), 'state.json')
+        streaming.save(path)
+        streaming = StreamingIndicators.load(path)
+        # the SMA keeps its window and the window's running sum
+        sma = streaming.indicators['sma26']
+        assert(len(sma.window) == 26 and abs(sma.sum - sum(closes[74:100])) < 1e-9)
+        for bar in bars[100:-1]:
+            streaming.update(bar)
+        values = streaming.peek(bars[-1])
+        assert(streaming.last_date == bars[-2]['Date'])
+
+        # batch metrics take the most recent value first
+        closePrices = list(reversed(closes))
+        volumes = list(reversed([b['Volume'] for b in bars]))
+        m = Metrics()
+        assert(abs(values['macd']['histo'] - m.macd_all(closePrices)['histo'][0]) < 1e-9)
+        assert(abs(values['rsi'] - m.rsi(closePrices)[0]) < 1e-9)
+        assert(abs(values['forceIndex'] - m.forceIndex(closePrices, volumes)[0]) < 1e-6)
+        assert(abs(values['ema10'] - m.ema(closePrices, 10)[0]) < 1e-9)
+        assert(abs(values['sma26'] - m.sma(closePrices, 26)[0]) < 1e-9)
+
     def test_support_and_resistance(self):
         sym = 'UCO'
         data, missing = USMarket([sym], '2016-08-11').getData()
@@ -0,0 +1,83 @@
+from unittest import TestCase
+import sys, threading, types
+from ptools.quotes import QuoteCache, LocalQuoteSource, YahooGoogleQuoteSource
+
+def quote(price):
+    return {'Open': price, 'High': price + 1, 'Low': price - 1, 'Close': price, 'Volume': 1000.0}
+
+class FailingSource:
+    def __init__(self):
+        self.requests = 0
+
+    def get_quotes(self, symbols):
+        self.requests += 1
+        raise IOError('offline')
+
+class CsvFetcher:
+    def __init__(self, body):
+        self.body = body
+
+    def read(self, url):
+        return self.body.encode('latin-1')
+
+class TestQuotes(TestCase):
+    def test_batches(self):
+        source = LocalQuoteSource({'S%d' % i: quote(i) for i in range(250)})
+        cache = QuoteCache(source, batch_size=100)
+        symbols = ['S%d' % i for i in range(250)] + ['UNKNOWN']
+        quotes = cache.get(symbols)
+        assert source.requests == 3
+        assert len(quotes) == 250 and quotes['S7']['Close'] == 7
+        # every quote is fresh, per-symbol lookups are served from the cache
+        for sym in symbols:
+            cache.get([sym])
+        assert source.requests == 3 # UNKNOWN has no quote, it isn't asked again either
+
+    def test_ttl(self):
+        source = LocalQuoteSource({'A': quote(1)})
+        cache = QuoteCache(source, ttl=0)
+        cache.get(['A'])
+        source.quotes['A'] = quote(2)
+        assert cache.get(['A'])['A']['Close'] == 2
+        assert source.requests == 2
+
+    def test_failing_source(self):
+        source = FailingSource()
+        cache = QuoteCache(source)
+        assert cache.get(['A', 'B']) == {}
+        assert cache.get(['A']) == {} and cache.get(['B']) == {}
+        assert source.requests == 1
+
+    def test_fetch_outside_lock(self):
+        cache = QuoteCache(LocalQuoteSource({'A': quote(1)}))
+        cache.get(['A'])
+        served = []
+        class SlowSource:
+            def get_quotes(self, symbols):
+                # a lookup from another thread is answered while this request is running
+                t = threading.Thread(target=lambda: served.append(cache.get(['A'])))
+                t.start()
+                t.join(5)
+                return {'B': quote(2)}
+        cache.source = SlowSource()
+        assert cache.get(['B'])['B']['Close'] == 2
+        assert served == [{'A': quote(1)}]
+
+    def test_google_prices(self):
+        source = YahooGoogleQuoteSource(CsvFetcher('AAA,1,2,0.5,1.5,100\nBRK-B,1,2,0.5,1.5,100\nCCC,1,2,0.5,1.5,100\n'))
+        # google names BRK-B differently and can't price AAA, CCC still gets its price
+        google = types.ModuleType('googlefinance')
+        google.getQuotes = lambda symbols: [{'StockSymbol': 'AAA', 'LastTradePrice': 'N/A'},
+                                            {'StockSymbol': 'BRK.B', 'LastTradePrice': '9.0'},
+                                            {'StockSymbol': 'CCC', 'LastTradePrice': '1,234.5'}]
+        saved = sys.modules.get('googlefinance')
+        sys.modules['googlefinance'] = google
+        try:
+            quotes = source.get_quotes(['AAA', 'BRK-B', 'CCC'])
+        finally:
+            if saved is None:
+                del sys.modules['googlefinance']
+            else:
+                sys.modules['googlefinance'] = saved
+        assert sorted(quotes.keys()) == ['AAA', 'BRK-B', 'CCC']
+        assert [quotes[sym]['Close'] for sym in ['AAA', 'BRK-B', 'CCC']] == [1.5, 1.5, 1234.5]
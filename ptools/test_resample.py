@@ -0,0 +1,29 @@
+from unittest import TestCase
+
+from ptools.resample import resample_rows
+
+class TestResample(TestCase):
+    def setUp(self):
+        # 2016-06-27 is a Monday; 2016-07-04 was a holiday
+        self.daily = {}
+        for i, dt in enumerate(['2016-06-27', '2016-06-28', '2016-06-29', '2016-06-30', '2016-07-01',
+                                '2016-07-05', '2016-07-06']):
+            self.daily[dt] = {'Date': dt, 'Open': 10.0 + i, 'High': 12.0 + i, 'Low': 9.0 + i,
+                              'Close': 11.0 + i, 'Volume': str(100 * (i + 1))}
+
+    def test_weekly(self):
+        weekly = resample_rows(self.daily, 'weekly')
+        assert(sorted(weekly.keys()) == ['2016-06-27', '2016-07-04'])
+        week = weekly['2016-06-27']
+        assert(week['Open'] == 10.0 and week['Close'] == 15.0)
+        assert(week['High'] == 16.0 and week['Low'] == 9.0)
+        assert(week['Volume'] == 300.0)
+        # partial current week
+        week = weekly['2016-07-04']
+        assert(week['Open'] == 15.0 and week['Close'] == 17.0 and week['Volume'] == 650.0)
+
+    def test_monthly(self):
+        monthly = resample_rows(self.daily, 'monthly')
+        assert(sorted(monthly.keys()) == ['2016-06-01', '2016-07-01'])
+        assert(monthly['2016-06-01']['Close'] == 14.0)
+        assert(monthly['2016-07-01']['Open'] == 14.0 and monthly['2016-07-01']['High'] == 18.0)
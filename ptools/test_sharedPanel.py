@@ -0,0 +1,40 @@
+from unittest import TestCase
+import multiprocessing
+import numpy
+
+from ptools import MarketPanel, SharedPanel
+from ptools.sharedPanel import attach
+from ptools.test_marketPanel import make_rows
+
+def last_close(args):
+    handle, sym = args
+    panel = attach(handle)
+    return float(panel.row(sym)[0]), panel.field('Close').flags.writeable
+
+class TestSharedPanel(TestCase):
+    def test_attach(self):
+        panel = MarketPanel.from_datasets({'AAA': make_rows([3.0, 2.0, 1.0]), 'BBB': make_rows([5.0, 4.0])})
+        with SharedPanel(panel) as shared:
+            view = attach(shared.handle)
+            assert(view.symbols == ['AAA', 'BBB'])
+            assert((view.dates == panel.dates).all())
+            for f in MarketPanel.fields:
+                assert(numpy.array_equal(view.field(f), panel.field(f), equal_nan=True))
+            try:
+                view.field('Close')[0, 0] = 0
+                assert(False)
+            except ValueError:
+                pass
+            # frames of a symbol with a bar on every date are views into the block
+            assert(numpy.shares_memory(view.frame('AAA').column('Close'), view.field('Close')))
+            assert(list(view.frame('BBB').column('Close')) == [5.0, 4.0])
+            with multiprocessing.Pool(2) as pool:
+                assert(pool.map(last_close, [(shared.handle, 'AAA'), (shared.handle, 'BBB')]) ==
+                       [(3.0, False), (5.0, False)])
+            del view
+
+    def test_frame_with_gaps(self):
+        rows = make_rows([4.0, 3.0, 2.0, 1.0])
+        panel = MarketPanel.from_datasets({'AAA': rows, 'BBB': rows[:1] + rows[2:]})
+        assert(list(panel.frame('BBB').column('Close')) == [4.0, 2.0, 1.0])
+        assert(list(panel.frame('AAA').column('Volume')) == [1000, 1001, 1002, 1003])
@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+from ptools.tradingCalendar import TradingCalendar
+
+class TestTradingCalendar(TestCase):
+    cal = TradingCalendar(2015, 2026)
+
+    def test_holidays(self):
+        for d in ['2016-07-04', '2016-09-05', '2016-11-24', '2016-12-26', '2017-01-02',
+                  '2017-01-16', '2017-02-20', '2017-04-14', '2023-06-19', '2021-12-24']:
+            assert(not self.cal.is_session(d))
+        # New Year's Day 2022 is a Saturday, NYSE stays open on the Friday before
+        assert(self.cal.is_session('2021-12-31'))
+        assert(self.cal.is_session('2016-12-27'))
+
+    def test_lookups(self):
+        cal = self.cal
+        assert(cal.date_str(cal.latest_session('2016-12-26')) == '2016-12-23')
+        assert(cal.date_str(cal.latest_session('2017-01-02')) == '2016-12-30')
+        assert(cal.date_str(cal.session_back('2016-07-05', 1)) == '2016-07-01')
+        assert(cal.sessions_between('2016-12-19', '2016-12-30') == 9)
+        assert(cal.date_str(cal.week_of('2016-06-19')) == '2016-06-13')
+        assert(cal.month_of('2016-06-19') == 2016 * 12 + 5)
+        assert(list(cal.month_ids([cal.latest_session('2016-06-30')])) == [2016 * 12 + 5])
@@ -0,0 +1,139 @@
+"""
+NYSE trading calendar.
+Trading days (sessions) are precomputed as a sorted array of date ordinals
+(datetime.date.toordinal), so lookups are a binary search instead of stepping
+through days one at a time. Holidays are generated by rule, no list to maintain.
+Dates can be given as 'YYYY-MM-DD' strings, date/datetime objects or ordinals.
+"""
+
+import numpy
+from datetime import date, datetime, timedelta
+from .barStore import date_to_ordinal, ordinal_to_date
+from . import resample
+
+# full-day closures that do not follow any rule
+special_closures = ['1994-04-27', # President Nixon funeral
+                    '2001-09-11', '2001-09-12', '2001-09-13', '2001-09-14', # 9/11
+                    '2004-06-11', # President Reagan funeral
+                    '2007-01-02', # President Ford funeral
+                    '2012-10-29', '2012-10-30', # Hurricane Sandy
+                    '2018-12-05', # President George H.W. Bush funeral
+                    '2025-01-09'] # President Carter funeral
+
+def easter(year):
+    # anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+# n-th (1-based) given weekday of a month; n = -1 means the last one
+def nth_weekday(year, month, weekday, n):
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days = (weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days = 1)
+    return last - timedelta(days = (last.weekday() - weekday) % 7)
+
+# holidays on Saturday are observed on Friday, on Sunday are observed on Monday
+def observed(day):
+    if day.weekday() == 5:
+        return day - timedelta(days = 1)
+    if day.weekday() == 6:
+        return day + timedelta(days = 1)
+    return day
+
+def nyse_holidays(year):
+    ret = []
+    # a Saturday New Year's Day is not observed on the Friday before
+    newyear = date(year, 1, 1)
+    if newyear.weekday() != 5:
+        ret.append(observed(newyear))
+    if year >= 1998:
+        ret.append(nth_weekday(year, 1, 0, 3)) # Martin Luther King Jr. Day
+    ret.append(nth_weekday(year, 2, 0, 3))     # Washington's Birthday
+    ret.append(easter(year) - timedelta(days = 2)) # Good Friday
+    ret.append(nth_weekday(year, 5, 0, -1))    # Memorial Day
+    if year >= 2022:
+        ret.append(observed(date(year, 6, 19))) # Juneteenth
+    ret.append(observed(date(year, 7, 4)))     # Independence Day
+    ret.append(nth_weekday(year, 9, 0, 1))     # Labor Day
+    ret.append(nth_weekday(year, 11, 3, 4))    # Thanksgiving
+    ret.append(observed(date(year, 12, 25)))   # Christmas
+    return ret
+
+def to_ordinal(d):
+    if isinstance(d, str):
+        return date_to_ordinal(d)
+    if isinstance(d, datetime):
+        return d.date().toordinal()
+    if isinstance(d, date):
+        return d.toordinal()
+    return int(d)
+
+class TradingCalendar:
+    def __init__(self, firstYear = 1990, lastYear = None):
+        if lastYear is None:
+            lastYear = date.today().year + 2
+        start = date(firstYear, 1, 1).toordinal()
+        end = date(lastYear, 12, 31).toordinal()
+        days = numpy.arange(start, end + 1, dtype=numpy.int32)
+        holidays = [d.toordinal() for y in range(firstYear, lastYear + 1) for d in nyse_holidays(y)]
+        holidays += [date_to_ordinal(d) for d in special_closures]
+        weekdays = (days - 1) % 7 # ordinal 1 (0001-01-01) is a Monday
+        self.sessions = days[(weekdays < 5) & ~numpy.isin(days, holidays)]
+        self.holidays = numpy.array(sorted(set(holidays)), dtype=numpy.int32)
+
+    def is_session(self, d):
+        o = to_ordinal(d)
+        i = numpy.searchsorted(self.sessions, o)
+        return i < len(self.sessions) and self.sessions[i] == o
+
+    # position of the most recent session on or before d
+    def session_index(self, d):
+        i = int(numpy.searchsorted(self.sessions, to_ordinal(d), side='right')) - 1
+        if i < 0:
+            raise ValueError('date before the first session of the calendar')
+        return i
+
+    # ordinal of the most recent session on or before d
+    def latest_session(self, d):
+        return int(self.sessions[self.session_index(d)])
+
+    # ordinal of the session n sessions before the latest session on or before d
+    def session_back(self, d, n):
+        return int(self.sessions[max(0, self.session_index(d) - n)])
+
+    # number of sessions within [a, b]
+    def sessions_between(self, a, b):
+        lo = numpy.searchsorted(self.sessions, to_ordinal(a), side='left')
+        hi = numpy.searchsorted(self.sessions, to_ordinal(b), side='right')
+        return int(max(0, hi - lo))
+
+    # week bucket of a date: ordinal of the Monday of its week
+    def week_of(self, d):
+        o = to_ordinal(d)
+        return o - (o - 1) % 7
+
+    # month bucket of a date: year * 12 + month - 1
+    def month_of(self, d):
+        day = date.fromordinal(to_ordinal(d))
+        return day.year * 12 + day.month - 1
+
+    # same buckets for an array of ordinals
+    def week_ids(self, ordinals):
+        return resample.week_ids(ordinals)
+
+    def month_ids(self, ordinals):
+        return resample.month_ids(ordinals)
+
+    def date_str(self, ordinal):
+        return ordinal_to_date(ordinal)
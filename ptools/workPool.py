@@ -1,37 +1,22 @@
-import threading
-
+from .executor import Executor
 
+# older interface, kept for scripts that still use it; see ptools.Executor
 class WorkPool:
     def __init__(self, concurrency):
         self.total_concurrency = concurrency
-        self.works = []
-        self.rlock = threading.RLock()
+        self.executor = Executor(concurrency)
 
     def start_work(self, func, sym):
-
-        if len(self.works) >= self.total_concurrency:
-            w = self.works[0]
-            w.join()
-            self.works = self.works[1:]
-        w = threading.Thread(target=func, args=(sym, ))
-        self.works.append(w)
-        w.start()
+        return self.executor.submit(func, sym)
 
     def start_work_arg2(self, func, arg1, arg2):
-        if len(self.works) >= self.total_concurrency:
-            w = self.works[0]
-            w.join()
-            self.works = self.works[1:]
-        w = threading.Thread(target=func, args=(arg1, arg2, ))
-        self.works.append(w)
-        w.start()
+        return self.executor.submit(func, arg1, arg2)
 
     def wait_for_all(self):
-        for w in self.works:
-            w.join()
+        self.executor.wait_for_all()
 
     def lock(self):
-        self.rlock.acquire()
+        self.executor.lock()
 
     def unlock(self):
-        self.rlock.release()
+        self.executor.unlock()
@@ -1,8 +1,58 @@
 from unittest import TestCase
+import os, tempfile, threading, time
+import numpy
+import usdata
 from usdata import USMarket
+from ptools import BarSeries
+from ptools.barStore import BarStore, date_to_ordinal
+from ptools.metrics import Metrics, StreamingIndicators
+from fixtures import sessions_between, write_history
+
+class GapProvider:
+    # serves the bars of 'sessions' from 'newest' on; anything older comes back empty
+    def __init__(self, sessions, newest):
+        self.sessions = sessions
+        self.newest = newest
+
+    def download_history(self, sym, start, end, frequency, path):
+        with open(path, 'w') as f:
+            f.write('Date,Open,High,Low,Close,Volume,Adj Close\n')
+            if start >= self.newest:
+                for d in reversed([d for d in self.sessions if start <= d <= end]):
+                    f.write('%s,1.0,2.0,0.5,1.5,1000,1.5\n' % d)
+
+    def get_quotes(self, symbols):
+        return {}
+
+class SlowProvider(GapProvider):
+    # serves every bar, slowly enough for requests to overlap; 'most' is the most requests at once
+    def __init__(self, sessions):
+        GapProvider.__init__(self, sessions, '0000-00-00')
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most = 0
+
+    def download_history(self, sym, start, end, frequency, path):
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        time.sleep(0.1)
+        GapProvider.download_history(self, sym, start, end, frequency, path)
+        with self.lock:
+            self.running -= 1
 
 class TestUSMarket(TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.folder = tempfile.TemporaryDirectory()
+        os.chdir(self.folder.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.folder.cleanup()
+
     def test_getData(self):
+        os.chdir(self.cwd)
         watchlist = ['AAPL']
         # usm = USMarket(watchlist, '2016-01-04')
         usm = USMarket(watchlist)
@@ -10,3 +60,135 @@ class TestUSMarket(TestCase):
         weekly, missing2 = usm.getData('weekly')
         print(str(daily))
         print(str(weekly))
+
+    def test_gap_failure(self):
+        sessions = sessions_between('2016-01-04', '2016-08-03')
+        # June is missing locally, and the newest bars after July 29
+        write_history('AAA', [d for d in sessions if d < '2016-06-01'], 0)
+        write_history('AAA', [d for d in sessions if '2016-07-01' <= d <= '2016-07-29'], 1)
+        provider = GapProvider(sessions, '2016-07-30')
+        data, missing = USMarket(['AAA'], '2016-08-03', provider=provider).getData('daily')
+        assert missing == [] and data['AAA'][0]['Date'] == '2016-08-03'
+        # the gap the provider can't fill waits for its backoff, the symbol doesn't
+        market = USMarket(['AAA'], '2016-08-03', provider=provider)
+        assert not market.failures.blocked('AAA', 'daily')
+        assert market.failures.blocked('AAA', 'daily', start='2016-06-01')
+        assert market.planner.plan(['AAA'], 'daily', '2016-08-05') == [('AAA', '2016-08-04', '2016-08-05')]
+
+    def test_columnar_datasets(self):
+        write_history('AAA', sessions_between('2016-01-04', '2016-08-03'), 0)
+        market = USMarket(['AAA'], '2016-08-03', derive_weekly=True, provider=GapProvider([], '9999-99-99'), depth=50)
+        data, missing = market.getAllData(('daily', 'weekly'))
+        # the market keeps BarSeries only, getAllData hands them out without converting them again
+        assert all(isinstance(market.datasets(f)['AAA'], BarSeries) for f in ['daily', 'weekly'])
+        assert numpy.shares_memory(data['daily']['AAA'].column('Close'), market.datasets_daily['AAA'].column('Close'))
+        again, _ = market.getData('daily')
+        assert numpy.shares_memory(again['AAA'].column('Close'), data['daily']['AAA'].column('Close'))
+        assert len(again['AAA']) == 50 and again['AAA'][0]['Date'] == '2016-08-03'
+
+    def test_depth(self):
+        sessions = sessions_between('2015-01-01', '2016-08-03')
+        write_history('AAA', sessions, 0)
+        write_history('AAA', sessions[:-20], 2) # an older file that overlaps
+        write_history('AAA', sessions, 0, 'weekly')
+        market = USMarket(['AAA'], '2016-08-03', provider=GapProvider([], '9999-99-99'), depth=50)
+        data, missing = market.getData('daily')
+        assert missing == [] and len(data['AAA']) == 50 and data['AAA'][0]['Date'] == '2016-08-03'
+        # a consumer that looks further back loads more of the same files
+        longer, _ = market.getData('daily', 120)
+        assert len(longer['AAA']) == 120 and longer['AAA'][49]['Date'] == data['AAA'][49]['Date']
+        # the newest rows come from the newest file, older files are read only as far as needed
+        rows = usdata.load_csv_from_files('AAA-daily-', None, market.manifest, 3)
+        assert sorted(rows.keys()) == ['2016-08-01', '2016-08-02', '2016-08-03']
+        rows = usdata.load_csv_from_files('AAA-daily-', None, None, 400)
+        assert len(rows) == 400 and rows['2016-08-03']['Close'] == longer['AAA'][0]['Close']
+
+    def test_weekly_depth(self):
+        sessions = sessions_between('2015-01-01', '2016-08-03')
+        write_history('AAA', sessions, 0)
+        write_history('AAA', sessions, 0, 'weekly')
+        # the weeks up to a past date, not the newest ones cut at that date
+        market = USMarket(['AAA'], '2016-06-15', derive_weekly=False, provider=GapProvider([], '9999-99-99'), depth=20)
+        weekly, missing = market.getData('weekly')
+        assert missing == [] and len(weekly['AAA']) == 20
+        assert [weekly['AAA'][i]['Date'] for i in [0, 1, 19]] == ['2016-06-13', '2016-06-06', '2016-02-01']
+        # the week of the date holds its days so far
+        daily, _ = market.getData('daily')
+        assert weekly['AAA'][0]['Close'] == daily['AAA'][0]['Close'] and weekly['AAA'][0]['Open'] == daily['AAA'][2]['Open']
+        longer, _ = market.getData('weekly', 40)
+        assert len(longer['AAA']) == 40 and longer['AAA'][1]['Date'] == '2016-06-06'
+
+    def test_derived_weekly(self):
+        sessions = sessions_between('2015-01-01', '2016-08-03')
+        write_history('AAA', sessions, 0)
+        write_history('AAA', sessions, 0, 'weekly')
+        downloaded, _ = USMarket(['AAA'], '2016-06-15', derive_weekly=False,
+                                 provider=GapProvider([], '9999-99-99'), depth=20).getData('weekly')
+        # weekly bars are built from daily bars by default, reading only the weeks of the depth
+        market = USMarket(['AAA'], '2016-06-15', provider=GapProvider([], '9999-99-99'), depth=20)
+        limits = []
+        read_history = market.read_history
+        market.read_history = lambda sym, frequency, ending, limit: \
+            limits.append(limit) or read_history(sym, frequency, ending, limit)
+        weekly, missing = market.getData('weekly')
+        assert missing == [] and limits == [len(sessions_between('2016-02-01', '2016-06-15'))]
+        assert weekly['AAA'].to_rows() == downloaded['AAA'].to_rows()
+        longer, _ = market.getData('weekly', 40)
+        assert len(longer['AAA']) == 40 and longer['AAA'].to_rows()[:20] == weekly['AAA'].to_rows()
+
+    def test_latest_indicators(self):
+        sessions = sessions_between('2025-01-01', usdata.get_latest_trading_date())
+        write_history('AAA', sessions[-200:], 0)
+        def metrics(bars):
+            closes = bars.column('Close').tolist()
+            return {'rsi': Metrics().rsi(closes)[0], 'ema10': Metrics().ema(closes, 10)[0]}
+        def close_to(values, expected):
+            return all(abs(values[k] - expected[k]) < 1e-9 for k in expected.keys())
+        # the live data's indicators follow its load, their state is saved next to the bars
+        market = USMarket(['AAA'], provider=GapProvider([], '9999-99-99'), depth=100)
+        bars = market.getData('daily')[0]['AAA']
+        assert close_to(market.getIndicators()['AAA'], metrics(bars))
+        assert StreamingIndicators.load(market.indicator_path('AAA')).last_date == bars[0]['Date']
+        # a state that continues the loaded bars is reloaded: one bar is applied to the 150 behind it
+        longer = USMarket(['AAA'], provider=GapProvider([], '9999-99-99'), depth=151).getData('daily')[0]['AAA']
+        state = StreamingIndicators()
+        for i in range(150, 0, -1):
+            state.update(longer[i])
+        state.save(market.indicator_path('AAA'))
+        market.indicators = {}
+        assert close_to(market.latest_indicators('AAA'), metrics(longer))
+        # one older than the loaded bars is rebuilt from them
+        state = StreamingIndicators()
+        state.update(longer[150])
+        state.save(market.indicator_path('AAA'))
+        market.indicators = {}
+        assert close_to(market.latest_indicators('AAA'), metrics(bars))
+        # the bar of the ongoing session is peeked at, the state stays at the closed bars
+        current = dict(bars[0], Close=bars[0]['Close'] + 5, Current=True)
+        market.datasets_daily['AAA'] = bars.merge(BarSeries.from_rows([current]))
+        market.indicators = {}
+        assert close_to(market.latest_indicators('AAA'), metrics(market.datasets_daily['AAA']))
+        assert StreamingIndicators.load(market.indicator_path('AAA')).last_date == bars[1]['Date']
+
+    def test_backfill_ranges_of_a_symbol(self):
+        sessions = sessions_between('2016-01-04', '2016-08-03')
+        write_history('AAA', [d for d in sessions if d < '2016-06-01'], 0)
+        write_history('AAA', [d for d in sessions if '2016-07-01' <= d <= '2016-07-29'], 1)
+        store = BarStore(usdata.foldername)
+        store.merge('AAA', 'daily', usdata.load_csv_from_files('AAA-daily-').values())
+        # June and the newest bars are two ranges, they merge into the same .npy file
+        provider = SlowProvider(sessions)
+        market = USMarket(['AAA'], '2016-08-03', storage='npy', provider=provider)
+        assert len(market.backfill('daily')) == 2
+        assert provider.most == 1
+        assert store.load('AAA', 'daily')['Date'].tolist() == [date_to_ordinal(d) for d in sessions]
+
+    def test_binary_store(self):
+        write_history('AAA', sessions_between('2015-01-01', '2016-08-03'), 0)
+        BarStore(usdata.foldername).merge('AAA', 'daily', usdata.load_csv_from_files('AAA-daily-').values())
+        csv = USMarket(['AAA'], '2016-08-03', provider=GapProvider([], '9999-99-99'), depth=60)
+        npy = USMarket(['AAA'], '2016-08-03', storage='npy', provider=GapProvider([], '9999-99-99'), depth=60)
+        # the store's columns are read as they are, with no row dicts, the bars are those of the csv files
+        npy.store.load_dict = None
+        for frequency in ['daily', 'weekly']:
+            assert npy.getData(frequency)[0]['AAA'].to_rows() == csv.getData(frequency)[0]['AAA'].to_rows()
@@ -1,6 +1,13 @@
 from unittest import TestCase
-from backtest import backtester
+import io, math
+from backtest import backtester, batch_evaluate, evaluate, grid_dates, stream
+from ptools import BarSeries
+from ptools.barStore import ordinal_to_date
 
+def make_rows(closes, last = 736330):
+    # closes[0] is the most recent
+    return [{'Date': ordinal_to_date(last - i), 'Open': c, 'High': c + 1, 'Low': c - 1,
+             'Close': c, 'Volume': 1000 + i} for i, c in enumerate(closes)]
 
 class TestBacktest(TestCase):
     def test_backtest(self):
@@ -8,3 +15,27 @@ class TestBacktest(TestCase):
         buyDate = '2017-01-01'
         sellUntil = '2017-01-14'
         backtester(symbols, buyDate, sellUntil)
+
+    def test_batch(self):
+        rows = make_rows([5.0, 7.0, 3.0, 4.0, 2.0, 6.0])
+        prices = {'AAA': BarSeries.from_rows(rows), 'BBB': rows}
+        dates = [row['Date'] for row in rows]
+        pairs = [('AAA', dates[3]), ('AAA', dates[5]), ('BBB', dates[3]), ('AAA', dates[0]), ('CCC', dates[3])]
+        results = list(batch_evaluate(prices, pairs))
+        # grouped by symbol, in the order of the pairs
+        assert [r[:2] for r in results] == [pairs[0], pairs[1], pairs[3], pairs[2]]
+        # bought at 4, best 7 and worst 3 afterwards, same as one buy date at a time
+        assert results[0][2:] == (75.0, 4.0, 7.0, -25.0) and results[3] == ('BBB',) + results[0][1:]
+        gainSorted, counts = evaluate(prices, ['AAA', 'BBB'], [], dates[3])
+        assert [r[1:] for r in gainSorted] == [results[0][2:]] * 2 and counts['win'] == 2
+        assert results[1][2:] == ((7.0 - 6.0) / 6.0 * 100, 6.0, 7.0, (2.0 - 6.0) / 6.0 * 100)
+        # nothing to sell at after the most recent bar
+        assert math.isnan(results[2][2])
+        # holding for 2 bars only sees the next 2 closes
+        held = list(batch_evaluate(prices, [('AAA', dates[5])], hold=2))
+        assert held[0][2:] == ((4.0 - 6.0) / 6.0 * 100, 6.0, 4.0, (2.0 - 6.0) / 6.0 * 100)
+        out = io.StringIO()
+        counts = stream(results, 'csv', out)
+        assert out.getvalue().splitlines()[1] == 'AAA,%s,75.00,4.00,7.00,-25.00' % dates[3]
+        assert counts['all'] == {'win': 3, 'loss': 0, 'worstCaseWin': 0, 'worstCaseLoss': 3}
+        assert grid_dates('2016-07-01', '2016-07-15', 5) == ['2016-07-01', '2016-07-11']
@@ -0,0 +1,27 @@
+from unittest import TestCase
+import numpy
+import pstock
+from ptools import BarSeries
+from ptools.barStore import date_to_ordinal
+from ptools.resample import resample
+from ptools.tradingCalendar import TradingCalendar
+
+class TestPstock(TestCase):
+    def test_bars_on_a_day(self):
+        cal = TradingCalendar(2016, 2016)
+        dates = cal.sessions[(cal.sessions >= date_to_ordinal('2016-05-02')) &
+                             (cal.sessions <= date_to_ordinal('2016-07-29'))][::-1]
+        closes = numpy.arange(len(dates), 0, -1, dtype=float)
+        daily = BarSeries(dates, {'Open': closes, 'High': closes + 1, 'Low': closes - 1, 'Close': closes,
+                                  'Volume': numpy.full(len(dates), 1000.0)})
+        weekly = resample(dict(daily.columns, Date=daily.dates), 'weekly')
+        weekly = BarSeries(weekly['Date'], {f: weekly[f] for f in daily.columns.keys()})
+        day = date_to_ordinal('2016-07-13') # a Wednesday
+        bars = pstock.daily_on(daily, day, 20)
+        assert len(bars) == 20 and bars[0]['Date'] == '2016-07-13'
+        assert numpy.shares_memory(bars.column('Close'), daily.column('Close'))
+        # the week of the day holds only Monday to Wednesday, earlier weeks are complete
+        week = pstock.weekly_on(weekly, daily, day, 5)
+        assert len(week) == 5 and week[0]['Date'] == '2016-07-11'
+        assert week[0]['Close'] == bars[0]['Close'] and week[0]['Open'] == bars[2]['Open']
+        assert week.to_rows()[1:] == weekly.until('2016-07-04').to_rows()[:4]
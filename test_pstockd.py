@@ -0,0 +1,75 @@
+from unittest import TestCase
+import os, tempfile, threading
+import pstockd
+from usdata import USMarket
+from ptools.providers import ReplayProvider
+from fixtures import sessions_between, write_history
+
+class TestPstockd(TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.folder = tempfile.TemporaryDirectory()
+        os.chdir(self.folder.name)
+        sessions = sessions_between('2015-01-01', '2016-08-03')
+        for i, sym in enumerate(['AAA', 'BBB']):
+            write_history(sym, sessions, i)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.folder.cleanup()
+
+    def test_requests(self):
+        market = USMarket(['AAA', 'BBB'], '2016-08-03', derive_weekly=True,
+                          provider=ReplayProvider(self.folder.name))
+        daemon = pstockd.Daemon(market, refresh_minutes=0)
+        path = os.path.join(self.folder.name, 'pstockd.sock')
+        server = pstockd.Server(path, daemon)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            status = pstockd.request({'cmd': 'status'}, path)
+            assert status['symbols'] == 2 and status['missing'] == []
+            data = pstockd.request({'cmd': 'data', 'symbols': ['AAA'], 'frequency': 'weekly'}, path)
+            assert data['AAA'][0]['Date'] == '2016-08-01'
+            first = pstockd.request({'cmd': 'scan', 'frequency': 'daily'}, path)
+            assert [r['name'] for r in first['results']] == \
+                [r['name'] for r in daemon.patterns['daily'].run_threads()]
+            # the second scan reuses the resident data and indicators
+            assert pstockd.request({'cmd': 'scan', 'frequency': 'daily'}, path) == first
+            result = pstockd.request({'cmd': 'backtest', 'symbols': ['AAA', 'ZZZ'],
+                                      'buy': '2016-06-01', 'sell': '2016-06-30'}, path)
+            assert result['missing'] == ['ZZZ'] and result['results'][0][0] == 'AAA'
+            # data of a past date doesn't change, refresh keeps it
+            assert pstockd.request({'cmd': 'refresh'}, path)['symbols'] == 2
+            try:
+                pstockd.request({'cmd': 'nothing'}, path)
+                assert False
+            except Exception as e:
+                assert 'unknown command' in str(e)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_refresh_outside_lock(self):
+        market = USMarket(['AAA', 'BBB'], '2016-08-03', derive_weekly=True,
+                          provider=ReplayProvider(self.folder.name))
+        daemon = pstockd.Daemon(market, refresh_minutes=0)
+        started, release = threading.Event(), threading.Event()
+        def slow_refresh():
+            started.set()
+            release.wait(5)
+        market.refresh = slow_refresh
+        refresh = threading.Thread(target=daemon.refresh)
+        refresh.start()
+        try:
+            started.wait(5)
+            # requests are answered from the data loaded before while the refresh downloads
+            answered = []
+            request = threading.Thread(target=lambda: answered.append(daemon.data(['AAA'])))
+            request.start()
+            request.join(2)
+            assert len(answered) == 1 and answered[0]['AAA'][0]['Date'] == '2016-08-03'
+            loaded_at = daemon.loaded_at
+        finally:
+            release.set()
+            refresh.join(5)
+        assert daemon.loaded_at > loaded_at
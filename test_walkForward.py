@@ -0,0 +1,57 @@
+from unittest import TestCase
+import math
+from ptools import MarketPanel
+from ptools.tradingCalendar import TradingCalendar
+from pstrategy import ChartPatterns
+from pstrategy.chartPatterns import rule_tests
+from pstrategy.walkForward import WalkForward
+from pstrategy.sweep import Sweep
+from fixtures import make_series
+
+class TestWalkForward(TestCase):
+    def setUp(self):
+        cal = TradingCalendar(2014, 2016)
+        dates = cal.sessions[cal.sessions <= cal.latest_session('2016-08-03')][-500:][::-1]
+        self.datasets = {sym: make_series(dates, i) for i, sym in enumerate(['AAA', 'BBB', 'CCC'])}
+
+    def test_replay(self):
+        wf = WalkForward(['AAA', 'BBB', 'CCC', 'ZZZ'], self.datasets, list(rule_tests.keys()))
+        rows = wf.run('2016-01-04', '2016-06-30')
+        assert len(rows) > 0 and wf.columns()[4:] == ['%Return1', '%Return5', '%Return10', '%Return20']
+        for rule, sym, date, close, r1, r5, r10, r20 in rows:
+            assert '2016-01-04' <= date <= '2016-06-30'
+            series = self.datasets[sym]
+            i = len(series) - len(series.until(date))
+            assert close == series[i]['Close'] and math.isclose(r5, (series[i - 5]['Close'] / close - 1) * 100)
+            # same answer as a scan of the bars visible on that date
+            window = {sym: series[i:i + wf.depth]}
+            assert sym in getattr(ChartPatterns([sym], window), rule)([sym])['result']
+        assert sum(line[1] for line in wf.summary(rows)) == len(rows)
+        # triggers too recent for a horizon have no return for it
+        recent = wf.run('2016-08-01')
+        assert all(math.isnan(row[7]) for row in recent)
+        # worker processes read the same data from shared memory
+        assert wf.run('2016-01-04', '2016-06-30', processes=2) == rows
+        panel = MarketPanel.from_datasets(self.datasets)
+        assert WalkForward(panel.symbols, panel, list(rule_tests.keys())).run('2016-01-04', '2016-06-30') == rows
+
+    def test_sweep(self):
+        grid = {'type1_lower': [0.9, 0.95], 'macd_latest_cross': [10, 20]}
+        sweep = Sweep(['AAA', 'BBB', 'CCC'], self.datasets, grid)
+        assert sweep.rule_names == ['signal_Type1_buy_point', 'signal_MACD_bottom_reversal']
+        assert len(sweep.configs) == 4
+        rows = sweep.run('2016-01-04', '2016-06-30')
+        # every configuration triggers where a replay with its thresholds does
+        for k, params in enumerate(sweep.configs):
+            alone = WalkForward(sweep.symbols, self.datasets, sweep.rule_names, params=params)
+            assert [row[1:] for row in rows if row[0] == k] == alone.run('2016-01-04', '2016-06-30')
+        assert sweep.run('2016-01-04', '2016-06-30', processes=2) == rows
+        ranked = sweep.rank(rows, 5)
+        assert len(ranked) == 8 and ranked[0][1] == sweep.configs[ranked[0][0]]
+        ranks = [r[4] for r in ranked if r[4] is not None]
+        assert ranks == sorted(ranks, reverse=True)
+        try:
+            Sweep([], {}, {'nothing': [1]})
+            assert False
+        except ValueError:
+            pass
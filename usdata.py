@@ -15,19 +15,25 @@ weekly:
 http://real-chart.finance.yahoo.com/table.csv?s=TSLA&a=05&b=29&c=2015&d=05&e=15&f=2016&g=w&ignore=.csv
 """
 
-from yahoo_finance import Share
-from googlefinance import getQuotes as gQuotes
 from datetime import datetime, timedelta
 from tqdm import tqdm
-from ptools import WorkPool
-import csv, os, argparse, fnmatch, pytz, urllib
+from ptools import Executor, BarStore, BarSeries, Manifest, TradingCalendar, MarketPanel, SharedPanel
+from ptools.fetcher import Fetcher, FetchError
+from ptools.quotes import QuoteCache
+from ptools.providers import YahooProvider
+from ptools.backfill import BackfillPlanner, Failures
+from ptools.metrics import StreamingIndicators
+from ptools.barStore import date_to_ordinal
+from ptools.resample import resample_series
+import numpy
+import csv, os, argparse, fnmatch, pytz, threading
 
 foldername = 'datafiles-us'
 max_history_year=5 #if no history data exists, download the last 5 years of history
+default_depth = 400 # bars loaded per symbol and frequency when the consumer declares no lookback
 
-# update this field periodically
-holidays = ['2016-07-04', '2016-09-05', '2016-11-24', '2016-12-25', '2016-12-26',
-            '2017-01-01', '2017-01-16', '2017-02-20', '2017-04-14']
+# NYSE sessions, holidays are generated by rule
+tradingCalendar = TradingCalendar()
 
 def arg_parser():
     parser = argparse.ArgumentParser(description='pstock stock analysis tool in python')
@@ -70,110 +76,131 @@ def get_cur_time():
         cur_time = cur_time - timedelta(minutes = (minutes + 60))
     return cur_time
 
+# backwardDelta: number of sessions to go back from the most recent trading day
 def get_latest_trading_date(s = None, backwardDelta = 0):
     if s == None:
         cur_time = get_cur_time()
     else:
         cur_time = s
-    #find the most recent trading day if not today
-    while True:
-        wd = cur_time.weekday()
-        if wd == 5 or wd == 6: #Saturday or Sunday
-            cur_time = cur_time - timedelta(days = 1)
-            continue
-
-        ts = '-'.join([str(cur_time.year), strWithZero(cur_time.month), strWithZero(cur_time.day)])
-        if ts in holidays:
-            cur_time = cur_time - timedelta(days = 1)
-            continue
-
-        # now we found the closest trading day, but what we want is the next closest date,
-        # so go backward
-        if backwardDelta > 0:
-            cur_time = cur_time - timedelta(days = backwardDelta)
-            backwardDelta = 0
-        break
-    ret = '-'.join([str(cur_time.year), strWithZero(cur_time.month), strWithZero(cur_time.day)])
-    return ret
+    return tradingCalendar.date_str(tradingCalendar.session_back(cur_time, backwardDelta))
+
+# most recent session whose trading is over (4pm New York time); bars of later sessions can't be downloaded yet
+def get_latest_closed_date():
+    cur_time = datetime.now(pytz.timezone('US/Eastern'))
+    latest = get_latest_trading_date(cur_time)
+    if latest == cur_time.strftime('%Y-%m-%d') and cur_time.hour < 16:
+        return get_latest_trading_date(cur_time, 1)
+    return latest
 
 def get_monday_of_the_week(dateStr):
-    date = datetime.strptime(dateStr, '%Y-%m-%d')
-    wd = date.weekday()
-    date = date - timedelta(days = wd)
-    return '-'.join([str(date.year), strWithZero(date.month), strWithZero(date.day)])
+    return tradingCalendar.date_str(tradingCalendar.week_of(dateStr))
 
 def get_friday_of_the_week(dateStr):
-    date = datetime.strptime(get_monday_of_the_week(dateStr), '%Y-%m-%d')
-    date = date + timedelta(days = 4)
-    return '-'.join([str(date.year), strWithZero(date.month), strWithZero(date.day)])
-
-def construct_yahoo_link(sym, m1, d1, y1, m2, d2, y2, type):
-    #on yahoo, month starts at 00, instead of 01
-    m1_z = strWithZero(m1 - 1)
-    m2_z = strWithZero(m2 - 1)
-    def getChartType(type) :
-        return {
-            'daily' : 'd',
-            'weekly' : 'w',
-            'monthly' : 'm'
-        }[type]
-    tstr = getChartType(type)
-    ret = 'http://real-chart.finance.yahoo.com/table.csv?s=' + sym
-    ret = ret + '&a=' + m1_z
-    ret = ret + '&b=' + str(d1)
-    ret = ret + '&c=' + str(y1)
-    ret = ret + '&d=' + m2_z
-    ret = ret + '&e=' + str(d2)
-    ret = ret + '&f=' + str(y2)
-    ret = ret + '&g=' + tstr
-    ret = ret + '&ignore=.csv'
-    return ret
+    return tradingCalendar.date_str(tradingCalendar.week_of(dateStr) + 4)
 
-def load_csv_from_files(prefix, endingDate = None):
+# prefix is like 'GOOGL-daily-'
+# with a manifest the files are found with one lookup, otherwise the sub-folder is listed
+# limit: number of most recent rows returned, None returns all. Files are read newest first and
+# each one only from its top (most recent rows) until the rows are older than the ones kept
+def load_csv_from_files(prefix, endingDate = None, manifest = None, limit = None):
     ret = {}
     subFolderName = os.path.join(foldername, prefix[:1])
     touchFolder(subFolderName)
-    for fname in os.listdir(subFolderName):
-        if fnmatch.fnmatch(fname, prefix + '*'):
-            foundFile = True
-            localfpath = os.path.join(subFolderName, fname)
-            with open(localfpath) as csvfile:
-                reader = csv.DictReader(csvfile)
-                prev_dt = '9999-99-99'
-                count = 0
-                for datapoint in reader:
-                    dt = datapoint['Date']
-                    assert(dt < prev_dt)
-                    prev_dt = dt
-                    if endingDate is None or dt <= endingDate:
-                        ret[dt] = datapoint
-                        ret[dt]['Open'] = float(datapoint['Open'])
-                        ret[dt]['Close'] = float(datapoint['Close'])
-                        ret[dt]['Low'] = float(datapoint['Low'])
-                        ret[dt]['High'] = float(datapoint['High'])
-                        ret[dt]['Volume'] = float(datapoint['Volume'])
-                        count += 1
-                        if count == 400:
-                            break
-                csvfile.close()
+    if manifest is not None:
+        sym, frequency = prefix[:-1].rsplit('-', 1)
+        fpaths = manifest.paths(sym, frequency)
+    else:
+        # file names end with the date of their most recent row
+        fpaths = sorted([os.path.join(subFolderName, fname) for fname in os.listdir(subFolderName)
+                         if fnmatch.fnmatch(fname, prefix + '*')], reverse=True)
+    cutoff = None # oldest date kept once 'limit' rows are found
+    for localfpath in fpaths:
+        with open(localfpath) as csvfile:
+            reader = csv.DictReader(csvfile)
+            prev_dt = '9999-99-99'
+            count = 0
+            for datapoint in reader:
+                dt = datapoint['Date']
+                assert(dt < prev_dt)
+                prev_dt = dt
+                if cutoff is not None and dt < cutoff:
+                    break
+                if endingDate is None or dt <= endingDate:
+                    ret[dt] = datapoint
+                    ret[dt]['Open'] = float(datapoint['Open'])
+                    ret[dt]['Close'] = float(datapoint['Close'])
+                    ret[dt]['Low'] = float(datapoint['Low'])
+                    ret[dt]['High'] = float(datapoint['High'])
+                    ret[dt]['Volume'] = float(datapoint['Volume'])
+                    count += 1
+                    if count == limit:
+                        break
+            csvfile.close()
+        if limit is not None and len(ret) >= limit:
+            cutoff = sorted(ret.keys(), reverse=True)[limit - 1]
+    if limit is not None and len(ret) > limit:
+        ret = {dt: ret[dt] for dt in ret.keys() if dt >= cutoff}
     return ret
 
 class USMarket:
-    def __init__(self, watchlist, endDate = '9999-99-99'):
+    # storage: 'csv' reads the downloaded csv files,
+    #          'npy' reads the binary bar store (see ptools/csv_to_barstore.py to migrate)
+    # derive_weekly: build weekly bars from the daily history (default) instead of downloading them.
+    #                monthly bars are always derived from daily bars
+    # provider: where history and quotes come from (ptools.providers), YahooProvider by default;
+    #           RecordingProvider/ReplayProvider record and replay them for offline runs
+    # fetcher: ptools.fetcher.Fetcher of the default provider, shared connections across symbols
+    # quotes: ptools.quotes.QuoteCache for the bar of the ongoing session, may be shared by several USMarket
+    # depth: bars of daily and weekly history loaded per symbol, usually the lookback declared by the
+    #        rules that will run (e.g. ChartPatterns.required_depth()); extend() loads more later
+    def __init__(self, watchlist, endDate = '9999-99-99', storage = 'csv', derive_weekly = True,
+                 fetcher = None, quotes = None, provider = None, depth = None):
         self.watchlist = sorted(watchlist)
+        self.store = BarStore(foldername) if storage == 'npy' else None
+        self.derive_weekly = derive_weekly
+        self.manifest = Manifest(foldername)
         self.endDate = endDate
         self.adjusted_endDate = get_latest_trading_date(
             datetime.strptime(endDate, '%Y-%m-%d')
         ) if endDate != '9999-99-99' else '9999-99-99'
+        # {sym: BarSeries} per frequency, the bars are kept in columns only
         self.datasets_daily = {}
         self.datasets_weekly = {}
+        self.datasets_monthly = {}
+        if depth is None:
+            depth = default_depth
+        self.depth = {'daily': depth, 'weekly': depth}
+        self.truncated = set() # (sym, frequency) whose local history goes further back than what is loaded
+        self.daily_history = {} # sym -> BarSeries of the local daily history, kept while weekly/monthly bars are derived
+        self.keep_daily_history = False
+        self.daily_history_depth = None # bars of daily history kept, None keeps all of it
         self.missingRecentHistory = []
         self.missing_daily = []
         self.missing_weekly = []
+        self.missing_monthly = []
+        self.fetch_records = []
+        self.fetcher = fetcher if fetcher is not None else Fetcher()
+        self.provider = provider if provider is not None else YahooProvider(self.fetcher)
+        self.download_errors = {} # sym -> FetchError of its last failed download
+        self.quotes = quotes if quotes is not None else QuoteCache(self.provider)
+        self.failures = Failures(foldername)
+        self.planner = BackfillPlanner(self.manifest, tradingCalendar, self.failures, max_history_year)
+        self.backfilled = set() # (sym, frequency) already downloaded in this run
+        self.weekly_history_ends = {} # sym -> last downloaded week, later weeks come from daily data
+        self.indicators = {} # sym -> StreamingIndicators of the live data, see latest_indicators()
+        self.indicator_values = {} # sym -> their latest values
+        self.rlock = threading.RLock()
         self.daily_data_updated = False
 
+    # called from worker threads
+    def mark_missing(self, missingList, sym):
+        with self.rlock:
+            if sym not in missingList:
+                missingList.append(sym)
+
     def update_daily(self, sym):
-        if self.daily_data_updated:
+        # loaded already, by an earlier pass or by another frequency of this pass
+        if self.daily_data_updated or sym in self.datasets_daily:
             return
         try:
             self.load_daily_from_file(sym)
@@ -182,231 +209,447 @@ class USMarket:
             assert(prev_history_ends <= latest_trading_date)
             ending = min(self.adjusted_endDate, latest_trading_date)
             if prev_history_ends < ending:
-                self.download_most_recent_daily(sym, prev_history_ends, ending)
-                mostRecentHistory = max(self.datasets_daily[sym].keys())
+                closed = min(ending, get_latest_closed_date())
+                if prev_history_ends < closed and (sym, 'daily') not in self.backfilled \
+                   and not self.failures.blocked(sym, 'daily'):
+                    self.download_most_recent_daily(sym, prev_history_ends, closed)
+                mostRecentHistory = self.datasets_daily[sym][0]['Date']
                 if mostRecentHistory < get_latest_trading_date(None, 1):
-                    if sym not in self.missingRecentHistory:
-                        self.missingRecentHistory.append(sym)
+                    self.mark_missing(self.missingRecentHistory, sym)
                     raise Exception("missing history data for " + sym)
 
                 self.fetch_current_data(sym)
         except:
-            if sym not in self.missing_daily:
-                self.missing_daily.append(sym)
-
+            self.mark_missing(self.missing_daily, sym)
+            return
+        self.update_indicators(sym)
+
+    # BarSeries of the local history on or before endingDate, at most the 'limit' most recent bars.
+    # The binary store's columns are used as they are, reversed to put the most recent bar first
+    def read_history(self, sym, frequency, endingDate, limit):
+        if self.store is not None and self.store.exists(sym, frequency):
+            return BarSeries.from_bars(self.store.load(sym, frequency, endingDate, limit))
+        return BarSeries.from_dict(load_csv_from_files(sym + '-' + frequency + '-', endingDate, self.manifest, limit))
+
+    # called from worker threads, with the number of bars read for a limit of 'depth'
+    def mark_truncated(self, sym, frequency, count, depth):
+        if count >= depth:
+            with self.rlock:
+                self.truncated.add((sym, frequency))
+
+    # the most recent self.depth['daily'] bars. When weekly/monthly bars will be derived in the
+    # same pass, the history they need is read once and kept, the daily dataset is its most recent bars
     def load_daily_from_file(self, sym):
-        self.datasets_daily[sym] = load_csv_from_files(sym + '-daily-', self.adjusted_endDate)
-
-    # download .csv file for sym from yahoo finance
-    # starting on prev_history_ends + 1
-    # ending on latest_trading_date
-    def download_most_recent_daily(self, sym, prev_history_ends, latest_trading_date):
-        start = datetime.strptime(prev_history_ends, '%Y-%m-%d') + timedelta(days = 1)
-        end = datetime.strptime(latest_trading_date, '%Y-%m-%d')
-        link = construct_yahoo_link(sym, start.month, start.day, start.year, end.month, end.day, end.year, 'daily')
-        fname = sym+'-daily-'+latest_trading_date+'.csv'
+        depth = self.depth['daily']
+        bars = self.read_history(sym, 'daily', self.adjusted_endDate,
+                                 self.daily_history_depth if self.keep_daily_history else depth)
+        if self.keep_daily_history:
+            self.daily_history[sym] = bars
+            bars = bars[:depth]
+        self.mark_truncated(sym, 'daily', len(bars), depth)
+        self.datasets_daily[sym] = bars
+
+    # daily bars needed to derive 'frequency': the sessions of the weekly depth up to the end date
+    # (at least the daily depth), None for monthly bars, which are built from the whole history
+    def derived_depth(self, frequency):
+        if frequency == 'monthly':
+            return None
+        ending = min(self.adjusted_endDate, get_latest_trading_date())
+        monday = tradingCalendar.week_of(ending) - 7 * (self.depth['weekly'] - 1)
+        return max(self.depth['daily'], tradingCalendar.sessions_between(monday, ending))
+
+    # local daily history on or before endDate, its 'limit' most recent bars (None: all of them),
+    # plus the bars downloaded or fetched in this run
+    def load_daily_history(self, sym, limit = None):
+        history = self.daily_history.get(sym)
+        if history is None:
+            history = self.read_history(sym, 'daily', self.adjusted_endDate, limit)
+        elif limit is not None:
+            history = history[:limit]
+        return history.merge(self.datasets_daily[sym])
+
+    # weekly or monthly bars built from the daily history, the current period may be partial
+    def resample_daily(self, sym, frequency):
+        limit = self.derived_depth(frequency)
+        history = self.load_daily_history(sym, limit)
+        if limit is not None:
+            with self.rlock:
+                self.truncated.discard((sym, frequency))
+            self.mark_truncated(sym, frequency, len(history), limit)
+        return resample_series(history, frequency)
+
+    # download the bars of sym within [start, end] from the provider into a new csv file,
+    # returns them as a BarSeries. Failures that won't go away on retry are kept in self.failures,
+    # per gap when the range starts before the newest local bar, so an old gap the provider can't
+    # fill doesn't hold back the newest bars of the symbol
+    def download_range(self, sym, frequency, start, end):
+        coverage = self.manifest.coverage(sym, frequency)
+        gap = start if coverage is not None and start <= coverage[1] else None
+        # weekly files are named after the Monday of their last week
+        nameDate = get_monday_of_the_week(end) if frequency == 'weekly' else end
+        fname = sym+'-'+frequency+'-'+nameDate+'.csv'
         subFolderName = os.path.join(foldername, sym[:1])
         touchFolder(subFolderName)
         localfpath = os.path.join(subFolderName, fname)
+        with self.rlock:
+            self.backfilled.add((sym, frequency))
+        try:
+            self.provider.download_history(sym, start, end, frequency, localfpath)
+        except FetchError as e:
+            with self.rlock:
+                self.download_errors[sym] = e
+            if e.permanent():
+                self.failures.record(sym, frequency, e.reason, start = gap)
+            return BarSeries.from_rows([])
+        rows = {}
         try:
-            urllib.request.urlretrieve(link, localfpath)
-            maxdate = '0000-00-00'
             with open(localfpath) as csvfile:
-                reader = csv.DictReader(csvfile)
-                for datapoint in reader:
-                    dateStr = datapoint['Date']
-                    if dateStr > maxdate:
-                        maxdate = dateStr
-                    self.datasets_daily[sym][dateStr] = datapoint
-                    self.datasets_daily[sym][dateStr]['Open'] = float(datapoint['Open'])
-                    self.datasets_daily[sym][dateStr]['Close'] = float(datapoint['Close'])
-                    self.datasets_daily[sym][dateStr]['Low'] = float(datapoint['Low'])
-                    self.datasets_daily[sym][dateStr]['High'] = float(datapoint['High'])
-                    self.datasets_daily[sym][dateStr]['Volume'] = float(datapoint['Volume'])
-            if maxdate != '0000-00-00' and maxdate != latest_trading_date:
-                new_fname = sym+'-daily-'+maxdate+'.csv'
-                new_localfpath = os.path.join(subFolderName, new_fname)
-                os.rename(localfpath, new_localfpath)
-        except:
-            pass
+                for datapoint in csv.DictReader(csvfile):
+                    for field in ['Open', 'Close', 'Low', 'High', 'Volume']:
+                        datapoint[field] = float(datapoint[field])
+                    rows[datapoint['Date']] = datapoint
+        except (ValueError, KeyError, TypeError):
+            rows = {}
+        if len(rows) == 0:
+            os.remove(localfpath)
+            # a few recent sessions can be missing while the provider catches up, a long range can't
+            if tradingCalendar.sessions_between(start, end) > 5:
+                self.failures.record(sym, frequency, 'empty response', start = gap)
+            return BarSeries.from_rows([])
+        self.failures.clear(sym, frequency, gap)
+        if self.store is not None:
+            self.store.merge(sym, frequency, list(rows.values()))
+        mindate, maxdate = min(rows.keys()), max(rows.keys())
+        if maxdate != nameDate:
+            new_fname = sym+'-'+frequency+'-'+maxdate+'.csv'
+            os.rename(localfpath, os.path.join(subFolderName, new_fname))
+            fname = new_fname
+        self.manifest.record(sym, frequency, fname, mindate, maxdate)
+        return BarSeries.from_dict(rows)
+
+    # download .csv file for sym from the provider
+    # starting on prev_history_ends + 1
+    # ending on latest_trading_date
+    def download_most_recent_daily(self, sym, prev_history_ends, latest_trading_date):
+        start = datetime.strptime(prev_history_ends, '%Y-%m-%d') + timedelta(days = 1)
+        bars = self.download_range(sym, 'daily', start.strftime('%Y-%m-%d'), latest_trading_date)
+        self.datasets_daily[sym] = self.datasets_daily[sym].merge(bars)
+
+    # downloaded history of the whole watchlist is completed with the minimal set of requests
+    # (ptools.backfill), before the per-symbol pass loads it
+    # bars downloaded for a symbol that is loaded already are merged into its dataset
+    def backfill(self, frequency = 'daily'):
+        ending = min(self.adjusted_endDate, get_latest_closed_date())
+        if frequency == 'weekly':
+            # up to the Friday of the previous week, the current week comes from daily data
+            ending = tradingCalendar.date_str(tradingCalendar.week_of(ending) + 4 - 7)
+        plan = self.planner.plan(self.watchlist, frequency, ending)
+        dataset = self.datasets(frequency)
+        # one task per symbol downloads its ranges in sequence: they merge into the same files
+        ranges = {}
+        for sym, start, end in plan:
+            ranges.setdefault(sym, []).append((start, end))
+        def download(sym):
+            for start, end in ranges[sym]:
+                bars = self.download_range(sym, frequency, start, end)
+                with self.rlock:
+                    if sym in dataset:
+                        dataset[sym] = dataset[sym].merge(bars)
+                        if frequency == 'weekly' and len(bars) > 0 and sym in self.weekly_history_ends:
+                            self.weekly_history_ends[sym] = max(self.weekly_history_ends[sym], bars[0]['Date'])
+        with Executor(10) as executor:
+            for sym in ranges.keys():
+                executor.submit(download, sym)
+            executor.wait_for_all()
+        self.fetch_records += executor.records
+        self.manifest.save()
+        self.failures.save()
+        return plan
+
+    # quotes of the whole watchlist in a few batched requests, before the per-symbol pass reads them
+    def prefetch_quotes(self):
+        if get_latest_trading_date(get_cur_time()) <= self.endDate:
+            self.quotes.get(self.watchlist)
 
     def fetch_current_data(self, sym):
         ts = get_latest_trading_date(get_cur_time())
-        if ts in self.datasets_daily[sym].keys() or ts > self.endDate:
+        if ts > self.endDate:
             return
-        try:
-            sdata = Share(sym)
-            gquote = gQuotes(sym)
-        except:
+        bars = self.datasets_daily[sym]
+        # a bar of the ongoing session is refreshed, a downloaded one is final
+        if len(bars) > 0 and bars.dates[0] == date_to_ordinal(ts) and not bars.current:
+            return
+        quote = self.quotes.get([sym]).get(sym)
+        if quote is None:
             # live with the fact that data from the most recent day is missing
             return
-        self.datasets_daily[sym][ts] = t = {}
-        t['Date']  = '3000-01-01' #debugging purposes, so we know this is current. This won't be saved to file
-        t['High']  = float(sdata.get_days_high())
-        t['Low']   = float(sdata.get_days_low())
-        t['Open']  = float(sdata.get_open())
-        # t['Close'] = sdata.get_price()
-        t['Close'] = float(gquote[0]['LastTradePrice']) # use google data for latest 'Close', which is more accurate
-        t['Volume'] = float(sdata.get_volume())
-        for k in t.keys():
-            if t[k] == None:
-                raise Exception('missing most recent daily', sym)
+        t = dict(quote)
+        t['Date']  = ts
+        t['Current'] = True # bar of the ongoing session, this won't be saved to file
+        self.datasets_daily[sym] = bars.merge(BarSeries.from_rows([t]))
+
+    def indicator_path(self, sym):
+        return os.path.join(foldername, sym[:1], sym + '-indicators-daily.json')
+
+    # latest values of the streaming indicators (ptools.metrics.StreamingIndicators) of sym.
+    # Their state is saved next to the bar data, so only bars newer than the saved state are applied;
+    # the bar of the ongoing session is applied with peek() and never saved
+    def latest_indicators(self, sym):
+        bars = self.datasets_daily[sym]
+        closed = bars[1:] if bars.current else bars
+        if len(closed) == 0:
+            return None
+        first, last = closed[-1]['Date'], closed[0]['Date']
+        ind = self.indicators.get(sym)
+        if ind is None and os.path.exists(self.indicator_path(sym)):
+            try:
+                ind = StreamingIndicators.load(self.indicator_path(sym))
+            except (ValueError, KeyError):
+                ind = None
+        # saved state must continue the loaded history, not skip bars or come from after endDate
+        if ind is None or ind.last_date is None or ind.last_date < first or ind.last_date > last:
+            ind = StreamingIndicators()
+        if ind.last_date != last:
+            # bars newer than the state, oldest first
+            newer = len(closed) if ind.last_date is None else \
+                int(numpy.searchsorted(-closed.dates, -date_to_ordinal(ind.last_date), side='left'))
+            for i in range(newer - 1, -1, -1):
+                ind.update(closed[i])
+            if self.adjusted_endDate == '9999-99-99':
+                ind.save(self.indicator_path(sym))
+        self.indicators[sym] = ind
+        if bars.current:
+            return ind.peek(bars[0])
+        return ind.values()
+
+    # the live data's indicators follow each daily load and refresh, one bar at a time;
+    # a past endDate doesn't change, it isn't followed
+    def update_indicators(self, sym):
+        if self.endDate != '9999-99-99':
+            return
+        try:
+            self.indicator_values[sym] = self.latest_indicators(sym)
+        except:
+            self.indicator_values.pop(sym, None)
 
     def update_weekly(self, sym):
         self.update_daily(sym) #data of current week comes from weekly daily data
         if sym in self.missing_daily:
-            if sym not in self.missing_weekly:
-                self.missing_weekly.append(sym)
+            self.mark_missing(self.missing_weekly, sym)
             return
         try:
+            if self.derive_weekly:
+                self.datasets_weekly[sym] = self.resample_daily(sym, 'weekly')
+                return
             self.load_weekly_from_file(sym)
             prev_history_ends = get_friday_of_the_week(self.get_latest_history_date(sym, 'weekly'))
             #request weekly data as late as previous Friday to avoid partial weekly data for the current
             interested_ending_date = min(self.adjusted_endDate, get_latest_trading_date())
-            prev_friday_date = datetime.strptime(get_friday_of_the_week(interested_ending_date), '%Y-%m-%d') - \
-                                timedelta(days = 7)
-            prev_friday_str = '-'.join([str(prev_friday_date.year), strWithZero(prev_friday_date.month), \
-                                            strWithZero(prev_friday_date.day)])
-            ending = prev_friday_str
-            if prev_history_ends < ending:
+            ending = tradingCalendar.date_str(tradingCalendar.week_of(interested_ending_date) + 4 - 7)
+            if prev_history_ends < ending and (sym, 'weekly') not in self.backfilled \
+               and not self.failures.blocked(sym, 'weekly'):
                 self.download_most_recent_weekly(sym, prev_history_ends, ending)
 
             # remove the most recent week of data in case user points to a day in the middle of the week
             # calculate_most_recent_weekly will take of the most recent partial week
-            most_recent_week_start = max(self.datasets_weekly[sym].keys())
-            assert(most_recent_week_start in self.datasets_weekly[sym].keys());
-            del self.datasets_weekly[sym][most_recent_week_start]
+            assert(len(self.datasets_weekly[sym]) > 0)
+            self.datasets_weekly[sym] = self.datasets_weekly[sym][1:]
+            self.weekly_history_ends[sym] = self.datasets_weekly[sym][0]['Date']
 
             self.calculate_most_recent_weekly(sym)
         except:
-            if sym not in self.missing_weekly:
-                self.missing_weekly.append(sym)
+            self.mark_missing(self.missing_weekly, sym)
 
 
     def download_most_recent_weekly(self, sym, prev_history_ends, ending):
         #start is the 'next' Monday
-        start = datetime.strptime(get_monday_of_the_week(prev_history_ends), '%Y-%m-%d') + \
-                timedelta(days = 7)
+        start = tradingCalendar.date_str(tradingCalendar.week_of(prev_history_ends) + 7)
         #assert that ending is already the correct Friday
         assert(ending == get_friday_of_the_week(ending))
-        end = datetime.strptime(ending, '%Y-%m-%d')
-        link = construct_yahoo_link(sym, start.month, start.day, start.year, end.month, end.day, end.year, 'weekly')
-        endingMonday = get_monday_of_the_week(ending)
-        fname = sym+'-weekly-'+endingMonday+'.csv'
-        subFolderName = os.path.join(foldername, sym[:1])
-        touchFolder(subFolderName)
-        localfpath = os.path.join(subFolderName, fname)
-        try:
-            urllib.request.urlretrieve(link, localfpath)
-            maxdate = '0000-00-00'
-            with open(localfpath) as csvfile:
-                reader = csv.DictReader(csvfile)
-                for datapoint in reader:
-                    dateStr = datapoint['Date']
-                    if dateStr > maxdate:
-                        maxdate = dateStr
-                    self.datasets_weekly[sym][dateStr] = datapoint
-                    self.datasets_weekly[sym][dateStr]['Open'] = float(datapoint['Open'])
-                    self.datasets_weekly[sym][dateStr]['Close'] = float(datapoint['Close'])
-                    self.datasets_weekly[sym][dateStr]['Low'] = float(datapoint['Low'])
-                    self.datasets_weekly[sym][dateStr]['High'] = float(datapoint['High'])
-                    self.datasets_weekly[sym][dateStr]['Volume'] = float(datapoint['Volume'])
-            if maxdate != '0000-00-00' and maxdate != endingMonday:
-                new_fname = sym+'-weekly-'+maxdate+'.csv'
-                new_localfpath = os.path.join(subFolderName, new_fname)
-                os.rename(localfpath, new_localfpath)
-        except:
-            pass
+        bars = self.download_range(sym, 'weekly', start, ending)
+        self.datasets_weekly[sym] = self.datasets_weekly[sym].merge(bars)
 
+    # the most recent self.depth['weekly'] weeks that start on or before endDate
     def load_weekly_from_file(self, sym):
-        self.datasets_weekly[sym] = load_csv_from_files(sym + '-weekly-')
-
+        depth = self.depth['weekly']
+        self.datasets_weekly[sym] = self.read_history(sym, 'weekly', self.adjusted_endDate, depth)
+        self.mark_truncated(sym, 'weekly', len(self.datasets_weekly[sym]), depth)
+
+    # loads more local history for consumers that look further back than the depth the market was
+    # created with, only for symbols whose files hold more than what is loaded.
+    # Bars downloaded or fetched in this run, and weekly bars built from daily data, are kept
+    def extend(self, frequency, depth):
+        with self.rlock:
+            if frequency not in self.depth or depth <= self.depth[frequency]:
+                return
+            self.depth[frequency] = depth
+            dataset = self.datasets(frequency)
+            for sym in sorted(s for s, f in self.truncated if f == frequency and s in dataset):
+                if frequency == 'weekly' and self.derive_weekly:
+                    dataset[sym] = self.resample_daily(sym, 'weekly')
+                    continue
+                bars = self.read_history(sym, frequency, self.adjusted_endDate, depth)
+                if len(bars) < depth:
+                    self.truncated.discard((sym, frequency))
+                if frequency == 'weekly' and sym in self.weekly_history_ends:
+                    bars = bars.until(self.weekly_history_ends[sym])
+                dataset[sym] = bars.merge(dataset[sym])
+
+    # weekly bars after the last downloaded week come from daily data
     def calculate_most_recent_weekly(self, sym):
-        most_recent_week = get_monday_of_the_week(max(self.datasets_weekly[sym].keys()))
-        current_week_monday = get_monday_of_the_week(max(self.datasets_daily[sym].keys()))
-        while True:
-            nextweek_Monday = datetime.strptime(most_recent_week, '%Y-%m-%d') + timedelta(days = 7)
-            monday_str = '-'.join([strWithZero(x) for x in [nextweek_Monday.year, nextweek_Monday.month, nextweek_Monday.day]])
-            if monday_str > current_week_monday:
-                break
-            found = 0
-            for i in range(5):
-                day = nextweek_Monday + timedelta(days = i)
-                kstr = '-'.join([strWithZero(x) for x in [day.year, day.month, day.day]])
-                if kstr in self.datasets_daily[sym].keys():
-                    if found == 0:
-                        self.datasets_weekly[sym][monday_str] = \
-                            {'Date': monday_str,'Open': None, 'Close' : None, 'High' : None, 'Low' : None, 'Volume' : 0}
-
-                    found = found + 1
-                    data = self.datasets_weekly[sym][monday_str]
-                    if data['Open'] == None:
-                        data['Open'] = self.datasets_daily[sym][kstr]['Open']
-                    data['Close'] = self.datasets_daily[sym][kstr]['Close']
-
-                    high_float = float(self.datasets_daily[sym][kstr]['High'])
-                    if data['High'] == None or high_float > float(data['High']):
-                        data['High'] = high_float
-
-                    low_float = float(self.datasets_daily[sym][kstr]['Low'])
-                    if data['Low'] == None or low_float < float(data['Low']):
-                        data['Low'] = low_float
-
-                    data['Volume'] = float(data['Volume']) + float(self.datasets_daily[sym][kstr]['Volume'])
-            if found > 0:
-                # volume in weekly chart is 'avg'
-                self.datasets_weekly[sym][monday_str]['Volume'] = \
-                    str(int(float(self.datasets_weekly[sym][monday_str]['Volume']) / found))
-            most_recent_week = monday_str
-
-    def fetchdata(self, frequency = 'daily'):
+        weekly = self.datasets_weekly[sym]
+        next_week = tradingCalendar.date_str(tradingCalendar.week_of(weekly[0]['Date']) + 7)
+        self.datasets_weekly[sym] = weekly.merge(resample_series(self.datasets_daily[sym].since(next_week), 'weekly'))
+
+    # brings the loaded data up to date without loading it again: bars closed since the last refresh
+    # are downloaded and merged, the bar of the ongoing session and the weekly/monthly bars built
+    # from daily data are computed again. Data for a past endDate doesn't change
+    def refresh(self):
+        if self.endDate != '9999-99-99' or len(self.datasets_daily) == 0:
+            return
+        self.quotes.clear()
+        self.backfilled = set()
+        self.backfill('daily')
+        if len(self.datasets_weekly) > 0 and not self.derive_weekly:
+            self.backfill('weekly')
+        self.prefetch_quotes()
+        for sym in list(self.datasets_daily.keys()):
+            if sym in self.missing_daily:
+                continue
+            try:
+                self.fetch_current_data(sym)
+                self.update_indicators(sym)
+                if sym in self.datasets_weekly:
+                    if self.derive_weekly:
+                        self.datasets_weekly[sym] = self.resample_daily(sym, 'weekly')
+                    elif sym in self.weekly_history_ends:
+                        self.datasets_weekly[sym] = self.datasets_weekly[sym].until(self.weekly_history_ends[sym])
+                        self.calculate_most_recent_weekly(sym)
+                if sym in self.datasets_monthly:
+                    self.datasets_monthly[sym] = self.resample_daily(sym, 'monthly')
+            except:
+                pass # keep what was loaded
+        self.manifest.save()
+        self.failures.save()
+
+    def update_monthly(self, sym):
+        self.update_daily(sym)
+        if sym in self.missing_daily:
+            self.mark_missing(self.missing_monthly, sym)
+            return
+        try:
+            self.datasets_monthly[sym] = self.resample_daily(sym, 'monthly')
+        except:
+            self.mark_missing(self.missing_monthly, sym)
+
+    # runs update(sym) for every symbol on a bounded set of worker threads
+    def update_all(self, update, desc):
+        progress = tqdm(total=len(self.watchlist), desc=desc, unit=' Symbol')
+        with Executor(10) as executor:
+            for sym in self.watchlist:
+                executor.submit(update, sym).add_done_callback(lambda f: progress.update())
+            executor.wait_for_all()
+        progress.close()
+        self.fetch_records += executor.records
+
+    def datasets(self, frequency):
+        return {'daily': self.datasets_daily, 'weekly': self.datasets_weekly,
+                'monthly': self.datasets_monthly}[frequency]
+
+    def missing(self, frequency):
+        return {'daily': self.missing_daily, 'weekly': self.missing_weekly,
+                'monthly': self.missing_monthly}[frequency]
+
+    # one task per symbol produces every requested frequency
+    def update_symbol(self, sym, frequencies):
+        for frequency in frequencies:
+            {'daily': self.update_daily, 'weekly': self.update_weekly,
+             'monthly': self.update_monthly}[frequency](sym)
+
+    # loads (or downloads) each symbol once for all the given frequencies, in a single threaded pass.
+    # frequencies loaded by an earlier call are not loaded again
+    def fetchall(self, frequencies = ('daily',)):
         touchFolder()
-        wpool = WorkPool(10)
-        if frequency == 'daily':
-            if len(self.datasets_daily) != 0:
-                return
-            self.missing_daily = []
-            for sym in tqdm(self.watchlist, desc='daily chart', unit=' Symbol'):
-                wpool.start_work(self.update_daily, sym)
-            self.daily_data_updated = True
-
-        elif frequency == 'weekly':
-            if len(self.datasets_weekly) != 0:
-                return
-            self.missing_weekly = []
-            for sym in tqdm(self.watchlist, desc='weekly chart', unit=' Symbol'):
-                wpool.start_work(self.update_weekly, sym)
-        wpool.wait_for_all()
+        pending = [f for f in frequencies if len(self.datasets(f)) == 0]
+        if len(pending) == 0:
+            return
+        for frequency in pending:
+            self.missing(frequency)[:] = []
+        # weekly/monthly bars derived from daily data need more daily history, read it only once
+        self.keep_daily_history = 'monthly' in pending or ('weekly' in pending and self.derive_weekly)
+        self.daily_history_depth = self.derived_depth('monthly' if 'monthly' in pending else 'weekly')
+        if not self.daily_data_updated:
+            self.backfill('daily')
+            self.prefetch_quotes()
+        if 'weekly' in pending and not self.derive_weekly:
+            self.backfill('weekly')
+        self.update_all(lambda sym: self.update_symbol(sym, pending), '+'.join(pending) + ' chart')
+        self.daily_data_updated = True
+        self.daily_history = {}
+        self.keep_daily_history = False
+        self.manifest.save()
+        self.failures.save()
 
-    def getData(self, frequency = 'daily'):
-        self.fetchdata(frequency)
-        missing = []
-        if frequency == 'daily':
-            dataset = self.datasets_daily
-            missing = self.missing_daily
-        elif frequency == 'weekly':
-            dataset = self.datasets_weekly
-            missing = self.missing_weekly
+    def fetchdata(self, frequency = 'daily'):
+        self.fetchall([frequency])
+
+    # {sym: BarSeries} for the symbols that are not missing, [0] is the most recent price point.
+    # A BarSeries holds one array per field; bars read like the row dicts, e.g. data[sym][0]['Close'].
+    # The series are the ones the market keeps (or views of them), nothing is converted or copied
+    def sortedByDate(self, frequency):
+        dataset = self.datasets(frequency)
+        missing = self.missing(frequency)
         sortedByDate = {}
-        # return an array (instead of dict)
-        # [0] is the most recent price point
         for sym in list(set(self.watchlist) - set(missing)):
-            sortedByDate[sym] = [dataset[sym][date] for date in sorted(dataset[sym].keys(), reverse=True) if date <= self.endDate]
+            bars = dataset[sym]
+            sortedByDate[sym] = bars if self.endDate == '9999-99-99' else bars.until(self.endDate)
+        return sortedByDate
 
+    # depth: bars of history the consumer needs, loaded lazily when more than the market's depth
+    def getData(self, frequency = 'daily', depth = None):
+        self.fetchdata(frequency)
+        if depth is not None:
+            self.extend(frequency, depth)
         if frequency == 'daily' and len(self.missingRecentHistory) > 0:
             print('recent data not downloaded: ' + str(self.missingRecentHistory))
-        return sortedByDate, missing
+        return self.sortedByDate(frequency), self.missing(frequency)
+
+    # several frequencies from one pass over the symbols: ({frequency: {sym: BarSeries}}, missing),
+    # a symbol missing in any frequency is missing from all of them
+    def getAllData(self, frequencies = ('daily', 'weekly')):
+        self.fetchall(frequencies)
+        if 'daily' in frequencies and len(self.missingRecentHistory) > 0:
+            print('recent data not downloaded: ' + str(self.missingRecentHistory))
+        missing = sorted(set().union(*[self.missing(f) for f in frequencies]))
+        ret = {}
+        for frequency in frequencies:
+            dataset = self.sortedByDate(frequency)
+            ret[frequency] = {sym: dataset[sym] for sym in dataset.keys() if sym not in missing}
+        return ret, missing
+
+    # {sym: latest values of its streaming indicators} of the loaded live data, as the last
+    # load or refresh left them (ptools.metrics.StreamingIndicators.values())
+    def getIndicators(self):
+        self.fetchdata('daily')
+        return {sym: self.indicator_values[sym] for sym in self.watchlist
+                if sym in self.indicator_values and sym not in self.missing_daily}
 
     def get_latest_history_date(self, sym, frequency='daily'):
-        dates = {}
-        if frequency == 'daily':
-            dates = sorted(self.datasets_daily[sym].keys(), reverse = True)
-        elif frequency == 'weekly':
-            dates = sorted(self.datasets_weekly[sym].keys(), reverse = True)
+        bars = self.datasets(frequency)[sym]
 
-        if len(dates) == 0:
+        if len(bars) == 0:
             # if nothing is loaded from file, let's start from a fixed time ago
             longBefore = datetime.now(pytz.timezone('US/Eastern')) - timedelta(days = (max_history_year * 365))
             return '-'.join([strWithZero(x) for x in [longBefore.year, longBefore.month, longBefore.day]])
 
-        return dates[0]
+        return bars[0]['Date']
+
+    # symbols x dates panel of the loaded data (see ptools.MarketPanel), for batched indicators
+    def getPanel(self, frequency = 'daily'):
+        dataset, missing = self.getData(frequency)
+        return MarketPanel.from_datasets(dataset), missing
+
+    # the panel published in shared memory (ptools.SharedPanel) for worker processes,
+    # which attach to its handle with ptools.sharedPanel.attach; close() it when the workers are done
+    def publish(self, frequency = 'daily'):
+        return SharedPanel(self.getPanel(frequency)[0])